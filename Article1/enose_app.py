@@ -1,11 +1,8 @@
 import sys
 import tkinter as tk
 from tkinter import ttk
-import threading
 import time, os
-import joblib
 from PIL import Image, ImageTk
-import serial
 
 LABELFONT = ("Segoe UI", 16, "bold")
 TEXTFONT = ("Segoe UI", 20, "bold")
@@ -20,43 +17,122 @@ SENSOR_COUNT = len(SENSOR_COLS)
 
 # ---------------- BASE DIRECTORY ---------------- #
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# shared enose package lives at the repository root
+sys.path.insert(0, os.path.dirname(BASE_DIR))
+from enose.acquisition import AcquisitionService
+from enose.session_file import SessionWriter
+from enose.checkpoint import RunCheckpoint
+from enose.features import StreamingFeatures
+from enose.baseline import (BaselineCache, BaselineTail, baseline_offsets, baseline_values,
+                            check_baseline_mode, subtract_baseline)
+from enose.transient import CurveBuffer, recovery_slope, transient_features
+from enose.steady import SteadyStateDetector, settle_stats
+from enose.despike import HampelFilter
+from enose.registry import ModelRegistry, ModelWatcher
 MODEL_PATH = os.path.join(BASE_DIR, "svm_best_model.joblib")
+MODEL_REGISTRY = os.path.join(BASE_DIR, "models")
 BG_IMAGE = os.path.join(BASE_DIR, "background.png")
+CHECKPOINT_PATH = os.path.join(BASE_DIR, "run_checkpoint.json")
+CHECKPOINT_RAW = os.path.join(BASE_DIR, "run_checkpoint.ens")
+BASELINE_PATH = os.path.join(BASE_DIR, "baseline_cache.json")
+
+# ---------------- RUN CHECKPOINTS ---------------- #
+# the in-memory run is mirrored to disk every few seconds so an interrupted
+# run can be resumed or finalized at startup (see enose.checkpoint)
+CHECKPOINT = RunCheckpoint(CHECKPOINT_PATH, interval_s=10)
+
+def clear_run_checkpoint():
+    CHECKPOINT.clear()
+    if os.path.exists(CHECKPOINT_RAW):
+        os.remove(CHECKPOINT_RAW)
+
+# ---------------- BASELINE ---------------- #
+# the last minute of a completed exhaust is the clean-air baseline (the
+# notebook's baseline.csv). It is cached, and subtracted from later runs only
+# for a model trained on corrected features (baseline_subtracted in its
+# artifact meta, see enose.pipeline); the shipped models use raw means.
+BASELINE_TAIL_S = 60
+BASELINE_CACHE = BaselineCache(BASELINE_PATH, SENSOR_COLS, max_age_s=2 * 3600)
+
+# ---------------- TRANSIENT FEATURES ---------------- #
+# the run's response curve is kept in CURVE_BINS time bins and its shape
+# (slope, t63/t90, peak time, derivative energy; see enose.transient) is
+# stored with the means. The first RECOVERY_WINDOW_S seconds of the
+# following exhaust give the run's recovery slope.
+CURVE_BINS = 512
+RECOVERY_WINDOW_S = 60
+
+# ---------------- SPIKE FILTER ---------------- #
+# single-sample spikes are replaced by the rolling median before anything
+# sees them (enose.despike); ENOSE_DESPIKE=off passes readings through
+DESPIKE = os.environ.get("ENOSE_DESPIKE", "on") != "off"
+
+# ---------------- STEADY STATE ---------------- #
+# gathering ends once every sensor has plateaued, the exhaust once every
+# sensor is back at the cached baseline (enose.steady); the phase lengths
+# are then only timeouts. Without a fresh baseline the exhaust runs its
+# full length. ENOSE_STEADY=off keeps the fixed windows.
+STEADY_STATE = os.environ.get("ENOSE_STEADY", "on") != "off"
+GATHER_TIMEOUT_S = 600
+EXHAUST_TIMEOUT_S = 900
+
+# ---------------- MODEL REGISTRY ---------------- #
+# the live model is the current version of the models/ registry (enose.registry);
+# svm_best_model.joblib is imported as its first version. A newly published
+# version is loaded and warmed on the watcher thread and taken up when the next
+# run starts, so a deployment needs no restart and no load on the way to a result.
+MODELS = ModelWatcher(ModelRegistry(MODEL_REGISTRY), fallback=MODEL_PATH).start()
+
+def load_model():
+    """The model of the current run (kept across soft resets, swapped between runs)."""
+    return MODELS.active()
+
+def model_wants_baseline():
+    """True when the current model was trained on baseline-corrected features."""
+    try:
+        return MODELS.active().baseline_subtracted
+    except Exception as e:
+        print(f"Error loading model: {e}")
+        return False
+
+# ---------------- IMAGE CACHE ---------------- #
+_BG_PHOTO = None
+
+def load_background():
+    """Decode and resize the background once; every page shares the same PhotoImage."""
+    global _BG_PHOTO
+    if _BG_PHOTO is None:
+        image = Image.open(BG_IMAGE).resize((800, 480), Image.LANCZOS)
+        _BG_PHOTO = ImageTk.PhotoImage(image)
+    return _BG_PHOTO
 
-# ---------------- SERIAL PORT MANAGER ---------------- #
-def open_serial(port="/dev/ttyACM0", baud=9600):
-    for attempt in range(5):
-        try:
-            ser = serial.Serial(port, baud, timeout=1)
-            time.sleep(2)
-            return ser
-        except Exception as e:
-            print(f"Attempt {attempt+1} failed: {e}")
-            time.sleep(0.5)
-    print(f"Failed to open {port}")
-    return None
+# ---------------- RESTART ---------------- #
+RESTART_T0_ENV = "ENOSE_RESTART_T0"
 
-def close_serial(ser):
-    if ser:
-        try:
-            ser.close()
-            time.sleep(0.5)
-        except Exception:
-            pass
+def hard_restart():
+    """Replace the current process. Only used when the soft reset fails."""
+    # CLOCK_MONOTONIC survives execv, so the new process can report the latency
+    os.environ[RESTART_T0_ENV] = repr(time.monotonic())
+    python = sys.executable
+    os.execv(python, [python] + sys.argv)
+
+def report_restart_latency():
+    t0 = os.environ.pop(RESTART_T0_ENV, None)
+    if t0:
+        elapsed_ms = (time.monotonic() - float(t0)) * 1000
+        print(f"Restart (re-exec) took {elapsed_ms:.0f} ms")
 
-# ---------------- RESTART ---------------- #
 def restart_program(app=None, button=None):
-    """Restart the current program, replacing the current process."""
+    """Reset the app in-process, falling back to replacing the current process."""
     if button:
         button.config(state='disabled')
     if app:
-        # Attempt to close all resources
-        for frame in getattr(app, 'frames', {}).values():
-            if hasattr(frame, 'stop_serial'):
-                try:
-                    frame.stop_serial()
-                except Exception:
-                    pass
+        try:
+            app.soft_reset()
+            return
+        except Exception as e:
+            print(f"Soft reset failed, re-executing: {e}")
 
         # Show restarting message
         top = tk.Toplevel(app)
@@ -65,14 +141,9 @@ def restart_program(app=None, button=None):
         tk.Label(top, text="Restarting...", font=TEXTFONT, bg="white").pack(expand=True, fill="both")
         app.update()
 
-        def _do_restart():
-            python = sys.executable
-            os.execv(python, [python] + sys.argv)
-
-        app.after(800, _do_restart)
+        app.after(800, hard_restart)
     else:
-        python = sys.executable
-        os.execv(python, [python] + sys.argv)
+        hard_restart()
 
 # ---------------- MAIN APP ---------------- #
 class App(tk.Tk):
@@ -91,13 +162,12 @@ class App(tk.Tk):
         style.configure("Exit.TButton", font=EBUTTONFONT, padding=4)
         style.configure("Restart.TButton", font=EBUTTONFONT, padding=4)
 
+        self.container = container
         self.frames = {}
-        for F in (StartPage, ClassificationPage, ClassificationReadingPage, ProcessingPage, ResultPage, ExhaustPage):
-            frame = F(container, self)
-            self.frames[F] = frame
-            frame.grid(row=0, column=0, sticky="nsew")
+        self.build_frames()
 
-        self.show_frame(StartPage)
+        self.show_start()
+        self.after_idle(report_restart_latency)
 
     def _activate_fullscreen(self):
         self.attributes('-fullscreen', True)
@@ -105,6 +175,46 @@ class App(tk.Tk):
         self.attributes('-topmost', True)
         self.after(500, lambda: self.attributes('-topmost', False))
 
+    def build_frames(self):
+        for F in (StartPage, ClassificationPage, ClassificationReadingPage, ProcessingPage, ResultPage,
+                  ExhaustPage, ResumePage):
+            frame = F(self.container, self)
+            self.frames[F] = frame
+            frame.grid(row=0, column=0, sticky="nsew")
+
+    def soft_reset(self):
+        """Stop acquisition and rebuild every page, keeping loaded modules, models and images."""
+        t0 = time.monotonic()
+        for frame in self.frames.values():
+            if hasattr(frame, 'stop_serial'):
+                try:
+                    frame.stop_serial()
+                except Exception:
+                    pass
+            # pending callbacks would otherwise fire on destroyed widgets
+            for attr in ('_timer_after_id', '_display_after_id'):
+                after_id = getattr(frame, attr, None)
+                if after_id:
+                    try:
+                        self.after_cancel(after_id)
+                    except Exception:
+                        pass
+            frame.destroy()
+
+        self.frames = {}
+        self.build_frames()
+        self.show_start()
+        print(f"Restart (soft) took {(time.monotonic() - t0) * 1000:.0f} ms")
+
+    def show_start(self):
+        """Show StartPage, or ResumePage when an interrupted run left a checkpoint."""
+        state = CHECKPOINT.load()
+        if state:
+            self.frames[ResumePage].show_checkpoint(state)
+            self.show_frame(ResumePage)
+        else:
+            self.show_frame(StartPage)
+
     def show_frame(self, cont):
         frame = self.frames[cont]
         frame.tkraise()
@@ -115,8 +225,7 @@ class StartPage(tk.Frame):
         super().__init__(parent)
         self.controller = controller
 
-        self.bg_image = Image.open(BG_IMAGE).resize((800, 480), Image.LANCZOS)
-        self.bg_photo = ImageTk.PhotoImage(self.bg_image)
+        self.bg_photo = load_background()
         tk.Label(self, image=self.bg_photo).place(x=0, y=0, relwidth=1, relheight=1)
 
         canvas = tk.Canvas(self, width=800, height=480, highlightthickness=0, bd=0)
@@ -142,8 +251,7 @@ class ClassificationPage(tk.Frame):
         super().__init__(parent)
         self.controller = controller
 
-        self.bg_image = Image.open(BG_IMAGE).resize((800, 480), Image.LANCZOS)
-        self.bg_photo = ImageTk.PhotoImage(self.bg_image)
+        self.bg_photo = load_background()
         tk.Label(self, image=self.bg_photo).place(x=0, y=0, relwidth=1, relheight=1)
 
         canvas = tk.Canvas(self, width=800, height=480, highlightthickness=0, bd=0)
@@ -169,25 +277,105 @@ class ClassificationPage(tk.Frame):
 
         ttk.Button(canvas, text="Exit", style="Exit.TButton", command=controller.quit).place(x=640, y=430)
 
+# ---------------- RESUME PAGE ---------------- #
+class ResumePage(tk.Frame):
+    """Offered at startup when a gathering run was interrupted (crash, power loss, Exit)."""
+
+    def __init__(self, parent, controller):
+        super().__init__(parent)
+        self.controller = controller
+        self.state = None
+
+        self.bg_photo = load_background()
+        tk.Label(self, image=self.bg_photo).place(x=0, y=0, relwidth=1, relheight=1)
+
+        self.canvas = tk.Canvas(self, width=800, height=480, highlightthickness=0, bd=0)
+        self.canvas.place(x=0, y=0, relwidth=1, relheight=1)
+        self.canvas.create_image(0, 0, image=self.bg_photo, anchor="nw")
+
+        title_frame = tk.Frame(self, bg="white", bd=0, relief="flat")
+        title_frame.place(relx=0.5, y=70, anchor="n", width=550, height=45)
+        tk.Label(title_frame, text="SVM Dark Condiment Classification using E-Nose",
+                 font=LABELFONT, bg="white").pack(expand=True, fill="both")
+
+        self.canvas.create_text(400, 180, text="An unfinished run was found",
+                                font=TEXTFONT, fill="white")
+        self.detail_text_id = self.canvas.create_text(400, 230, text="", font=SENSORFONT,
+                                                      fill="yellow", justify="center")
+
+        ttk.Button(self.canvas, text="Resume", style="TButton",
+                   command=self.resume).place(x=180, y=285)
+        ttk.Button(self.canvas, text="Finalize", style="TButton",
+                   command=self.finalize).place(x=440, y=285)
+
+        ttk.Button(self.canvas, text="Discard", style="Restart.TButton",
+                   command=self.discard).place(x=10, y=430)
+        ttk.Button(self.canvas, text="Exit", style="Exit.TButton", command=controller.quit).place(x=640, y=430)
+
+    def show_checkpoint(self, state):
+        self.state = state
+        elapsed = GATHER_TIMEOUT_S - state["remaining_time"]
+        saved = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(state["saved_at"]))
+        self.canvas.itemconfig(
+            self.detail_text_id,
+            text=f"{elapsed // 60}:{elapsed % 60:02d} of 10:00 gathered, "
+                 f"{state['accumulator']['count']} samples\nlast checkpoint {saved}"
+        )
+
+    def resume(self):
+        reading_page = self.controller.frames[ClassificationReadingPage]
+        try:
+            self.controller.show_frame(ClassificationReadingPage)
+            reading_page.resume_run(self.controller, self.state)
+        except Exception as e:
+            print(f"Could not resume run: {e}")
+            self.discard()
+
+    def finalize(self):
+        reading_page = self.controller.frames[ClassificationReadingPage]
+        try:
+            reading_page.finalize_run(self.controller, self.state)
+        except Exception as e:
+            print(f"Could not finalize run: {e}")
+            self.discard()
+
+    def discard(self):
+        self.controller.frames[ClassificationReadingPage].discard_run(self.state)
+        self.controller.show_frame(StartPage)
+
 # ---------------- CLASSIFICATION READING PAGE ---------------- #
 class ClassificationReadingPage(tk.Frame):
     def __init__(self, parent, controller):
         super().__init__(parent)
         self.controller = controller
 
-        self.ser = None
+        self.acquisition = None
         self.gathering = False
-        self.gather_thread = None
         self.remaining_time = 600
         self._timer_after_id = None
+        self._display_after_id = None
 
         # In-memory storage for the current run
         self.samples = []          # list[list[float]] each row has 6 floats
+        self.sample_times = []     # list[float] host monotonic seconds since start
+        self.run_stats = None      # dict measured sample rate / jitter of the run
         self.mean_vals = None      # list[float] computed mean for ResultPage
+        self.feature_vals = None   # dict notebook-named mean/std/max/min/auc features
+        self.accumulator = None    # running per-sensor statistics (enose.features), checkpointed
+        self.curve = None          # binned response curve (enose.transient), checkpointed
+        self.steady = None         # plateau detector (enose.steady)
+        self.settled = None        # when the run stopped early, and the time saved
+        self.raw = None            # SessionWriter mirroring samples at checkpoints
+        self.raw_written = 0       # samples already mirrored to self.raw
+        self.t_offset = 0.0        # seconds gathered before a resume
+        self.t_last = 0.0
+        self.restored_stats = None
+        self.baseline = None       # cached clean-air baseline applied to this run
+        self.baseline_offsets = None
+        self.baseline_required = False  # the run's model was trained on corrected features
 
         # Background
-        self.bg_image = Image.open(BG_IMAGE).resize((800, 480), Image.LANCZOS)
-        self.bg_photo = ImageTk.PhotoImage(self.bg_image)
+        self.bg_photo = load_background()
         tk.Label(self, image=self.bg_photo).place(x=0, y=0, relwidth=1, relheight=1)
 
         self.canvas = tk.Canvas(self, width=800, height=480, highlightthickness=0, bd=0)
@@ -232,86 +420,182 @@ class ClassificationReadingPage(tk.Frame):
         ).place(x=490, y=430)
 
     def start_timer(self, controller):
-        self.remaining_time = 600
-        self.gathering = True
+        self.remaining_time = GATHER_TIMEOUT_S
+        self.accumulator = StreamingFeatures(SENSOR_COLS)
+        self.curve = CurveBuffer(SENSOR_COUNT, CURVE_BINS)
+        self.t_offset = 0.0
+        self.t_last = 0.0
+        self.restored_stats = None
+        MODELS.swap()  # between runs: take up a newly published model version
+        self.baseline_required = model_wants_baseline()
+        self.use_baseline(BASELINE_CACHE.load() if self.baseline_required else None)
+        CHECKPOINT.clear()
 
         # reset for new run
         self.samples = []
+        self.sample_times = []
+        self.mean_vals = None
+        self.feature_vals = None
+        self.run_stats = None
+        self.raw = SessionWriter(CHECKPOINT_RAW, SENSOR_COLS, tick=False)
+        self.raw_written = 0
+
+        self.start_acquisition(controller)
+
+    def restore_checkpoint(self, state):
+        self.remaining_time = state["remaining_time"]
+        self.accumulator = StreamingFeatures.from_dict(state["accumulator"])
+        curve = state.get("curve")
+        self.curve = (CurveBuffer.from_dict(curve, SENSOR_COUNT) if curve
+                      else CurveBuffer(SENSOR_COUNT, CURVE_BINS))
+        self.t_offset = self.t_last = state["t_last"]
+        self.restored_stats = state.get("stats")
+        self.baseline_required = state.get("baseline_required", bool(state.get("baseline")))
+        self.use_baseline(state.get("baseline"))
+
+        # the lists only hold what is gathered after the resume; the means
+        # come from the accumulator, so the mirrored rows are not read back
+        self.samples = []
+        self.sample_times = []
         self.mean_vals = None
+        self.feature_vals = None
+        self.run_stats = None
+        self.raw = SessionWriter.resume(CHECKPOINT_RAW, state["raw_records"])
+        self.raw_written = 0
+
+    def use_baseline(self, baseline):
+        self.baseline = baseline
+        self.baseline_offsets = baseline_offsets(baseline, SENSOR_COLS) if baseline else None
+        if baseline:
+            print(f"Subtracting baseline captured {baseline.get('age_s', 0) / 60:.0f} min ago")
+        elif self.baseline_required:
+            print("The model needs a clean-air baseline but none fresh is cached; run the exhaust first")
+
+    def resume_run(self, controller, state):
+        """Continue a checkpointed run with the time it had left."""
+        self.restore_checkpoint(state)
+        self.start_acquisition(controller)
+
+    def finalize_run(self, controller, state):
+        """Take the result of a checkpointed run as it stands, without gathering more."""
+        self.restore_checkpoint(state)
+        self.acquisition = None
+        self.gathering = False
+        self.update_timer(controller)
+
+    def start_acquisition(self, controller):
+        self.gathering = True
+        self.settled = None
+        self.steady = SteadyStateDetector(SENSOR_COUNT) if STEADY_STATE else None
 
         self.latest_values = ["--.--"] * SENSOR_COUNT
         self.sensor_display_running = True
         self.update_sensor_display()
 
-        self.gather_thread = threading.Thread(target=self.gather_data, daemon=True)
-        self.gather_thread.start()
+        self.acquisition = AcquisitionService(
+            SENSOR_COUNT, self.on_sample, sensor_cols=SENSOR_COLS,
+            despike=HampelFilter(SENSOR_COLS) if DESPIKE else None,
+        ).start()
 
         self.update_timer(controller)
 
-    def gather_data(self, port="/dev/ttyACM0", baud=9600):
-        try:
-            self.ser = open_serial(port, baud)
-            if not self.ser:
-                print("Could not open COM port, skipping gathering")
-                return
-
-            while self.gathering:
-                line = self.ser.readline().decode("utf-8", errors="ignore").strip()
-                if not line:
-                    continue
-
-                parts = [p.strip() for p in line.split(",") if p.strip()]
-                if len(parts) < SENSOR_COUNT:
-                    continue
-
-                try:
-                    vals = [float(v) for v in parts[:SENSOR_COUNT]]
-                except ValueError:
-                    continue
-
-                # for live display
-                self.latest_values = [f"{v:.2f}" for v in vals]
-
-                # store sample in memory
-                self.samples.append(vals)
-
-        except Exception as e:
-            print(f"Error during data gathering: {e}")
-        finally:
-            self.stop_serial()
+    def on_sample(self, vals, t, tick):
+        # called on the acquisition thread; t is host monotonic seconds since start
+        t += self.t_offset
+        # for live display
+        self.latest_values = [f"{v:.2f}" if v == v else "--.--" for v in vals]
+
+        # store sample in memory
+        self.samples.append(vals)
+        self.sample_times.append(t)
+        # baseline-corrected for the features, one subtraction per sample
+        corrected = subtract_baseline(vals, self.baseline_offsets) if self.baseline_offsets else vals
+        self.accumulator.update(corrected)
+        self.curve.append(t, corrected)
+        if self.steady:
+            self.steady.update(t, vals)
+        self.t_last = t
+
+    def checkpoint(self):
+        """Mirror new samples and snapshot the run every CHECKPOINT.interval_s seconds."""
+        if not self.acquisition or not CHECKPOINT.due():
+            return
+        with self.acquisition.lock:
+            n = len(self.samples)
+            state = {
+                "app": os.path.basename(BASE_DIR),
+                "remaining_time": self.remaining_time,
+                "t_last": self.t_last,
+                "accumulator": self.accumulator.to_dict(),
+                "curve": self.curve.to_dict(),
+                "baseline": self.baseline,
+                "baseline_required": self.baseline_required,
+            }
+        # only the rows gathered since the previous checkpoint are written
+        for vals, t in zip(self.samples[self.raw_written:n], self.sample_times[self.raw_written:n]):
+            self.raw.append(vals, t)
+        self.raw_written = n
+        state["raw_records"] = self.raw.count
+        state["stats"] = self.collect_run_stats()
+        # the raw file is fsynced before the state that points into it
+        CHECKPOINT.save_async(state, raw=self.raw)
+
+    def collect_run_stats(self):
+        if self.acquisition is None:
+            return self.restored_stats
+        stats = self.acquisition.summary()
+        if self.t_offset:
+            stats["resumed_at_s"] = round(self.t_offset, 3)
+        if self.settled:
+            stats["steady_state"] = self.settled
+        if self.baseline:
+            stats["baseline"] = self.baseline
+        return stats
+
+    def discard_run(self, state):
+        clear_run_checkpoint()
 
     def compute_means_in_memory(self):
-        if not self.samples:
-            raise ValueError("No sensor samples collected.")
-        sums = [0.0] * SENSOR_COUNT
-        for row in self.samples:
-            for i, v in enumerate(row):
-                sums[i] += v
-        n = float(len(self.samples))
-        return [s / n for s in sums]
+        # running statistics kept by on_sample (and restored on resume)
+        return self.accumulator.means()
 
     def save_mean_only(self):
         # “save” now means compute + store for ResultPage
         self.mean_vals = self.compute_means_in_memory()
+        self.feature_vals = self.accumulator.features()
+        # shape of the response curve, a few vectorized passes over <= CURVE_BINS points
+        started = time.perf_counter()
+        self.feature_vals.update(transient_features(*self.curve.arrays(), SENSOR_COLS))
+        print(f"Transient features in {(time.perf_counter() - started) * 1000:.1f} ms")
+        self.run_stats = self.collect_run_stats()
+        print(f"Run stats: {self.run_stats}")
+        clear_run_checkpoint()
 
     def format_sensor_text(self):
         pairs = [f"{name}: {val}" for name, val in zip(SENSOR_COLS, self.latest_values)]
         per_line = 3
         lines = ["  ".join(pairs[i:i + per_line]) for i in range(0, len(pairs), per_line)]
+        # measured sample rate / jitter of the running acquisition
+        if self.acquisition and self.acquisition.rate.count > 1:
+            lines.append(self.acquisition.rate.display_text())
         return "\n".join(lines)
 
     def update_sensor_display(self):
         self.canvas.itemconfig(self.sensor_text_id, text=self.format_sensor_text())
         if self.sensor_display_running:
-            self.after(500, self.update_sensor_display)
+            self._display_after_id = self.after(500, self.update_sensor_display)
 
     def update_timer(self, controller):
         minutes = self.remaining_time // 60
         seconds = self.remaining_time % 60
         self.canvas.itemconfig(self.timer_text_id, text=f"{minutes}:{seconds:02d}")
 
+        if self.gathering and self.reached_steady_state():
+            self.gathering = False
+
         if self.remaining_time > 0 and self.gathering:
             self.remaining_time -= 1
+            self.checkpoint()
             self._timer_after_id = self.after(1000, self.update_timer, controller)
         else:
             self.gathering = False
@@ -329,6 +613,18 @@ class ClassificationReadingPage(tk.Frame):
                 controller.show_frame(ResultPage)
             ])
 
+    def reached_steady_state(self):
+        """True once every sensor has plateaued; the time saved goes into the run stats."""
+        if not self.steady or not self.acquisition:
+            return False
+        with self.acquisition.lock:
+            if not self.steady.check():
+                return False
+            self.settled = settle_stats(GATHER_TIMEOUT_S, self.t_last)
+        print(f"Responses steady after {self.settled['settled_at_s']:.0f} s, "
+              f"{self.settled['saved_s']:.0f} s before the {GATHER_TIMEOUT_S} s timeout")
+        return True
+
     def skip_and_save(self):
         if self._timer_after_id:
             try:
@@ -337,12 +633,9 @@ class ClassificationReadingPage(tk.Frame):
                 pass
             self._timer_after_id = None
 
-        self.gathering = False
+        # returns immediately; no samples arrive after this, so the mean is final
         self.stop_serial()
 
-        if self.gather_thread and self.gather_thread.is_alive():
-            self.gather_thread.join(timeout=2)
-
         try:
             self.save_mean_only()
         except Exception as e:
@@ -358,11 +651,13 @@ class ClassificationReadingPage(tk.Frame):
         ])
 
     def stop_serial(self):
+        # non-blocking: the port is drained and closed on the acquisition thread
         self.gathering = False
         self.sensor_display_running = False
-        if hasattr(self, "ser") and self.ser:
-            close_serial(self.ser)
-            self.ser = None
+        if self.acquisition:
+            self.acquisition.cancel()
+        if self.raw:
+            self.raw.close()
 
 # ---------------- PROCESSING PAGE ---------------- #
 class ProcessingPage(tk.Frame):
@@ -370,8 +665,7 @@ class ProcessingPage(tk.Frame):
         super().__init__(parent)
         self.controller = controller
 
-        self.bg_image = Image.open(BG_IMAGE).resize((800, 480), Image.LANCZOS)
-        self.bg_photo = ImageTk.PhotoImage(self.bg_image)
+        self.bg_photo = load_background()
         tk.Label(self, image=self.bg_photo).place(x=0, y=0, relwidth=1, relheight=1)
 
         canvas = tk.Canvas(self, width=800, height=480, highlightthickness=0, bd=0)
@@ -391,8 +685,7 @@ class ResultPage(tk.Frame):
         super().__init__(parent)
         self.controller = controller
 
-        self.bg_image = Image.open(BG_IMAGE).resize((800, 480), Image.LANCZOS)
-        self.bg_photo = ImageTk.PhotoImage(self.bg_image)
+        self.bg_photo = load_background()
         tk.Label(self, image=self.bg_photo).place(x=0, y=0, relwidth=1, relheight=1)
 
         self.canvas = tk.Canvas(self, width=800, height=480, highlightthickness=0, bd=0)
@@ -450,7 +743,7 @@ class ResultPage(tk.Frame):
 
     def update_results(self):
         try:
-            model = joblib.load(MODEL_PATH)
+            model = load_model()
 
             # get mean from the reading page (in-memory)
             reading_page = self.controller.frames[ClassificationReadingPage]
@@ -458,14 +751,13 @@ class ResultPage(tk.Frame):
             if means is None:
                 raise ValueError("No mean values available (collection may have failed).")
 
-            # Ensure correct feature order:
-            expected_cols = list(getattr(model, "feature_names_in_", SENSOR_COLS))
-
-            name_to_val = dict(zip(SENSOR_COLS, means))
-            row = [float(name_to_val[c]) for c in expected_cols]
+            # raw and baseline-corrected features are not interchangeable
+            check_baseline_mode(model.baseline_subtracted, reading_page.baseline)
 
-            # Predict (sklearn expects 2D)
-            result = model.predict([row])[0]
+            # features in the model's column order (the contract checked at load,
+            # see enose.pipeline); a sensor with no readings raises instead of
+            # letting the model guess
+            result = model.predict_run(reading_page.accumulator, reading_page.curve)
 
             mean_vals_display = [f"{v:.2f}" for v in means]
 
@@ -496,14 +788,17 @@ class ExhaustPage(tk.Frame):
     def __init__(self, parent, controller):
         super().__init__(parent)
         self.controller = controller
-        self.ser = None
+        self.acquisition = None
+        self.baseline_tail = None
+        self.stopped_at_baseline = False  # the cached baseline ended the exhaust early
+        self.recovery = None
+        self.steady = None         # back-to-baseline detector (enose.steady)
         self.gathering = False
         self.remaining_time = 900  # 15 minutes exhaust
         self._timer_after_id = None
-        self.gather_thread = None
+        self._display_after_id = None
 
-        self.bg_image = Image.open(BG_IMAGE).resize((800, 480), Image.LANCZOS)
-        self.bg_photo = ImageTk.PhotoImage(self.bg_image)
+        self.bg_photo = load_background()
         tk.Label(self, image=self.bg_photo).place(x=0, y=0, relwidth=1, relheight=1)
 
         self.canvas = tk.Canvas(self, width=800, height=480, highlightthickness=0, bd=0)
@@ -557,54 +852,85 @@ class ExhaustPage(tk.Frame):
             style="Restart.TButton",
             command=lambda: [
                 self.stop_serial(),
+                self.save_recovery(),
                 controller.show_frame(ClassificationPage)
             ]
         ).place(x=490, y=430)
 
     def start_timer(self, controller):
-        self.remaining_time = 900
+        self.remaining_time = EXHAUST_TIMEOUT_S
         self.gathering = True
 
         self.latest_values = ["--.--"] * SENSOR_COUNT
         self.sensor_display_running = True
         self.update_sensor_display()
 
-        self.gather_thread = threading.Thread(
-            target=self.gather_data,
-            daemon=True
-        )
-        self.gather_thread.start()
+        self.baseline_tail = BaselineTail(SENSOR_COLS, tail_s=BASELINE_TAIL_S)
+        self.stopped_at_baseline = False
+        self.recovery = CurveBuffer(SENSOR_COUNT, CURVE_BINS)
+        baseline = BASELINE_CACHE.load() if STEADY_STATE else None
+        self.steady = (SteadyStateDetector(SENSOR_COUNT, target=baseline_values(baseline, SENSOR_COLS))
+                       if baseline else None)
+        self.acquisition = AcquisitionService(
+            SENSOR_COUNT, self.on_sample, sensor_cols=SENSOR_COLS,
+            despike=HampelFilter(SENSOR_COLS) if DESPIKE else None,
+        ).start()
 
         self.update_timer(controller)
 
-    def gather_data(self, port="/dev/ttyACM0", baud=9600):
+    def on_sample(self, vals, t, tick):
+        # called on the acquisition thread: display, recovery curve and baseline window
+        self.latest_values = [f"{v:.2f}" if v == v else "--.--" for v in vals]
+        if self.recovery is not None and t <= RECOVERY_WINDOW_S:
+            self.recovery.append(t, vals)
+        self.baseline_tail.update(vals, t)
+        if self.steady:
+            self.steady.update(t, vals)
+
+    def reached_baseline(self):
+        """True once every sensor is back at the cached baseline and steady."""
+        if not self.steady or not self.acquisition:
+            return False
+        with self.acquisition.lock:
+            if not self.steady.check():
+                return False
+            settled = settle_stats(EXHAUST_TIMEOUT_S, self.steady.settled_at)
+        print(f"Back at baseline after {settled['settled_at_s']:.0f} s, "
+              f"{settled['saved_s']:.0f} s before the {EXHAUST_TIMEOUT_S} s timeout")
+        return True
+
+    def save_recovery(self):
+        """Add the decay slope at the start of the exhaust to the run just read."""
+        reading_page = self.controller.frames[ClassificationReadingPage]
+        if self.recovery is None or reading_page.feature_vals is None:
+            return
+        slopes = recovery_slope(*self.recovery.arrays(), SENSOR_COLS, window_s=RECOVERY_WINDOW_S)
+        self.recovery = None
+        reading_page.feature_vals.update(slopes)
+        print(f"Recovery slopes: {slopes}")
+
+    def save_baseline(self):
+        """Cache the tail of a full-length exhaust as the clean-air baseline."""
+        if self.stopped_at_baseline:
+            # the tail only matched the cache that stopped the exhaust; re-saving
+            # it would restart the cache's expiry and let the baseline drift
+            return
+        baseline = self.baseline_tail.result() if self.baseline_tail else None
+        if baseline is None:
+            return
         try:
-            self.ser = open_serial(port, baud)
-            if not self.ser:
-                print("Could not open COM port for exhaust")
-                return
-
-            while self.gathering and self.remaining_time > 0:
-                line = self.ser.readline().decode("utf-8", errors="ignore").strip()
-                if not line:
-                    continue
-
-                parts = [p.strip() for p in line.split(",") if p.strip()]
-                if len(parts) < SENSOR_COUNT:
-                    continue
-
-                # show as-is (no float conversion required for exhaust display)
-                self.latest_values = parts[:SENSOR_COUNT]
-
-        except Exception as e:
-            print(f"Error during exhaust: {e}")
-        finally:
-            self.stop_serial()
+            BASELINE_CACHE.save(baseline)
+            print(f"Baseline cached from the last {baseline['window_s']:.0f} s of exhaust")
+        except OSError as e:
+            print(f"Error caching baseline: {e}")
 
     def format_sensor_text(self):
         pairs = [f"{name}: {val}" for name, val in zip(SENSOR_COLS, self.latest_values)]
         per_line = 3
         lines = ["  ".join(pairs[i:i + per_line]) for i in range(0, len(pairs), per_line)]
+        # measured sample rate / jitter of the running acquisition
+        if self.acquisition and self.acquisition.rate.count > 1:
+            lines.append(self.acquisition.rate.display_text())
         return "\n".join(lines)
 
     def update_sensor_display(self):
@@ -613,7 +939,7 @@ class ExhaustPage(tk.Frame):
             text=self.format_sensor_text()
         )
         if self.sensor_display_running:
-            self.after(500, self.update_sensor_display)
+            self._display_after_id = self.after(500, self.update_sensor_display)
 
     def update_timer(self, controller):
         minutes = self.remaining_time // 60
@@ -623,6 +949,10 @@ class ExhaustPage(tk.Frame):
             text=f"{minutes:02d}:{seconds:02d}"
         )
 
+        if self.gathering and self.reached_baseline():
+            self.gathering = False
+            self.stopped_at_baseline = True
+
         if self.remaining_time > 0 and self.gathering:
             self.remaining_time -= 1
             self._timer_after_id = self.after(
@@ -632,15 +962,18 @@ class ExhaustPage(tk.Frame):
             )
         else:
             self.gathering = False
+            # returns once no more samples can arrive, so the tail is final
             self.stop_serial()
+            self.save_recovery()
+            self.save_baseline()
             controller.show_frame(ClassificationPage)
 
     def stop_serial(self):
+        # non-blocking: the port is drained and closed on the acquisition thread
         self.gathering = False
         self.sensor_display_running = False
-        if self.ser:
-            close_serial(self.ser)
-            self.ser = None
+        if self.acquisition:
+            self.acquisition.cancel()
 
 
 if __name__ == "__main__":
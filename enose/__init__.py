@@ -0,0 +1 @@
+"""Shared code for the E-Nose kiosk apps and training notebooks."""
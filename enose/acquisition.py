@@ -0,0 +1,202 @@
+"""Serial acquisition shared by the kiosk pages."""
+import math
+import threading
+import time
+
+import serial
+
+from enose.ingest import DropoutStats, parse_line
+
+# Only one acquisition owns the port at a time. A new run waits here, on its
+# own worker thread, until the previous run has finished closing the port.
+_PORT_LOCK = threading.Lock()
+
+# ---------------- SERIAL PORT MANAGER ---------------- #
+def open_serial(port="/dev/ttyACM0", baud=9600):
+    for attempt in range(5):
+        try:
+            ser = serial.Serial(port, baud, timeout=1)
+            time.sleep(2)
+            return ser
+        except Exception as e:
+            print(f"Attempt {attempt+1} failed: {e}")
+            time.sleep(0.5)
+    print(f"Failed to open {port}")
+    return None
+
+def close_serial(ser):
+    if ser:
+        try:
+            ser.close()
+            time.sleep(0.5)
+        except Exception:
+            pass
+
+# ---------------- SAMPLE RATE ---------------- #
+class RateEstimator:
+    """
+    Online sample-rate and jitter estimate from successive timestamps (s).
+
+    The live values are exponentially weighted so the display follows
+    changes; summary() uses Welford statistics over the whole run. An
+    interval longer than ``gap_factor`` times the running interval counts
+    as a gap (dropped or late samples).
+    """
+
+    def __init__(self, alpha=0.05, gap_factor=2.0):
+        self.alpha = alpha
+        self.gap_factor = gap_factor
+        self.count = 0
+        self.first = None
+        self.last = None
+        self.gaps = 0
+        self._ewma_dt = None
+        self._ewma_var = 0.0
+        self._n_dt = 0
+        self._mean_dt = 0.0
+        self._m2_dt = 0.0
+
+    def update(self, t):
+        if self.last is None:
+            self.first = t
+        else:
+            dt = t - self.last
+            if self._ewma_dt is None:
+                self._ewma_dt = dt
+            else:
+                if dt > self.gap_factor * self._ewma_dt:
+                    self.gaps += 1
+                diff = dt - self._ewma_dt
+                self._ewma_dt += self.alpha * diff
+                self._ewma_var = (1 - self.alpha) * (self._ewma_var + self.alpha * diff * diff)
+
+            self._n_dt += 1
+            delta = dt - self._mean_dt
+            self._mean_dt += delta / self._n_dt
+            self._m2_dt += delta * (dt - self._mean_dt)
+        self.last = t
+        self.count += 1
+
+    @property
+    def rate_hz(self):
+        return 1.0 / self._ewma_dt if self._ewma_dt else 0.0
+
+    @property
+    def jitter_ms(self):
+        return math.sqrt(self._ewma_var) * 1000
+
+    def display_text(self):
+        return f"{self.rate_hz:.2f} Hz  jitter {self.jitter_ms:.0f} ms  gaps {self.gaps}"
+
+    def summary(self):
+        duration = (self.last - self.first) if self.count > 1 else 0.0
+        std_dt = math.sqrt(self._m2_dt / (self._n_dt - 1)) if self._n_dt > 1 else 0.0
+        return {
+            "samples": self.count,
+            "duration_s": round(duration, 3),
+            "rate_hz": round((self.count - 1) / duration, 4) if duration > 0 else 0.0,
+            "mean_interval_ms": round(self._mean_dt * 1000, 3),
+            "jitter_ms": round(std_dt * 1000, 3),
+            "gaps": self.gaps,
+        }
+
+# ---------------- ACQUISITION SERVICE ---------------- #
+class AcquisitionService:
+    """
+    Reads sensor rows on a background thread for a single run.
+
+    ``on_sample(vals, t, tick)`` is called on the worker thread for every
+    parsed row: ``t`` is the host monotonic time in seconds since start(),
+    taken as soon as the line arrives, and ``tick`` the device tick (ms) or
+    None. ``rate`` (host clock) and ``device_rate`` (device ticks) track the
+    sample rate and jitter live. Short or partly empty rows are delivered
+    with NaN for the missing sensors; ``dropout`` counts them per channel.
+    An optional ``despike`` filter (enose.despike.HampelFilter) sits between
+    the parser and ``on_sample`` and replaces single-sample spikes.
+    ``cancel()`` only signals the worker and returns immediately; once it has
+    returned no further samples are delivered, so statistics taken afterwards
+    are final. Draining and closing the port happen in the background.
+    """
+
+    def __init__(self, sensor_count, on_sample, port="/dev/ttyACM0", baud=9600, sensor_cols=None,
+                 despike=None):
+        self.sensor_count = sensor_count
+        self.on_sample = on_sample
+        self.port = port
+        self.baud = baud
+        self.lock = threading.Lock()
+        self._cancel = threading.Event()
+        self.thread = None
+        self.started = None
+        self.rate = RateEstimator()
+        self.device_rate = RateEstimator()
+        self.dropout = DropoutStats(sensor_cols or [str(i) for i in range(sensor_count)])
+        self.despike = despike
+
+    def start(self):
+        self.started = time.monotonic()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def cancel(self):
+        # taking the lock waits for an in-flight on_sample to finish
+        with self.lock:
+            self._cancel.set()
+
+    def is_alive(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def summary(self):
+        """Rate/jitter statistics for the run, recorded alongside its data."""
+        with self.lock:
+            stats = self.rate.summary()
+            if self.device_rate.count > 1:
+                device = self.device_rate.summary()
+                stats["device_rate_hz"] = device["rate_hz"]
+                stats["device_jitter_ms"] = device["jitter_ms"]
+            stats["dropout"] = self.dropout.summary()
+            if self.despike:
+                stats["despike"] = self.despike.summary()
+        return stats
+
+    def _run(self):
+        with _PORT_LOCK:
+            if self._cancel.is_set():
+                return
+
+            ser = open_serial(self.port, self.baud)
+            if not ser:
+                print(f"Could not open {self.port}, skipping acquisition")
+                return
+
+            try:
+                while not self._cancel.is_set():
+                    raw = ser.readline()
+                    t = time.monotonic() - self.started
+                    line = raw.decode("utf-8", errors="ignore").strip()
+                    if not line:
+                        continue
+
+                    parsed = parse_line(line, self.sensor_count)
+                    if parsed is None:
+                        with self.lock:
+                            self.dropout.rejected += 1
+                        continue
+                    vals, tick, nfields = parsed
+
+                    with self.lock:
+                        if self._cancel.is_set():
+                            break
+                        self.dropout.update_row(vals, nfields)
+                        if self.despike:
+                            vals = self.despike.update(vals)
+                        self.rate.update(t)
+                        if tick is not None:
+                            self.device_rate.update(tick / 1000.0)
+                        self.on_sample(vals, t, tick)
+
+            except Exception as e:
+                print(f"Error during data gathering: {e}")
+            finally:
+                close_serial(ser)
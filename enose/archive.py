@@ -0,0 +1,338 @@
+"""
+Chunk-compressed archive of raw sessions.
+
+Layout:
+    MAGIC, 4-byte header length, JSON header (sensors, codec, scale)
+    chunk, chunk, ...                 independently compressed
+    JSON index segment, 8-byte segment length, MAGIC
+    chunk, chunk, ...                 sessions appended later
+    JSON index segment, 8-byte segment length, MAGIC
+    ...
+
+Each chunk holds up to ``chunk_rows`` rows of one session. Sensor values are
+quantised to integers (``round(v * scale)``, scale 1 for raw ADC counts),
+delta-encoded per column and stored column by column; timestamps are
+delta-encoded integer microseconds. NaN is stored as the dtype's minimum
+value. Deltas use wrap-around integer arithmetic, so decoding with cumsum is
+exact. Chunks are compressed with zstd when the ``zstandard`` package is
+installed and zlib otherwise.
+
+The archive is append-only: a writer never rewrites what is already in
+the file. Each close() adds an index segment with the sessions and chunks
+written since the previous segment and where that one ends ("prev"). The
+reader follows the chain from the last intact footer; if the kiosk died
+mid-run, the unindexed chunks at the end are skipped (and overwritten by
+the next writer) and every earlier session stays readable.
+
+The merged index gives random access to any chunk, and ``iter_blocks``
+streams one decompressed chunk at a time, so a notebook can scan the whole
+archive in bounded memory:
+
+    for name, t, values in ArchiveReader("sessions.enz").iter_blocks():
+        ...
+
+    python -m enose.archive add sessions.enz gathered_data.ens --name run-42
+    python -m enose.archive info sessions.enz
+"""
+import argparse
+import json
+import os
+import struct
+import threading
+import zlib
+
+import numpy as np
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+MAGIC = b"ENOSEARC"
+ARCHIVE_VERSION = 2  # 1: a single index, rewritten on every append
+_SCAN_BLOCK = 1 << 16
+VALUE_NAN = np.iinfo(np.int32).min
+TIME_NAN = np.iinfo(np.int64).min
+
+_HEADER_LEN = struct.Struct("<I")
+_INDEX_LEN = struct.Struct("<Q")
+
+# archives are appended from background threads in the app
+_WRITE_LOCK = threading.Lock()
+
+def default_codec():
+    return "zstd" if zstandard is not None else "zlib"
+
+def _compress(codec, data):
+    if codec == "zstd":
+        if zstandard is None:
+            raise ImportError("zstandard is required for zstd archives")
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    return zlib.compress(data, 6)
+
+def _decompress(codec, data):
+    if codec == "zstd":
+        if zstandard is None:
+            raise ImportError("zstandard is required for zstd archives")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+def _delta(a):
+    out = np.empty_like(a)
+    if len(a):
+        out[0] = a[0]
+        np.subtract(a[1:], a[:-1], out=out[1:])
+    return out
+
+# ---------------- ENCODE / DECODE ---------------- #
+def encode_chunk(t, values, scale):
+    """t: (n,) seconds, values: (n, k) floats -> bytes (uncompressed)."""
+    n, k = values.shape
+    q = np.round(values * scale)
+    q = np.where(np.isnan(q), VALUE_NAN, q).astype(np.int32)
+    us = np.round(np.asarray(t, dtype=float) * 1e6)
+    us = np.where(np.isnan(us), TIME_NAN, us).astype(np.int64)
+    with np.errstate(over="ignore"):
+        dq = np.stack([_delta(q[:, j]) for j in range(k)]) if k else np.zeros((0, n), np.int32)
+        dt = _delta(us)
+    return dt.tobytes() + np.ascontiguousarray(dq).tobytes()
+
+def decode_chunk(data, rows, sensor_count, scale, columns=None):
+    dt = np.frombuffer(data, dtype=np.int64, count=rows)
+    dq = np.frombuffer(data, dtype=np.int32, offset=rows * 8).reshape(sensor_count, rows)
+    us = np.cumsum(dt, dtype=np.int64)
+    t = np.where(us == TIME_NAN, np.nan, us / 1e6)
+
+    cols = range(sensor_count) if columns is None else columns
+    values = np.empty((rows, len(cols)), dtype=float)
+    for out_j, j in enumerate(cols):
+        q = np.cumsum(dq[j], dtype=np.int32)
+        values[:, out_j] = np.where(q == VALUE_NAN, np.nan, q / scale)
+    return t, values
+
+# ---------------- WRITER ---------------- #
+class ArchiveWriter:
+    """Append sessions to a new or existing archive; call close() to write their index segment."""
+
+    def __init__(self, path, sensor_cols, codec=None, chunk_rows=4096, scale=1.0):
+        self.path = path
+        self.chunk_rows = chunk_rows
+        self._prev = None
+        self._first_new = 0
+        self._new_sessions = []
+
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            reader = ArchiveReader(path)
+            if reader.sensor_cols != list(sensor_cols):
+                raise ValueError(f"{path} holds sensors {reader.sensor_cols}, not {list(sensor_cols)}")
+            self.header = reader.header
+            self.index = reader.index
+            self._prev = reader.data_end
+            self._first_new = len(self.index["chunks"])
+            self._f = open(path, "r+b")
+            # only chunks of a run that died before its index are dropped
+            self._f.seek(reader.data_end)
+            self._f.truncate()
+        else:
+            self.header = {
+                "version": ARCHIVE_VERSION,
+                "sensors": list(sensor_cols),
+                "codec": codec or default_codec(),
+                "scale": scale,
+            }
+            self.index = {"sessions": {}, "chunks": []}
+            raw = json.dumps(self.header).encode("utf-8")
+            self._f = open(path, "wb")
+            self._f.write(MAGIC + _HEADER_LEN.pack(len(raw)) + raw)
+
+    def add_session(self, name, values, t=None, meta=None):
+        values = np.asarray(values, dtype=float).reshape(-1, len(self.header["sensors"]))
+        n = len(values)
+        t = np.full(n, np.nan) if t is None else np.asarray(t, dtype=float)
+        if name in self.index["sessions"]:
+            raise ValueError(f"Session {name!r} already archived")
+
+        first_chunk = len(self.index["chunks"])
+        for start in range(0, n, self.chunk_rows):
+            stop = min(start + self.chunk_rows, n)
+            blob = _compress(self.header["codec"],
+                             encode_chunk(t[start:stop], values[start:stop], self.header["scale"]))
+            self.index["chunks"].append({
+                "session": name, "offset": self._f.tell(), "size": len(blob), "rows": stop - start,
+            })
+            self._f.write(blob)
+
+        self.index["sessions"][name] = {
+            "rows": n, "chunks": [first_chunk, len(self.index["chunks"])], "meta": meta or {},
+        }
+        self._new_sessions.append(name)
+
+    def close(self):
+        if self._f.closed:
+            return
+        if self._new_sessions or self._prev is None:
+            segment = {
+                "prev": self._prev,
+                "sessions": {n: self.index["sessions"][n] for n in self._new_sessions},
+                "chunks": self.index["chunks"][self._first_new:],
+            }
+            raw = json.dumps(segment).encode("utf-8")
+            self._f.write(raw + _INDEX_LEN.pack(len(raw)) + MAGIC)
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# ---------------- READER ---------------- #
+class ArchiveReader:
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not an E-Nose archive")
+            (hlen,) = _HEADER_LEN.unpack(f.read(_HEADER_LEN.size))
+            self.header = json.loads(f.read(hlen).decode("utf-8"))
+            data_start = f.tell()
+
+            found = self._last_footer(f, data_start)
+            if found is None:
+                raise ValueError(f"{path} has no index (archive was never closed)")
+            self.data_end, segment = found
+            segments = [segment]
+            while segment.get("prev") is not None:
+                segment = self._segment_ending_at(f, segment["prev"], data_start)
+                if segment is None:
+                    raise ValueError(f"{path} has a broken index chain")
+                segments.append(segment)
+
+        self.index = {"sessions": {}, "chunks": []}
+        for segment in reversed(segments):
+            self.index["sessions"].update(segment["sessions"])
+            self.index["chunks"].extend(segment["chunks"])
+        self.sensor_cols = self.header["sensors"]
+
+    @staticmethod
+    def _segment_ending_at(f, end, data_start):
+        """The index segment whose footer ends at ``end``, or None if there is none intact."""
+        footer = _INDEX_LEN.size + len(MAGIC)
+        if end - footer < data_start:
+            return None
+        f.seek(end - footer)
+        tail = f.read(footer)
+        if tail[_INDEX_LEN.size:] != MAGIC:
+            return None
+        (ilen,) = _INDEX_LEN.unpack(tail[:_INDEX_LEN.size])
+        start = end - footer - ilen
+        if start < data_start:
+            return None
+        f.seek(start)
+        try:
+            segment = json.loads(f.read(ilen).decode("utf-8"))
+        except ValueError:
+            return None
+        return segment if isinstance(segment, dict) and "chunks" in segment else None
+
+    @classmethod
+    def _last_footer(cls, f, data_start):
+        """
+        (end offset, segment) of the last intact index segment, scanning
+        back over chunks a crashed writer left without one.
+        """
+        end = f.seek(0, os.SEEK_END)
+        segment = cls._segment_ending_at(f, end, data_start)
+        if segment is not None:
+            return end, segment
+        while end > data_start:
+            lo = max(data_start, end - _SCAN_BLOCK)
+            f.seek(lo)
+            block = f.read(end - lo)
+            hit = block.rfind(MAGIC)
+            while hit >= 0:
+                segment = cls._segment_ending_at(f, lo + hit + len(MAGIC), data_start)
+                if segment is not None:
+                    return lo + hit + len(MAGIC), segment
+                hit = block.rfind(MAGIC, 0, hit)
+            # a MAGIC straddling the block boundary is found in the next block
+            end = lo + len(MAGIC) - 1 if lo > data_start else data_start
+        return None
+
+    def sessions(self):
+        return list(self.index["sessions"])
+
+    def _columns(self, columns):
+        if columns is None:
+            return None
+        return [self.sensor_cols.index(c) for c in columns]
+
+    def read_chunk(self, i, columns=None, f=None):
+        entry = self.index["chunks"][i]
+        if f is None:
+            with open(self.path, "rb") as f:
+                return self.read_chunk(i, columns, f)
+        f.seek(entry["offset"])
+        data = _decompress(self.header["codec"], f.read(entry["size"]))
+        return decode_chunk(data, entry["rows"], len(self.sensor_cols), self.header["scale"],
+                            self._columns(columns))
+
+    def iter_blocks(self, sessions=None, columns=None):
+        """Yield (session, t, values) one chunk at a time."""
+        wanted = None if sessions is None else set(sessions)
+        with open(self.path, "rb") as f:
+            for i, entry in enumerate(self.index["chunks"]):
+                if wanted is not None and entry["session"] not in wanted:
+                    continue
+                t, values = self.read_chunk(i, columns, f)
+                yield entry["session"], t, values
+
+    def read_session(self, name, columns=None):
+        blocks = [(t, v) for _, t, v in self.iter_blocks([name], columns)]
+        if not blocks:
+            return np.zeros(0), np.zeros((0, len(columns or self.sensor_cols)))
+        return np.concatenate([b[0] for b in blocks]), np.concatenate([b[1] for b in blocks])
+
+# ---------------- HELPERS ---------------- #
+def append_session_file(archive_path, session_path, name, meta=None, codec=None):
+    """Archive one enose.session_file (.ens) under ``name``."""
+    from enose.session_file import open_session, session_values
+
+    header, records = open_session(session_path)
+    values = session_values(records, header["sensors"]) if len(records) else np.zeros((0, len(header["sensors"])))
+    t = np.array(records["t"])
+    del records
+
+    meta = dict(meta or {}, start_time=header.get("start_time"), firmware=header.get("firmware", ""))
+    with _WRITE_LOCK:
+        with ArchiveWriter(archive_path, header["sensors"], codec=codec) as writer:
+            writer.add_session(name, values, t, meta)
+    return len(values)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the raw session archive.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("add")
+    p.add_argument("archive")
+    p.add_argument("session", help=".ens session file")
+    p.add_argument("--name")
+    p = sub.add_parser("info")
+    p.add_argument("archive")
+    args = parser.parse_args(argv)
+
+    if args.cmd == "add":
+        name = args.name or os.path.splitext(os.path.basename(args.session))[0]
+        print(f"Archived {append_session_file(args.archive, args.session, name)} rows as {name!r}.")
+    else:
+        reader = ArchiveReader(args.archive)
+        size = os.path.getsize(args.archive)
+        rows = sum(s["rows"] for s in reader.index["sessions"].values())
+        print(f"{len(reader.sessions())} sessions, {rows} rows, {len(reader.index['chunks'])} chunks, "
+              f"{size} bytes ({reader.header['codec']})")
+        for name, s in reader.index["sessions"].items():
+            print(f"  {name}: {s['rows']} rows")
+
+if __name__ == "__main__":
+    main()
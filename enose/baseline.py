@@ -0,0 +1,152 @@
+"""
+Clean-air baseline taken from the tail of the exhaust phase.
+
+The data-gathering notebook records a minute of clean-air readings
+(baseline.csv) and subtracts their average from every sauce reading. The
+kiosk gets the same baseline without extra chamber time: BaselineTail
+averages the last ``tail_s`` seconds of the exhaust stream as it arrives,
+and when the exhaust completes the result is cached on disk with the time
+it was captured. A reading run loads the cached baseline if it is younger
+than ``max_age_s`` and subtracts it from each sample before the features
+are accumulated, so there is no extra pass over the samples.
+
+Corrected and raw features are not interchangeable: a run is corrected
+only for a model whose artifact records ``baseline_subtracted``
+(enose.pipeline), and check_baseline_mode() refuses a prediction when the
+run and the model disagree, e.g. no fresh baseline was cached.
+
+    python -m enose.baseline show Article1/baseline_cache.json
+    python -m enose.baseline from-csv baseline.csv Article1/baseline_cache.json
+"""
+import argparse
+import collections
+import json
+import math
+import os
+import tempfile
+import time
+
+# ---------------- CAPTURE ---------------- #
+class BaselineTail:
+    """Running per-sensor mean of the samples in the last ``tail_s`` seconds."""
+
+    def __init__(self, sensor_cols, tail_s=60):
+        self.sensor_cols = list(sensor_cols)
+        self.tail_s = tail_s
+        self._window = collections.deque()
+        self._n = [0] * len(self.sensor_cols)
+        self._sums = [0.0] * len(self.sensor_cols)
+
+    def update(self, vals, t):
+        self._window.append((t, vals))
+        self._add(vals, 1)
+        while t - self._window[0][0] > self.tail_s:
+            _, old = self._window.popleft()
+            self._add(old, -1)
+
+    def _add(self, vals, sign):
+        for i, v in enumerate(vals):
+            if v == v:  # not NaN
+                self._n[i] += sign
+                self._sums[i] += sign * v
+
+    def result(self):
+        """The baseline of the current window, or None before the first sample."""
+        if not self._window:
+            return None
+        return {
+            "sensors": list(self.sensor_cols),
+            "values": [s / n if n else math.nan for s, n in zip(self._sums, self._n)],
+            "samples": len(self._window),
+            "window_s": round(self._window[-1][0] - self._window[0][0], 3),
+        }
+
+def baseline_values(baseline, sensor_cols):
+    """Baseline levels in ``sensor_cols`` order (NaN where none was captured)."""
+    by_name = dict(zip(baseline["sensors"], baseline["values"]))
+    return [by_name.get(c, math.nan) for c in sensor_cols]
+
+def baseline_offsets(baseline, sensor_cols):
+    """Per-sensor values to subtract, in ``sensor_cols`` order (0 where none was captured)."""
+    return [0.0 if v != v else v for v in baseline_values(baseline, sensor_cols)]
+
+def subtract_baseline(vals, offsets):
+    return [v - b for v, b in zip(vals, offsets)]
+
+def check_baseline_mode(model_wants, baseline):
+    """Raise ValueError unless the run was corrected (``baseline`` given) exactly when the model wants it."""
+    if model_wants and not baseline:
+        raise ValueError("No fresh clean-air baseline for this model; run the exhaust first")
+    if baseline and not model_wants:
+        raise ValueError("Run was baseline-corrected but the model was trained on raw readings")
+
+# ---------------- CACHE ---------------- #
+class BaselineCache:
+    """One JSON file holding the latest baseline and when it was captured."""
+
+    def __init__(self, path, sensor_cols, max_age_s=2 * 3600):
+        self.path = path
+        self.sensor_cols = list(sensor_cols)
+        self.max_age_s = max_age_s
+
+    def save(self, baseline, captured_at=None):
+        baseline = dict(baseline, captured_at=time.time() if captured_at is None else captured_at)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(baseline, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        return baseline
+
+    def load(self, now=None):
+        """Return the cached baseline with its ``age_s``, or None if missing or expired."""
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path) as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable baseline {self.path}: {e}")
+            return None
+
+        age = (time.time() if now is None else now) - baseline.get("captured_at", 0)
+        if age > self.max_age_s or age < 0:
+            return None
+        if not set(self.sensor_cols) & set(baseline.get("sensors", [])):
+            return None
+        baseline["age_s"] = round(age, 1)
+        return baseline
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect or seed the cached clean-air baseline.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("show")
+    p.add_argument("cache")
+    p = sub.add_parser("from-csv", help="seed the cache from the notebook's baseline.csv")
+    p.add_argument("csv")
+    p.add_argument("cache")
+    args = parser.parse_args(argv)
+
+    if args.cmd == "show":
+        with open(args.cache) as f:
+            baseline = json.load(f)
+        when = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(baseline["captured_at"]))
+        print(f"captured {when} from {baseline.get('samples', '?')} samples")
+        for name, value in zip(baseline["sensors"], baseline["values"]):
+            print(f"  {name:>6}: {value:.2f}")
+    else:
+        from enose.ingest import read_sensor_csv
+
+        frame, _ = read_sensor_csv(args.csv)
+        cols = [c for c in frame.columns if c not in ("Label", "Trial")]
+        baseline = {
+            "sensors": cols,
+            "values": [float(v) for v in frame[cols].mean()],
+            "samples": len(frame),
+        }
+        BaselineCache(args.cache, cols).save(baseline, captured_at=os.path.getmtime(args.csv))
+        print(f"Cached baseline of {len(frame)} rows from {args.csv}")
+
+if __name__ == "__main__":
+    main()
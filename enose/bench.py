@@ -0,0 +1,220 @@
+"""
+Validation and latency benchmark for model artifacts.
+
+validation_article2.ipynb scores one hard-coded artifact and plots its
+confusion matrix. ``bench`` runs any number of artifacts - the Article1
+SVM, the Article2 ensemble, distilled students (enose.distill), registry
+versions (enose.registry) - through the same checks:
+
+  * quality on each dataset: accuracy, macro F1 and the confusion matrix.
+    A ``--data`` CSV is used whole (validationset_article2.csv); a
+    ``--holdout`` CSV is split like the training notebooks (30 %,
+    stratified, random_state=42) and only its test part is scored;
+  * cost: file size, cold-load time (median of fresh interpreters,
+    imports included), p50/p99 latency of one-row predict as the kiosk
+    calls it, and batch throughput in rows per second.
+
+The results go to JSON. ``--baseline`` compares with an earlier report
+and exits 1 when an artifact's macro F1 drops or its latency grows past
+the given limits, so it can run after every retrain.
+
+    python -m enose.bench Article1/svm_best_model.joblib Article2/ensemble_model.joblib Article2/models --data Article2/validationset_article2.csv --holdout Article2/final_trainingset.csv -o bench.json
+    python -m enose.bench Article2/models --data Article2/validationset_article2.csv --baseline bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from enose.pipeline import load_artifact
+from enose.registry import ModelRegistry
+
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LABEL_ENCODER_FILE = "label_encoder.joblib"
+BATCH_ROWS = 1000
+
+# ---------------- MEASUREMENTS ---------------- #
+def cold_load_s(path, label_encoder_path=None):
+    """Seconds to import enose.pipeline and load ``path`` in a fresh interpreter."""
+    code = ("import time; t = time.perf_counter(); from enose.pipeline import load_artifact; "
+            f"load_artifact({path!r}, {label_encoder_path!r}); print(time.perf_counter() - t)")
+    out = subprocess.run([sys.executable, "-W", "ignore", "-c", code], cwd=PACKAGE_ROOT,
+                         capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+def row_latency_ms(artifact, X, repeats=200):
+    """(p50, p99) milliseconds of artifact.predict on one row, as the kiosk calls it."""
+    X = np.asarray(X, dtype=float)
+    artifact.predict(X[:1])
+    times = []
+    for i in range(repeats):
+        row = X[i % len(X)][None, :]
+        started = time.perf_counter()
+        artifact.predict(row)
+        times.append((time.perf_counter() - started) * 1000)
+    return float(np.percentile(times, 50)), float(np.percentile(times, 99))
+
+def throughput(artifact, X, rows=BATCH_ROWS, min_s=0.5):
+    """Rows per second of artifact.predict on ``rows``-row batches."""
+    X = np.asarray(X, dtype=float)
+    batch = np.resize(X, (rows, X.shape[1]))
+    done, started = 0, time.perf_counter()
+    while True:
+        artifact.predict(batch)
+        done += rows
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_s:
+            return done / elapsed
+
+def quality(artifact, X, y):
+    """Accuracy, macro F1 and confusion matrix (rows: true label) of decoded predictions."""
+    from sklearn.metrics import accuracy_score, confusion_matrix, f1_score
+
+    pred = artifact.predict(X)
+    labels = sorted(set(artifact.classes()) | set(y))
+    return {
+        "rows": int(len(y)),
+        "accuracy": round(float(accuracy_score(y, pred)), 4),
+        "f1_macro": round(float(f1_score(y, pred, average="macro")), 4),
+        "labels": labels,
+        "confusion": confusion_matrix(y, pred, labels=labels).tolist(),
+    }
+
+# ---------------- DATASETS ---------------- #
+def load_datasets(data=(), holdout=(), test_size=0.3):
+    """{name: frame} of whole ``data`` CSVs and the test split of ``holdout`` CSVs."""
+    import pandas as pd
+    from sklearn.model_selection import train_test_split
+
+    datasets = {}
+    for path in data:
+        datasets[os.path.basename(path)] = pd.read_csv(path)
+    for path in holdout:
+        frame = pd.read_csv(path)
+        _, test = train_test_split(frame, test_size=test_size, random_state=42, stratify=frame["Label"])
+        datasets[f"{os.path.basename(path)}:holdout"] = test
+    if not datasets:
+        raise ValueError("Nothing to score: give --data and/or --holdout CSVs")
+    return datasets
+
+def resolve(path, label_encoder_path=None):
+    """(artifact file, label encoder file) of a file or model registry directory."""
+    if os.path.isdir(path):
+        current = ModelRegistry(path).path()
+        if current is None:
+            raise ValueError(f"Model registry {path} has no current version")
+        path = current
+    if label_encoder_path is None:
+        # a bare ensemble saved by the Article2 notebook keeps its encoder alongside
+        sibling = os.path.join(os.path.dirname(os.path.abspath(path)), LABEL_ENCODER_FILE)
+        label_encoder_path = sibling if os.path.exists(sibling) else None
+    return path, label_encoder_path
+
+# ---------------- BENCHMARK ---------------- #
+def bench_artifact(path, datasets, label_encoder_path=None, cold_runs=3, repeats=200):
+    """Quality on every dataset and cost of one artifact file or registry directory."""
+    file, encoder = resolve(path, label_encoder_path)
+    artifact = load_artifact(file, encoder)
+    result = {"path": os.path.abspath(file), "model": type(artifact.model).__name__,
+              "features": len(artifact.features), "size_bytes": os.path.getsize(file), "datasets": {}}
+    rows = []
+    for name, frame in datasets.items():
+        X = artifact.pipeline.table(frame).to_numpy(dtype=float)
+        rows.append(X)
+        result["datasets"][name] = quality(artifact, X, frame["Label"].to_numpy())
+    X = np.vstack(rows)
+    p50, p99 = row_latency_ms(artifact, X, repeats)
+    result.update({
+        "cold_load_s": round(float(np.median([cold_load_s(file, encoder) for _ in range(cold_runs)])), 3),
+        "row_ms_p50": round(p50, 3),
+        "row_ms_p99": round(p99, 3),
+        "batch_rows_per_s": round(throughput(artifact, X)),
+    })
+    return result
+
+def environment():
+    import sklearn
+
+    libraries = {"python": platform.python_version(), "numpy": np.__version__, "sklearn": sklearn.__version__}
+    try:
+        import xgboost
+        libraries["xgboost"] = xgboost.__version__
+    except ImportError:
+        pass
+    return {"machine": platform.machine(), "platform": platform.platform(), "cpus": os.cpu_count(),
+            "libraries": libraries}
+
+def regressions(report, baseline, max_f1_drop=0.01, max_slowdown=1.5):
+    """Messages for artifacts (matched by name) that lost F1 or latency against ``baseline``."""
+    old = {os.path.basename(a["name"]): a for a in baseline["artifacts"]}
+    found = []
+    for artifact in report["artifacts"]:
+        before = old.get(os.path.basename(artifact["name"]))
+        if before is None:
+            continue
+        for dataset, scores in artifact["datasets"].items():
+            was = before["datasets"].get(dataset)
+            if was and scores["f1_macro"] < was["f1_macro"] - max_f1_drop:
+                found.append(f"{artifact['name']} on {dataset}: F1 {was['f1_macro']} -> {scores['f1_macro']}")
+        if artifact["row_ms_p50"] > before["row_ms_p50"] * max_slowdown:
+            found.append(f"{artifact['name']}: p50 {before['row_ms_p50']} -> {artifact['row_ms_p50']} ms/row")
+    return found
+
+def _print_artifact(a):
+    print(f"{a['name']}  ({a['model']}, {a['size_bytes'] / 1024:.1f} KB)")
+    for dataset, s in a["datasets"].items():
+        print(f"  {dataset:<34} acc {s['accuracy']:.3f}  F1 {s['f1_macro']:.3f}  ({s['rows']} rows)")
+    print(f"  cold load {a['cold_load_s']} s  row p50 {a['row_ms_p50']} ms  p99 {a['row_ms_p99']} ms  "
+          f"batch {a['batch_rows_per_s']} rows/s")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score and time model artifacts.")
+    parser.add_argument("artifacts", nargs="+", help="artifact files or model registry directories")
+    parser.add_argument("--data", nargs="*", default=[], help="Label + feature CSVs scored whole")
+    parser.add_argument("--holdout", nargs="*", default=[],
+                        help="training CSVs whose 30%% test split (random_state=42) is scored")
+    parser.add_argument("--label-encoder", help="for bare estimators (default: label_encoder.joblib alongside)")
+    parser.add_argument("--cold-runs", type=int, default=3)
+    parser.add_argument("--repeats", type=int, default=200, help="single-row predictions timed")
+    parser.add_argument("--confusion", action="store_true", help="print the confusion matrices")
+    parser.add_argument("-o", "--output", help="write the report as JSON")
+    parser.add_argument("--baseline", help="earlier report to check for regressions")
+    parser.add_argument("--max-f1-drop", type=float, default=0.01)
+    parser.add_argument("--max-slowdown", type=float, default=1.5, help="allowed p50 latency factor")
+    args = parser.parse_args(argv)
+
+    datasets = load_datasets(args.data, args.holdout)
+    report = {"at": time.strftime("%Y-%m-%d %H:%M:%S"), "environment": environment(), "artifacts": []}
+    for path in args.artifacts:
+        try:
+            result = dict(name=path, **bench_artifact(path, datasets, args.label_encoder,
+                                                      args.cold_runs, args.repeats))
+        except Exception as e:
+            print(f"{path}: {e}")
+            continue
+        report["artifacts"].append(result)
+        _print_artifact(result)
+        if args.confusion:
+            for dataset, s in result["datasets"].items():
+                print(f"  {dataset} (rows: true, columns: predicted; {', '.join(s['labels'])})")
+                for label, row in zip(s["labels"], s["confusion"]):
+                    print(f"    {label:<22} " + " ".join(f"{n:>3}" for n in row))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(report, json.load(f), args.max_f1_drop, args.max_slowdown)
+        for message in found:
+            print(f"REGRESSION {message}")
+        if found:
+            raise SystemExit(1)
+        print(f"No regressions against {args.baseline}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Crash-safe checkpoints of an in-progress gathering run.
+
+Every ``interval_s`` seconds the reading page snapshots the run's streaming
+feature state (enose.features), the timer and the number of raw
+records written so far. The raw session file is fsynced first, then the
+small JSON state is written to a temp file and renamed over the previous
+one, so the state on disk always describes a prefix of the raw file that
+is already durable. Only the few rows gathered since the last checkpoint
+are written each time.
+
+On startup ``load()`` returns the state of an unfinished run. Resuming
+truncates the raw file back to ``raw_records`` (rows after the last
+checkpoint are not in the feature state) and keeps appending; finalizing
+takes the features straight from that state, so neither reads the raw
+file back.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+
+from enose.durability import _fsync_dir
+
+CHECKPOINT_VERSION = 2
+
+# ---------------- CHECKPOINT FILE ---------------- #
+class RunCheckpoint:
+    """
+    Owns one checkpoint state file.
+
+    ``save_async`` does the fsyncs on a worker thread so the Tk timer never
+    waits for the SD card. ``clear()`` drops any save still in flight, so a
+    finished run can never be resurrected by a late checkpoint.
+    """
+
+    def __init__(self, path, interval_s=10):
+        self.path = path
+        self.interval_s = interval_s
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._busy = False
+        self._last = None
+
+    def due(self):
+        now = time.monotonic()
+        if self._busy or (self._last is not None and now - self._last < self.interval_s):
+            return False
+        self._last = now
+        return True
+
+    def save_async(self, state, raw=None):
+        """Write ``state`` in the background after fsyncing the ``raw`` SessionWriter."""
+        generation = self._generation
+        self._busy = True
+        threading.Thread(target=self._save, args=(state, raw, generation), daemon=True).start()
+
+    def _save(self, state, raw, generation):
+        try:
+            if raw is not None:
+                raw.sync()
+            with self._lock:
+                if generation != self._generation:
+                    return
+                state = dict(state, version=CHECKPOINT_VERSION, saved_at=time.time())
+                fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)),
+                                           suffix=".tmp")
+                with os.fdopen(fd, "w") as f:
+                    json.dump(state, f)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp, self.path)
+                _fsync_dir(self.path)
+        except (OSError, ValueError) as e:
+            # the raw writer may have been closed by the end of the run
+            print(f"Checkpoint not written: {e}")
+        finally:
+            self._busy = False
+
+    def load(self):
+        """Return the state of an unfinished run, or None."""
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable checkpoint {self.path}: {e}")
+            return None
+        if state.get("version") != CHECKPOINT_VERSION:
+            return None
+        return state
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._last = None
+            if os.path.exists(self.path):
+                os.remove(self.path)
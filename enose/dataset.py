@@ -0,0 +1,231 @@
+"""
+Partitioned Parquet dataset of every recorded trial.
+
+The exporter reads the per-sauce CSVs written by the data-gathering notebook
+(``soy_sauce.csv``, ``fish_sauce.csv`` ...) and/or the raw session archive
+and writes a hive-partitioned dataset:
+
+    <root>/Label=Soy Sauce/Date=2026-02-26/Trial=3/part-0.parquet
+
+Trial numbers do not collide between sources: notebook CSV trials keep
+their own numbers (below ARCHIVE_TRIALS) and a kiosk run in the k-th
+``--archive`` is trial ``k * ARCHIVE_TRIALS + session id``, so runs from
+the Article1 and Article2 archives never share a partition. Give the
+archives in the same order on every export.
+
+Sensor columns are float32, Parquet min/max statistics are written for every
+column, and the loader pushes column selection and Label/Date/Trial filters
+down to pyarrow, so building features for one sauce only reads that sauce's
+files and the sensors asked for.
+
+    python -m enose.dataset export dataset/ --csv soy_sauce.csv fish_sauce.csv
+    python -m enose.dataset export dataset/ --archive Article1/sessions_archive.enz --db Article1/enose_sessions.db
+    python -m enose.dataset export dataset/ --csv soy_sauce.csv --archive Article1/sessions_archive.enz Article2/sessions_archive.enz --db Article1/enose_sessions.db Article2/enose_sessions.db
+
+    from enose.dataset import load_dataset
+    df = load_dataset("dataset/", columns=["MQ2", "MQ3"], labels=["Soy Sauce"])
+    for trial, group in df.groupby("Trial"): ...
+
+Requires pyarrow (``pip install pyarrow``).
+"""
+import argparse
+import datetime
+import os
+import re
+
+import numpy as np
+
+from enose.ingest import read_sensor_csv
+
+SENSOR_COLS = ["MQ2", "MQ3", "MQ135", "MQ136", "MQ137", "MQ138"]
+PARTITION_COLS = ["Label", "Date", "Trial"]
+ARCHIVE_TRIALS = 1000000  # trial-number block of each archive; CSV trials stay below it
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.dataset
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("enose.dataset needs pyarrow: pip install pyarrow") from e
+    return pyarrow
+
+def dataset_schema(sensor_cols=SENSOR_COLS):
+    pa = _pyarrow()
+    return pa.schema(
+        [("Label", pa.string()), ("Date", pa.string()), ("Trial", pa.int32()),
+         ("Seq", pa.int32()), ("t", pa.float64())]
+        + [(c, pa.float32()) for c in sensor_cols]
+    )
+
+def partitioning():
+    pa = _pyarrow()
+    return pa.dataset.partitioning(
+        pa.schema([("Label", pa.string()), ("Date", pa.string()), ("Trial", pa.int32())]),
+        flavor="hive",
+    )
+
+# ---------------- SOURCES ---------------- #
+def _trial_number(value):
+    m = re.search(r"\d+", str(value))
+    return int(m.group()) if m else 0
+
+def iter_csv_trials(path, sensor_cols=SENSOR_COLS):
+    """Yield (label, date, trial, t, values) per trial of a per-sauce CSV."""
+    date = datetime.date.fromtimestamp(os.path.getmtime(path)).isoformat()
+    default_label = os.path.splitext(os.path.basename(path))[0].replace("_", " ").title()
+
+    # block parse; empty or unparsable readings become NaN (see enose.ingest)
+    frame, _ = read_sensor_csv(path, sensor_cols)
+    labels = frame["Label"].fillna("").replace("", default_label) if "Label" in frame else default_label
+    trials = frame["Trial"].map(_trial_number) if "Trial" in frame else 0
+    frame = frame.assign(Label=labels, Trial=trials)
+
+    if (frame["Trial"] >= ARCHIVE_TRIALS).any():
+        raise ValueError(f"{path}: trial numbers must stay below {ARCHIVE_TRIALS}")
+
+    for (label, trial), group in frame.groupby(["Label", "Trial"], sort=False):
+        values = group[list(sensor_cols)].to_numpy(dtype=float)
+        yield label, date, int(trial), np.full(len(values), np.nan), values
+
+def _session_id(name, meta):
+    if "session_id" in meta:
+        return int(meta["session_id"])
+    m = re.fullmatch(r"session-(\d+)", name)
+    return int(m.group(1)) if m else None
+
+def iter_archive_trials(path, sensor_cols=SENSOR_COLS, labels=None, archive_no=1):
+    """
+    Yield (label, date, trial, t, values) per archived session.
+
+    The kiosk archives a run before its label is confirmed, so ``labels``
+    ({session id: label} of this archive's store, see SessionStore.labels)
+    supplies it; sessions without one are exported as "Unknown". The trial
+    is ``archive_no * ARCHIVE_TRIALS`` plus the session id (or the
+    session's position for archives not written by the kiosk).
+    """
+    from enose.archive import ArchiveReader
+
+    labels = labels or {}
+    reader = ArchiveReader(path)
+    cols = [c for c in sensor_cols if c in reader.sensor_cols]
+    for n, (name, info) in enumerate(reader.index["sessions"].items(), start=1):
+        meta = info.get("meta", {})
+        started = meta.get("start_time")
+        date = datetime.date.fromtimestamp(started).isoformat() if started else "unknown"
+        t, values = reader.read_session(name, columns=cols)
+        if cols != list(sensor_cols):
+            full = np.full((len(values), len(sensor_cols)), np.nan)
+            for j, c in enumerate(cols):
+                full[:, sensor_cols.index(c)] = values[:, j]
+            values = full
+        session_id = _session_id(name, meta)
+        label = meta.get("label") or labels.get(session_id) or "Unknown"
+        trial = session_id if session_id is not None else int(meta.get("trial", n))
+        yield label, date, archive_no * ARCHIVE_TRIALS + trial, t, values
+
+# ---------------- EXPORT ---------------- #
+def _batches(trials, schema, sensor_cols):
+    pa = _pyarrow()
+    for label, date, trial, t, values in trials:
+        n = len(values)
+        if n == 0:
+            continue
+        arrays = [
+            pa.array([label] * n, pa.string()),
+            pa.array([date] * n, pa.string()),
+            pa.array(np.full(n, trial, dtype=np.int32)),
+            pa.array(np.arange(n, dtype=np.int32)),
+            pa.array(np.asarray(t, dtype=np.float64)),
+        ] + [pa.array(values[:, j].astype(np.float32)) for j in range(len(sensor_cols))]
+        yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+def export_dataset(root, trials, sensor_cols=SENSOR_COLS):
+    """Write an iterable of (label, date, trial, t, values) as a partitioned dataset."""
+    pa = _pyarrow()
+    schema = dataset_schema(sensor_cols)
+    count = {"rows": 0}
+
+    def counted():
+        for batch in _batches(trials, schema, sensor_cols):
+            count["rows"] += batch.num_rows
+            yield batch
+
+    pa.dataset.write_dataset(
+        counted(),
+        root,
+        schema=schema,
+        format="parquet",
+        partitioning=partitioning(),
+        existing_data_behavior="delete_matching",
+        file_options=pa.dataset.ParquetFileFormat().make_write_options(
+            write_statistics=True, compression="zstd"),
+    )
+    return count["rows"]
+
+# ---------------- LOAD ---------------- #
+def load_dataset(root, columns=None, labels=None, dates=None, trials=None, filter=None,
+                 as_pandas=True):
+    """
+    Read the dataset with projection and partition pruning.
+
+    ``columns`` selects sensor/extra columns (Label and Trial are always
+    included); ``labels``/``dates``/``trials`` prune whole directories;
+    ``filter`` is an optional extra pyarrow expression (e.g. on a sensor,
+    answered from row-group statistics where possible).
+    """
+    pa = _pyarrow()
+    ds = pa.dataset
+    dataset = ds.dataset(root, format="parquet", partitioning=partitioning())
+
+    expr = filter
+    for name, wanted in (("Label", labels), ("Date", dates), ("Trial", trials)):
+        if wanted is not None:
+            cond = ds.field(name).isin(list(wanted))
+            expr = cond if expr is None else expr & cond
+
+    cols = None
+    if columns is not None:
+        cols = ["Label", "Trial"] + [c for c in columns if c not in ("Label", "Trial")]
+
+    table = dataset.to_table(columns=cols, filter=expr)
+    return table.to_pandas() if as_pandas else table
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export or inspect the Parquet session dataset.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("export")
+    p.add_argument("root")
+    p.add_argument("--csv", nargs="*", default=[], help="per-sauce CSVs from the data-gathering notebook")
+    p.add_argument("--archive", nargs="*", default=[], help="enose.archive files")
+    p.add_argument("--db", nargs="*", default=[],
+                   help="session stores with the archived runs' confirmed labels (one, or one per archive)")
+    p.add_argument("--predicted", action="store_true",
+                   help="label unconfirmed runs with their latest prediction")
+    p = sub.add_parser("info")
+    p.add_argument("root")
+    args = parser.parse_args(argv)
+
+    if args.cmd == "export":
+        if len(args.db) > 1 and len(args.db) != len(args.archive):
+            parser.error("give one --db, or one per --archive in the same order")
+        stores = []
+        for path in args.db:
+            from enose.store import SessionStore
+            store = SessionStore(path, SENSOR_COLS)
+            stores.append(store.labels(args.predicted))
+            store.close()
+
+        def trials():
+            for path in args.csv:
+                yield from iter_csv_trials(path)
+            for k, path in enumerate(args.archive, start=1):
+                labels = stores[0 if len(stores) == 1 else k - 1] if stores else {}
+                yield from iter_archive_trials(path, labels=labels, archive_no=k)
+        print(f"Exported {export_dataset(args.root, trials())} rows to {args.root}")
+    else:
+        df = load_dataset(args.root, columns=[])
+        print(df.groupby(["Label", "Trial"]).size().to_string())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Streaming spike rejection (Hampel filter) for the live sensor stream.
+
+A single corrupted serial line or an electrical spike on one MQ channel is
+a perfectly parsable number, so it would go straight into the run's
+samples and bias the mean. HampelFilter keeps, per channel, the rolling
+median of the last ``window`` readings and the rolling median of their
+absolute deviations over a longer window (a streaming MAD). Each is a
+RollingMedian over a bisect-sorted list of exactly ``window`` values, so
+memory and per-sample cost depend on the window, not the run length. A
+reading further than ``k`` scaled MADs from the median is replaced by the
+median and counted as rejected.
+
+The acquisition service applies the filter between the parser and
+``on_sample``; the counts appear in the run stats under "despike".
+
+    python -m enose.despike check Article1/gathered_data.csv
+"""
+import argparse
+import bisect
+import collections
+import math
+
+MAD_SCALE = 1.4826  # MAD -> standard deviation for normal noise
+
+# ---------------- ROLLING MEDIAN ---------------- #
+class RollingMedian:
+    """
+    Median of the last ``size`` values.
+
+    The window is kept in arrival order (to know which value leaves) and
+    as a list kept sorted with bisect, so it holds exactly ``size`` values
+    however the signal moves - a long sorption ramp or exhaust decay
+    included. push() is a binary search plus a shift of at most ``size``
+    items, which for the filter's windows (11 and 55) is cheaper than heap
+    bookkeeping; median() is an index.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._window = collections.deque()
+        self._sorted = []
+
+    def __len__(self):
+        return len(self._window)
+
+    def push(self, v):
+        self._window.append(v)
+        bisect.insort(self._sorted, v)
+        if len(self._window) > self.size:
+            old = self._window.popleft()
+            del self._sorted[bisect.bisect_left(self._sorted, old)]
+
+    def median(self):
+        n = len(self._sorted)
+        if not n:
+            return math.nan
+        mid = n // 2
+        if n % 2:
+            return float(self._sorted[mid])
+        return (self._sorted[mid - 1] + self._sorted[mid]) / 2.0
+
+# ---------------- HAMPEL FILTER ---------------- #
+class HampelFilter:
+    """
+    Per-channel Hampel filter over the last ``window`` readings.
+
+    A reading is judged against the window before it, so a spike never
+    votes on itself; it still enters the window, so a genuine step is
+    accepted after half a window. The deviations are kept over
+    ``spread_window`` (5 windows) for a steadier noise scale. ``min_dev``
+    (sensor units) keeps a flat, quantized signal (MAD 0) from rejecting
+    every change. NaN readings pass through untouched.
+    """
+
+    def __init__(self, sensor_cols, window=11, k=3.5, min_dev=1.0, spread_window=None):
+        self.sensor_cols = list(sensor_cols)
+        self.window = window
+        self.k = k
+        self.min_dev = min_dev
+        self._ready = window // 2 + 1
+        self._median = [RollingMedian(window) for _ in self.sensor_cols]
+        self._spread = [RollingMedian(spread_window or 5 * window) for _ in self.sensor_cols]
+        self.samples = 0
+        self.rejected = [0] * len(self.sensor_cols)
+
+    def update(self, vals):
+        """Return ``vals`` with spikes replaced by the rolling median."""
+        self.samples += 1
+        out = list(vals)
+        for i, v in enumerate(vals):
+            if v != v:
+                continue
+            median, spread = self._median[i], self._spread[i]
+            if len(median) >= self._ready:
+                med = median.median()
+                dev = abs(v - med)
+                limit = max(self.k * MAD_SCALE * spread.median(), self.min_dev)
+                if len(spread) >= self._ready and dev > limit:
+                    self.rejected[i] += 1
+                    out[i] = med
+                spread.push(dev)
+            median.push(v)
+        return out
+
+    def summary(self):
+        return {
+            "window": self.window,
+            "k": self.k,
+            "rejected": dict(zip(self.sensor_cols, self.rejected)),
+        }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Count the spikes the live filter would reject.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("check")
+    p.add_argument("csv", nargs="+")
+    p.add_argument("--window", type=int, default=11)
+    p.add_argument("-k", type=float, default=3.5)
+    args = parser.parse_args(argv)
+
+    from enose.ingest import read_sensor_csv
+
+    for path in args.csv:
+        frame, _ = read_sensor_csv(path)
+        cols = [c for c in frame.columns if c not in ("Label", "Trial")]
+        filt = HampelFilter(cols, window=args.window, k=args.k)
+        for row in frame[cols].to_numpy(dtype=float).tolist():
+            filt.update(row)
+        print(f"{path}: {filt.samples} rows")
+        for name, n in zip(cols, filt.rejected):
+            print(f"  {name:>6}: {n} rejected ({n / max(filt.samples, 1):.2%})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""
+Distil the Article2 voting ensemble into one small student model.
+
+The ensemble (scaler/PCA -> SVC, kNN and XGBoost, soft voting) is the
+slowest artifact to import and to predict with on the Pi: joblib has to
+bring in xgboost and the kNN's copy of the training set, and every run
+asks three models. A student learns the ensemble's soft labels instead:
+
+  * the transfer set is the training table plus ``synthetic`` jittered
+    copies of its rows (Gaussian noise of ``jitter`` feature standard
+    deviations), so the student also sees the teacher between the few
+    training points;
+  * soft labels are the teacher's predict_proba; sklearn classifiers do
+    not take probability targets, so each row is repeated once per class
+    with the probability as its sample weight (weighted cross-entropy for
+    the logistic student, weighted impurity for the tree);
+  * a student is accepted only when, on the validation set, it agrees
+    with the teacher on at least ``min_agreement`` of the rows and its
+    macro F1 is within ``f1_tolerance`` of the teacher's.
+
+The report holds the gate metrics together with file size, cold-load time
+(a fresh interpreter, imports included) and single-row latency of the
+teacher and of every student. The fastest accepted student is written as
+an artifact with the teacher's label encoder and feature contract and,
+with ``--publish``, becomes the next version of a model registry
+(enose.registry). Nothing is written when no student passes.
+
+    python -m enose.distill Article2/ensemble_model.joblib --label-encoder Article2/label_encoder.joblib --train Article2/final_trainingset.csv --validation Article2/validationset_article2.csv -o Article2/student_model.joblib
+    python -m enose.distill Article2/models --train Article2/final_trainingset.csv --validation Article2/validationset_article2.csv --publish Article2/models --report distill.json
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from enose.bench import cold_load_s, resolve, row_latency_ms
+from enose.pipeline import load_artifact, save_artifact
+from enose.registry import ModelRegistry
+
+STUDENTS = ("tree", "logreg")
+
+# ---------------- STUDENTS ---------------- #
+def student_pipeline(name):
+    """
+    Scaler -> PCA -> ``tree`` (depth-limited decision tree) or ``logreg``
+    (logistic regression). The teacher's members all vote in a scaled PCA
+    space; a student on raw readings follows them poorly once the sensors
+    drift away from the training data.
+    """
+    from sklearn.decomposition import PCA
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import StandardScaler
+
+    if name == "tree":
+        from sklearn.tree import DecisionTreeClassifier
+        final = DecisionTreeClassifier(max_depth=8, min_samples_leaf=3, random_state=42)
+    elif name == "logreg":
+        from sklearn.linear_model import LogisticRegression
+        final = LogisticRegression(C=10.0, max_iter=2000)
+    else:
+        raise ValueError(f"Unknown student {name!r}")
+    return Pipeline([("scaler", StandardScaler()), ("pca", PCA(n_components=4)), (name, final)])
+
+def transfer_set(X, synthetic=8000, jitter=0.5, random_state=42):
+    """The training rows plus ``synthetic`` jittered copies of randomly drawn ones."""
+    X = np.asarray(X, dtype=float)
+    rng = np.random.default_rng(random_state)
+    base = X[rng.integers(0, len(X), synthetic)]
+    noise = rng.standard_normal(base.shape) * X.std(axis=0) * jitter
+    return np.vstack([X, base + noise])
+
+def fit_soft(student, X, proba, classes):
+    """Fit ``student`` to the teacher's class probabilities (one weighted row per class)."""
+    n, k = proba.shape
+    weights = proba.ravel()
+    keep = weights > 0
+    step = student.steps[-1][0]
+    student.fit(np.repeat(X, k, axis=0)[keep], np.tile(classes, n)[keep],
+                **{f"{step}__sample_weight": weights[keep]})
+    return student
+
+# ---------------- MEASUREMENTS ---------------- #
+def _profile(path, artifact, X, label_encoder_path=None):
+    p50, p99 = row_latency_ms(artifact, X)
+    return {"size_bytes": os.path.getsize(path),
+            "cold_load_s": round(cold_load_s(path, label_encoder_path), 3),
+            "row_ms_p50": round(p50, 3), "row_ms_p99": round(p99, 3)}
+
+def _scores(pred, y, teacher_pred=None):
+    from sklearn.metrics import accuracy_score, f1_score
+
+    scores = {"accuracy": round(float(accuracy_score(y, pred)), 4),
+              "f1_macro": round(float(f1_score(y, pred, average="macro")), 4)}
+    if teacher_pred is not None:
+        scores["agreement"] = round(float(np.mean(pred == teacher_pred)), 4)
+    return scores
+
+# ---------------- DISTILLATION ---------------- #
+def distill(teacher_path, train_csv, validation_csv, out_path=None, label_encoder_path=None,
+            students=STUDENTS, synthetic=8000, jitter=0.5, min_agreement=0.95, f1_tolerance=0.02,
+            publish=None, report_path=None):
+    """Train the students, gate them on the validation set and keep the fastest one that passes."""
+    import pandas as pd
+
+    teacher_path, label_encoder_path = resolve(teacher_path, label_encoder_path)
+    teacher = load_artifact(teacher_path, label_encoder_path)
+    if not hasattr(teacher.model, "predict_proba"):
+        raise ValueError("The teacher has no predict_proba (hard voting?); soft labels are needed")
+    X_train = teacher.pipeline.table(pd.read_csv(train_csv)).to_numpy(dtype=float)
+    validation = pd.read_csv(validation_csv)
+    X_val = teacher.pipeline.table(validation).to_numpy(dtype=float)
+    y_val = validation["Label"].to_numpy()
+
+    started = time.perf_counter()
+    X_transfer = transfer_set(X_train, synthetic, jitter)
+    proba = teacher.model.predict_proba(X_transfer)
+    teacher_pred = teacher.predict(X_val)
+    report = {
+        "teacher": dict(path=os.path.abspath(teacher_path), model=type(teacher.model).__name__,
+                        **_scores(teacher_pred, y_val), **_profile(teacher_path, teacher, X_val, label_encoder_path)),
+        "transfer_rows": len(X_transfer),
+        "gate": {"min_agreement": min_agreement, "f1_tolerance": f1_tolerance},
+        "students": {},
+    }
+    print(f"Teacher {report['teacher']['model']}: F1 {report['teacher']['f1_macro']}, "
+          f"{report['teacher']['size_bytes'] / 1024:.0f} KB, cold load {report['teacher']['cold_load_s']} s, "
+          f"{report['teacher']['row_ms_p50']} ms/row")
+
+    tmp_dir = tempfile.mkdtemp(prefix="enose-distill-")
+    fitted = {}
+    for name in students:
+        fit_started = time.perf_counter()
+        student = fit_soft(student_pipeline(name), X_transfer, proba, teacher.model.classes_)
+        fit_s = time.perf_counter() - fit_started
+        path = os.path.join(tmp_dir, f"{name}.joblib")
+        artifact = save_artifact(path, student, teacher.features, teacher.label_encoder)
+        row = dict(fit_s=round(fit_s, 3), **_scores(artifact.predict(X_val), y_val, teacher_pred),
+                   **_profile(path, artifact, X_val))
+        row["accepted"] = (row["agreement"] >= min_agreement
+                           and row["f1_macro"] >= report["teacher"]["f1_macro"] - f1_tolerance)
+        report["students"][name] = row
+        fitted[name] = student
+        print(f"  {name:<7} agreement {row['agreement']:.3f}  F1 {row['f1_macro']:.3f}  "
+              f"{row['size_bytes'] / 1024:.1f} KB  cold load {row['cold_load_s']} s  "
+              f"{row['row_ms_p50']} ms/row  {'accepted' if row['accepted'] else 'rejected'}")
+
+    accepted = [n for n, r in report["students"].items() if r["accepted"]]
+    chosen = min(accepted, key=lambda n: report["students"][n]["row_ms_p50"]) if accepted else None
+    report["chosen"] = chosen
+    report["distill_s"] = round(time.perf_counter() - started, 3)
+    if chosen:
+        row = report["students"][chosen]
+        teacher_row = report["teacher"]
+        report["size_ratio"] = round(teacher_row["size_bytes"] / row["size_bytes"], 1)
+        report["speedup"] = round(teacher_row["row_ms_p50"] / row["row_ms_p50"], 1)
+        meta = {"distilled_from": report["teacher"]["path"], "student": chosen,
+                "baseline_subtracted": teacher.baseline_subtracted,
+                "trained_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "validation": {k: row[k] for k in ("agreement", "accuracy", "f1_macro")}}
+        if out_path:
+            save_artifact(out_path, fitted[chosen], teacher.features, teacher.label_encoder, meta)
+        if publish:
+            report["published"] = ModelRegistry(publish).publish_artifact(
+                fitted[chosen], teacher.features, teacher.label_encoder, meta,
+                note=f"{chosen} student of {os.path.basename(teacher_path)}", source=teacher_path)
+    for name in students:
+        os.remove(os.path.join(tmp_dir, f"{name}.joblib"))
+    os.rmdir(tmp_dir)
+    if report_path:
+        with open(report_path, "w") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Distil a voting ensemble into a small student model.")
+    parser.add_argument("teacher", help="ensemble artifact or model registry directory")
+    parser.add_argument("--label-encoder", help="for a bare ensemble (default: label_encoder.joblib alongside)")
+    parser.add_argument("--train", required=True, help="Label + feature CSV (final_trainingset.csv)")
+    parser.add_argument("--validation", required=True, help="Label + feature CSV (validationset_article2.csv)")
+    parser.add_argument("-o", "--output", help="write the accepted student here")
+    parser.add_argument("--publish", help="publish the accepted student to this model registry")
+    parser.add_argument("--students", nargs="+", choices=STUDENTS, default=list(STUDENTS))
+    parser.add_argument("--synthetic", type=int, default=8000, help="jittered transfer rows")
+    parser.add_argument("--jitter", type=float, default=0.5, help="noise, in feature standard deviations")
+    parser.add_argument("--min-agreement", type=float, default=0.95)
+    parser.add_argument("--f1-tolerance", type=float, default=0.02)
+    parser.add_argument("--report", help="write the report as JSON")
+    args = parser.parse_args(argv)
+
+    report = distill(args.teacher, args.train, args.validation, args.output, args.label_encoder,
+                     args.students, args.synthetic, args.jitter, args.min_agreement, args.f1_tolerance,
+                     args.publish, args.report)
+    if report["chosen"] is None:
+        print("No student passed the gate; nothing written")
+        raise SystemExit(1)
+    print(f"Chose {report['chosen']}: {report['size_ratio']}x smaller, {report['speedup']}x faster per row"
+          f"{' -> ' + args.output if args.output else ''}"
+          f"{', published as ' + report['published'] if report.get('published') else ''}")
+
+if __name__ == "__main__":
+    main()
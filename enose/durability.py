@@ -0,0 +1,321 @@
+"""
+Durable small-file writes with selectable fsync policy.
+
+Modes:
+    strict    journal fsync + apply on every call (caller waits for the disk)
+    group     calls return immediately; a background thread commits the
+              queued records every ``group_records`` records or
+              ``group_ms`` milliseconds with one journal fsync
+    buffered  written straight to the target, no fsync (OS page cache)
+
+Every committed record is first appended to a write-ahead journal with a
+length + CRC32 frame. Appends remember the target offset they were written
+at, so replaying the journal after a crash truncates to that offset and
+rewrites, which is idempotent. Replacements go through a temp file and
+os.replace. Targets are fsynced and the journal truncated at checkpoints.
+
+    python -m enose.durability bench /media/sdcard/tmp --records 500
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import statistics
+import struct
+import tempfile
+import threading
+import time
+import zlib
+
+STRICT, GROUP, BUFFERED = "strict", "group", "buffered"
+MODES = (STRICT, GROUP, BUFFERED)
+
+_FRAME = struct.Struct("<II")  # payload length, crc32
+
+def csv_text(rows):
+    buf = io.StringIO()
+    csv.writer(buf).writerows(rows)
+    return buf.getvalue()
+
+def _fsync_dir(path):
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def read_journal(journal_path):
+    """Return the intact records of a journal, stopping at the first torn frame."""
+    records = []
+    if not os.path.exists(journal_path):
+        return records
+    with open(journal_path, "rb") as f:
+        data = f.read()
+    pos = 0
+    while pos + _FRAME.size <= len(data):
+        length, crc = _FRAME.unpack_from(data, pos)
+        payload = data[pos + _FRAME.size:pos + _FRAME.size + length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            break
+        records.append(json.loads(payload.decode("utf-8")))
+        pos += _FRAME.size + length
+    return records
+
+class DurableWriter:
+    """
+    Append to / replace small text files through a write-ahead journal.
+
+    One writer should own its target files; logical sizes are tracked in
+    memory so append offsets can be assigned before the data reaches disk.
+    """
+
+    def __init__(self, journal_path, mode=GROUP, group_records=32, group_ms=200,
+                 checkpoint_bytes=64 * 1024):
+        if mode not in MODES:
+            raise ValueError(f"Unknown durability mode: {mode!r} (expected one of {MODES})")
+        self.journal_path = journal_path
+        self.mode = mode
+        self.group_records = group_records
+        self.group_ms = group_ms
+        self.checkpoint_bytes = checkpoint_bytes
+
+        self._cond = threading.Condition()
+        self._io_lock = threading.RLock()  # journal and target writes
+        self._force = False
+        self._queue = []
+        self._first_queued = None
+        self._committed_seq = 0
+        self._seq = 0
+        self._sizes = {}
+        self._dirty = set()
+        self._closed = False
+
+        self.recover()
+        self._journal = open(journal_path, "ab")
+
+        self._thread = None
+        if mode == GROUP:
+            self._thread = threading.Thread(target=self._group_loop, daemon=True)
+            self._thread.start()
+
+    # ---------------- PUBLIC API ---------------- #
+    def append(self, path, text, header=None):
+        """Append ``text``; ``header`` is written first if the file is empty at commit time."""
+        return self._submit({"op": "append", "path": path, "data": text, "header": header})
+
+    def append_csv(self, path, row, header=None):
+        return self.append(path, csv_text([row]), csv_text([header]) if header else None)
+
+    def replace(self, path, text):
+        return self._submit({"op": "replace", "path": path, "data": text})
+
+    def flush(self):
+        """Commit everything queued so far and wait for it to be durable."""
+        if self.mode == GROUP:
+            with self._cond:
+                target = self._seq
+                self._force = True
+                self._cond.notify_all()
+                while self._committed_seq < target and self._thread.is_alive():
+                    self._cond.wait(0.05)
+        self._checkpoint(force=True)
+
+    def close(self):
+        if self._closed:
+            return
+        self.flush()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout=2)
+        self._journal.close()
+
+    # ---------------- COMMIT ---------------- #
+    def _submit(self, record):
+        with self._cond:
+            self._seq += 1
+            record["seq"] = self._seq
+            if self.mode == GROUP:
+                if not self._queue:
+                    self._first_queued = time.monotonic()
+                self._queue.append(record)
+                if len(self._queue) >= self.group_records:
+                    self._cond.notify_all()
+                return record["seq"]
+
+        with self._io_lock:
+            if self.mode == STRICT:
+                self._commit([record])
+            else:
+                self._apply(record, sync=False)
+        return record["seq"]
+
+    def _group_loop(self):
+        while True:
+            with self._cond:
+                while not self._closed:
+                    if self._queue:
+                        waited_ms = (time.monotonic() - self._first_queued) * 1000
+                        if (self._force or len(self._queue) >= self.group_records
+                                or waited_ms >= self.group_ms):
+                            break
+                        self._cond.wait((self.group_ms - waited_ms) / 1000)
+                    else:
+                        self._cond.wait()
+                batch, self._queue = self._queue, []
+                self._force = False
+                if not batch and self._closed:
+                    return
+            if batch:
+                with self._io_lock:
+                    self._commit(batch)
+            with self._cond:
+                self._committed_seq = max(self._committed_seq, batch[-1]["seq"] if batch else 0)
+                self._cond.notify_all()
+
+    def _commit(self, batch):
+        # offsets are assigned here, by the single committing thread
+        for record in batch:
+            if record["op"] == "append":
+                size = self._size(record["path"])
+                record["offset"] = size
+                if size == 0 and record.get("header"):
+                    record["data"] = record["header"] + record["data"]
+                self._sizes[record["path"]] = size + len(record["data"].encode("utf-8"))
+            else:
+                self._sizes[record["path"]] = len(record["data"].encode("utf-8"))
+
+        frames = []
+        for record in batch:
+            payload = json.dumps(record).encode("utf-8")
+            frames.append(_FRAME.pack(len(payload), zlib.crc32(payload)) + payload)
+        self._journal.write(b"".join(frames))
+        self._journal.flush()
+        os.fsync(self._journal.fileno())  # durability point for the whole group
+
+        for record in batch:
+            self._apply(record, sync=False)
+        self._checkpoint()
+
+    def _size(self, path):
+        if path not in self._sizes:
+            self._sizes[path] = os.path.getsize(path) if os.path.exists(path) else 0
+        return self._sizes[path]
+
+    def _apply(self, record, sync):
+        path = record["path"]
+        data = record["data"].encode("utf-8")
+        if record["op"] == "append":
+            if "offset" not in record:  # buffered mode, no journal
+                size = self._size(path)
+                if size == 0 and record.get("header"):
+                    data = record["header"].encode("utf-8") + data
+                record["offset"] = size
+                self._sizes[path] = size + len(data)
+            with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+                f.seek(record["offset"])
+                f.write(data)
+                f.truncate()
+                if sync:
+                    f.flush()
+                    os.fsync(f.fileno())
+        else:
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+                if sync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(tmp, path)
+            self._sizes[path] = len(data)
+        self._dirty.add(path)
+
+    def _checkpoint(self, force=False):
+        """fsync applied targets, then drop the journal records they cover."""
+        if self.mode == BUFFERED or self._journal.closed:
+            return
+        with self._io_lock:
+            if not force and self._journal.tell() < self.checkpoint_bytes:
+                return
+            self._sync_targets()
+            # an unsynced truncate is fine: replaying applied records is idempotent
+            self._journal.truncate(0)
+            self._journal.seek(0)
+
+    def _sync_targets(self):
+        for path in list(self._dirty):
+            if os.path.exists(path):
+                with open(path, "rb+") as f:
+                    os.fsync(f.fileno())
+            _fsync_dir(path)
+        self._dirty.clear()
+
+    # ---------------- RECOVERY ---------------- #
+    def recover(self):
+        """Re-apply every intact journal record, then empty the journal."""
+        records = read_journal(self.journal_path)
+        for record in records:
+            self._apply(record, sync=True)
+        self._sizes.clear()  # replayed records leave the files as they are on disk now
+        if records:
+            print(f"Recovered {len(records)} journal record(s) from {self.journal_path}")
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, "r+b") as f:
+                f.truncate(0)
+                os.fsync(f.fileno())
+        self._dirty.clear()
+        return len(records)
+
+# ---------------- BENCHMARK ---------------- #
+def bench(directory, records=500, modes=MODES, row_width=7):
+    """Time append_csv calls per mode; run it on the kiosk's SD card."""
+    row = ["Unknown"] + [123.456789] * (row_width - 1)
+    results = {}
+    for mode in modes:
+        target = os.path.join(directory, f"bench_{mode}.csv")
+        journal = os.path.join(directory, f"bench_{mode}.wal")
+        for p in (target, journal):
+            if os.path.exists(p):
+                os.remove(p)
+
+        writer = DurableWriter(journal, mode=mode)
+        lat = []
+        t0 = time.perf_counter()
+        for _ in range(records):
+            t = time.perf_counter()
+            writer.append_csv(target, row, header=["Label"] + [f"S{i}" for i in range(row_width - 1)])
+            lat.append((time.perf_counter() - t) * 1000)
+        writer.close()
+        total = time.perf_counter() - t0
+
+        lat.sort()
+        results[mode] = {
+            "p50_ms": statistics.median(lat),
+            "p99_ms": lat[min(len(lat) - 1, int(0.99 * len(lat)))],
+            "records_per_s": records / total,
+        }
+        for p in (target, journal):
+            os.remove(p)
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the durability modes.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("bench")
+    p.add_argument("directory", help="directory on the storage to test (e.g. the SD card)")
+    p.add_argument("--records", type=int, default=500)
+    args = parser.parse_args(argv)
+
+    for mode, r in bench(args.directory, args.records).items():
+        print(f"{mode:>9}: call p50 {r['p50_ms']:.3f} ms  p99 {r['p99_ms']:.3f} ms  "
+              f"{r['records_per_s']:.0f} records/s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Per-trial summary features, computed while the run is gathering.
+
+The "MEAN STD MAX MIN AUC" cell of the data-gathering notebook computes,
+for each sensor in its column order, the mean, population std, max, min and
+sum (its "AUC") of the trial's readings, named ``MQ136_mean`` ...
+``MQ137_auc``. StreamingFeatures keeps the same statistics up to date with
+O(1) work per sample (Welford mean/variance, running max/min/sum), so the
+feature vector is ready the moment the gathering window closes. NaN
+readings are skipped for that sensor only.
+
+The summarize command rebuilds the notebook's sauce_trials_summary_advanced.csv
+with the same extractor the kiosk uses:
+
+    python -m enose.features summarize soy_sauce.csv fish_sauce.csv -o sauce_trials_summary_advanced.csv
+
+``--transient`` appends the transient-response features of enose.transient,
+computed through the same CurveBuffer the kiosk fills while gathering.
+"""
+import argparse
+import math
+import os
+
+import numpy as np
+
+# column order of the data-gathering notebook
+NOTEBOOK_SENSOR_COLS = ["MQ136", "MQ2", "MQ3", "MQ135", "MQ138", "MQ137"]
+STATS = ("mean", "std", "max", "min", "auc")
+
+def feature_names(sensor_cols=NOTEBOOK_SENSOR_COLS, stats=STATS):
+    return [f"{sensor}_{stat}" for sensor in sensor_cols for stat in stats]
+
+# ---------------- STREAMING EXTRACTOR ---------------- #
+class StreamingFeatures:
+    """Running mean/std/max/min/sum per sensor; ``sensor_cols`` is the order rows arrive in."""
+
+    def __init__(self, sensor_cols):
+        self.sensor_cols = list(sensor_cols)
+        k = len(self.sensor_cols)
+        self.count = 0
+        self.n = [0] * k
+        self.mean = [0.0] * k
+        self.m2 = [0.0] * k
+        self.max = [-math.inf] * k
+        self.min = [math.inf] * k
+        self.sum = [0.0] * k
+
+    def update(self, vals):
+        self.count += 1
+        for i, v in enumerate(vals):
+            if v != v:  # NaN
+                continue
+            n = self.n[i] + 1
+            self.n[i] = n
+            delta = v - self.mean[i]
+            self.mean[i] += delta / n
+            self.m2[i] += delta * (v - self.mean[i])
+            if v > self.max[i]:
+                self.max[i] = v
+            if v < self.min[i]:
+                self.min[i] = v
+            self.sum[i] += v
+
+    def means(self):
+        """Per-sensor means in ``sensor_cols`` order (NaN for a sensor with no readings)."""
+        if self.count == 0:
+            raise ValueError("No sensor samples collected.")
+        return [m if n else math.nan for m, n in zip(self.mean, self.n)]
+
+    def features(self, sensor_cols=NOTEBOOK_SENSOR_COLS):
+        """Return {name: value} in the notebook's order and naming."""
+        if self.count == 0:
+            raise ValueError("No sensor samples collected.")
+        out = {}
+        for sensor in sensor_cols:
+            i = self.sensor_cols.index(sensor)
+            n = self.n[i]
+            if n == 0:
+                values = [math.nan] * len(STATS)
+            else:
+                values = [self.mean[i], math.sqrt(self.m2[i] / n), self.max[i], self.min[i], self.sum[i]]
+            out.update(zip((f"{sensor}_{stat}" for stat in STATS), values))
+        return out
+
+    def to_dict(self):
+        return {
+            "sensors": list(self.sensor_cols), "count": self.count, "n": list(self.n),
+            "mean": list(self.mean), "m2": list(self.m2),
+            "max": list(self.max), "min": list(self.min), "sum": list(self.sum),
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        acc = cls(state["sensors"])
+        acc.count = state["count"]
+        for key in ("n", "mean", "m2", "max", "min", "sum"):
+            setattr(acc, key, list(state[key]))
+        return acc
+
+# ---------------- OFFLINE ---------------- #
+def trial_features(values, sensor_cols, names_order=NOTEBOOK_SENSOR_COLS):
+    """Features of one trial's (n, k) array, fed through the streaming extractor."""
+    acc = StreamingFeatures(sensor_cols)
+    for row in np.asarray(values, dtype=float).tolist():
+        acc.update(row)
+    return acc.features(names_order)
+
+def summarize_csvs(paths, out_path, sensor_cols=NOTEBOOK_SENSOR_COLS, transient=False):
+    """Write one row per (file, trial): Trial + features + Label, like the notebook cell."""
+    import pandas as pd
+    from enose.ingest import read_sensor_csv
+    from enose.transient import trial_transient_features, transient_feature_names
+
+    rows = []
+    for path in paths:
+        label = os.path.splitext(os.path.basename(path))[0].replace("_", " ").title()
+        frame, _ = read_sensor_csv(path, sensor_cols)
+        for trial, group in frame.groupby("Trial"):
+            values = group[sensor_cols].to_numpy()
+            feats = trial_features(values, sensor_cols, sensor_cols)
+            if transient:
+                feats.update(trial_transient_features(values, sensor_cols))
+            rows.append([trial] + list(feats.values()) + [label])
+
+    columns = ["Trial"] + feature_names(sensor_cols)
+    if transient:
+        columns += transient_feature_names(sensor_cols)
+    columns += ["Label"]
+    pd.DataFrame(rows, columns=columns).to_csv(out_path, index=False)
+    return len(rows)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize per-sauce CSVs into per-trial features.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("summarize")
+    p.add_argument("csv", nargs="+", help="per-sauce CSVs from the data-gathering notebook")
+    p.add_argument("-o", "--output", default="sauce_trials_summary_advanced.csv")
+    p.add_argument("--transient", action="store_true",
+                   help="add slope/t63/t90/peak_t/deriv_energy per sensor")
+    args = parser.parse_args(argv)
+
+    n = summarize_csvs(args.csv, args.output, transient=args.transient)
+    print(f"Wrote {n} trials to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+"""
+Incremental model updates from labelled kiosk runs.
+
+A run's label is confirmed on the result page (or with ``label`` below)
+and stored with its session. Growing the training set that way used to
+mean a full offline retrain. update() folds the labelled sessions into
+the model in two steps:
+
+  * cheap, right away: members whose refit costs milliseconds are redone
+    with their tuned settings - a kNN member gets new scaler statistics,
+    PCA and neighbour index, an XGB member keeps its scaler/PCA and grows
+    ``boost_rounds`` more trees on the extended data;
+  * deferred: SVM members (Platt-calibrated, the slow part) are refit by
+    a background job, ``python -m enose.incremental refit``, started with
+    start_background_refit(). The job also rebuilds boosted members from
+    scratch, so their extra trees do not pile up update after update.
+
+Each step publishes the artifact atomically under a lock file, so the
+kiosk never sees a half-written or half-updated model. The target is an
+artifact file (rewritten with enose.pipeline.save_artifact) or a model
+registry directory (enose.registry), where each step becomes a new
+version that the kiosk's watcher swaps in between runs. A bare ensemble
+saved by the Article2 notebook is read with the label_encoder.joblib next
+to it (or ``--label-encoder``) and written back as a full artifact. Labels
+the model has never seen cannot be added this way and need a full retrain.
+
+    python -m enose.incremental pending Article1/enose_sessions.db
+    python -m enose.incremental label Article1/enose_sessions.db 42 "Soy Sauce"
+    python -m enose.incremental update Article2/ensemble_model.joblib --db Article2/enose_sessions.db --base Article2/final_trainingset.csv
+    python -m enose.incremental update Article1/models --db Article1/enose_sessions.db --base Article1/final_trainingset.csv --background
+"""
+import argparse
+import contextlib
+import copy
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from enose.bench import resolve
+from enose.pipeline import load_artifact, save_artifact
+from enose.registry import ModelRegistry
+from enose.store import SessionStore
+
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# ---------------- TRAINING DATA ---------------- #
+def training_data(artifact, base_csv=None, store=None):
+    """
+    (X, labels, session ids) of the base training CSV plus every labelled
+    session in ``store``, in the artifact's column order. Only sessions
+    corrected the way the model was trained (baseline_subtracted) are
+    used; the base CSV has to match that too.
+    """
+    import pandas as pd
+
+    frames, session_ids = [], []
+    if base_csv:
+        base = pd.read_csv(base_csv)
+        frames.append(artifact.pipeline.table(base).assign(Label=base["Label"]))
+    if store is not None:
+        rows = list(store.training_rows(artifact.features, with_ids=True,
+                                        baseline=artifact.baseline_subtracted))
+        if rows:
+            session_ids = [r[0] for r in rows]
+            frames.append(pd.DataFrame([r[2:] for r in rows], columns=artifact.features)
+                          .assign(Label=[r[1] for r in rows]))
+    if not frames:
+        raise ValueError("No training rows: give a base CSV and/or a session store")
+    data = pd.concat(frames, ignore_index=True).dropna()
+    return data[artifact.features], data["Label"].to_numpy(), session_ids
+
+def _encoded(artifact, labels):
+    """Labels as the model was trained on them; rows of unknown labels are dropped."""
+    known = artifact.classes()
+    keep = np.isin(labels, known)
+    if not keep.all():
+        print(f"Skipping {int((~keep).sum())} row(s) with labels the model does not know "
+              f"({', '.join(sorted(set(labels[~keep])))}); they need a full retrain")
+    y = labels[keep]
+    if not len(y):
+        raise ValueError("No training rows with labels the model knows; nothing to update")
+    if artifact.label_encoder is not None:
+        y = artifact.label_encoder.transform(y)
+    return keep, y
+
+# ---------------- MEMBERS ---------------- #
+def members(model):
+    """(name, fitted estimator) of a voting ensemble's members, or of the single model."""
+    if hasattr(model, "estimators_") and hasattr(model, "named_estimators_"):
+        return list(zip([name for name, _ in model.estimators], model.estimators_))
+    return [("model", model)]
+
+def _replace_member(model, name, estimator):
+    if name == "model":
+        return estimator
+    i = [n for n, _ in model.estimators].index(name)
+    model.estimators_[i] = estimator
+    model.named_estimators_[name] = estimator
+    return model
+
+def update_kind(estimator):
+    """'index' (kNN), 'boost' (XGB) or 'deferred' (everything else, e.g. SVC)."""
+    final = estimator.steps[-1][1] if hasattr(estimator, "steps") else estimator
+    name = type(final).__name__
+    if name == "KNeighborsClassifier":
+        return "index"
+    if name == "XGBClassifier":
+        return "boost"
+    return "deferred"
+
+def refit_cheap(estimator, X, y, boost_rounds=10):
+    """A kNN member refit with its tuned settings, or an XGB member grown by ``boost_rounds`` trees."""
+    from sklearn.base import clone
+
+    kind = update_kind(estimator)
+    if kind == "index":
+        return clone(estimator).fit(X, y)
+    # the trees split on the member's own scaler/PCA output, so those stay fixed
+    updated = copy.deepcopy(estimator)
+    step, booster = updated.steps[-1]
+    grown = clone(booster).set_params(n_estimators=boost_rounds)
+    grown.fit(updated[:-1].transform(np.asarray(X, dtype=float)), y, xgb_model=booster.get_booster())
+    # the extra rounds are for this fit only: refit() clones the member and must
+    # rebuild it with its tuned number of rounds, not ``boost_rounds``
+    grown.set_params(n_estimators=booster.get_params()["n_estimators"])
+    updated.steps[-1] = (step, grown)
+    return updated
+
+def boosted_rounds(estimator):
+    """(rounds in the fitted booster, rounds its settings ask for) of an XGB member."""
+    booster = estimator.steps[-1][1]
+    tuned = booster.get_params()["n_estimators"]
+    return booster.get_booster().num_boosted_rounds(), 100 if tuned is None else tuned  # xgboost's default
+
+# ---------------- PUBLISHING ---------------- #
+@contextlib.contextmanager
+def artifact_lock(path):
+    """Serialize read-modify-write of one artifact between the kiosk and the refit job."""
+    import fcntl
+
+    with open(path + ".lock", "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def _target(path):
+    """(artifact file, lock path, registry) of an artifact file or a model registry directory."""
+    if os.path.isdir(path):
+        registry = ModelRegistry(path)
+        if registry.current() is None:
+            raise ValueError(f"Model registry {path} has no current version")
+        return registry.path(), registry.pointer, registry
+    return path, path, None
+
+def _load(target, label_encoder_path=None):
+    """The target's artifact; a bare estimator gets the label encoder found next to it."""
+    return load_artifact(*resolve(target[0], label_encoder_path))
+
+def _publish(target, artifact, model, step, report):
+    path, _, registry = target
+    # a bare estimator is written back with its contract and encoder
+    meta = {k: v for k, v in artifact.meta.items() if k != "legacy"}
+    meta["updates"] = (meta.get("updates") or [])[-19:] + [dict(report, step=step)]
+    meta["pending_refit"] = report["deferred"] if step == "cheap" else []
+    meta["labelled_sessions"] = report["sessions"]
+    if registry is not None:
+        registry.publish_artifact(model, artifact.features, artifact.label_encoder, meta,
+                                  note=f"{step} update, {report['rows']} rows", source=path)
+    else:
+        save_artifact(path, model, artifact.features, artifact.label_encoder, meta)
+
+def update(artifact_path, store=None, base_csv=None, boost_rounds=10, label_encoder_path=None):
+    """
+    The cheap update step; returns a report whose ``deferred`` lists the
+    members left for refit(). Nothing is written when no member is cheap.
+    """
+    started = time.perf_counter()
+    with artifact_lock(_target(artifact_path)[1]):
+        target = _target(artifact_path)
+        artifact = _load(target, label_encoder_path)
+        X, labels, sessions = training_data(artifact, base_csv, store)
+        keep, y = _encoded(artifact, labels)
+        X = X[keep]
+        model = artifact.model
+        report = {"at": time.strftime("%Y-%m-%d %H:%M:%S"), "rows": int(len(y)),
+                  "sessions": len(sessions), "updated": [], "deferred": []}
+        for name, estimator in members(model):
+            if update_kind(estimator) == "deferred":
+                report["deferred"].append(name)
+                continue
+            model = _replace_member(model, name, refit_cheap(estimator, X, y, boost_rounds))
+            report["updated"].append(name)
+        report["seconds"] = round(time.perf_counter() - started, 3)
+        if report["updated"]:
+            _publish(target, artifact, model, "cheap", report)
+    return report
+
+def refit(artifact_path, store=None, base_csv=None, label_encoder_path=None):
+    """
+    The deferred step: refit the slow (and the boosted) members with their
+    tuned settings outside the lock, then swap them into the artifact as
+    it is now.
+    """
+    from sklearn.base import clone
+
+    started = time.perf_counter()
+    artifact = _load(_target(artifact_path), label_encoder_path)
+    X, labels, sessions = training_data(artifact, base_csv, store)
+    keep, y = _encoded(artifact, labels)
+    X = X[keep]
+    fitted = {name: clone(est).fit(X, y) for name, est in members(artifact.model)
+              if update_kind(est) != "index"}
+    for name, est in fitted.items():
+        if update_kind(est) == "boost" and len(set(boosted_rounds(est))) > 1:
+            raise ValueError(f"Rebuilt {name} has %d rounds instead of its tuned %d" % boosted_rounds(est))
+
+    with artifact_lock(_target(artifact_path)[1]):
+        target = _target(artifact_path)  # the cheap step may have published meanwhile
+        current = _load(target, label_encoder_path)
+        refits = [u for u in current.meta.get("updates") or [] if u.get("step") == "refit"]
+        if refits and refits[-1]["rows"] > len(y):
+            print(f"A refit on {refits[-1]['rows']} rows was published meanwhile; keeping it")
+            fitted = {}
+        model = current.model
+        for name, estimator in fitted.items():
+            model = _replace_member(model, name, estimator)
+        report = {"at": time.strftime("%Y-%m-%d %H:%M:%S"), "rows": int(len(y)),
+                  "sessions": len(sessions), "updated": sorted(fitted), "deferred": [],
+                  "seconds": round(time.perf_counter() - started, 3)}
+        if fitted:
+            _publish(target, current, model, "refit", report)
+    return report
+
+def start_background_refit(artifact_path, db_path=None, base_csv=None, log_path=None,
+                           label_encoder_path=None):
+    """Run refit() in its own process; the kiosk keeps serving the current model meanwhile."""
+    cmd = [sys.executable, "-m", "enose.incremental", "refit", os.path.abspath(artifact_path)]
+    if db_path:
+        cmd += ["--db", os.path.abspath(db_path)]
+    if base_csv:
+        cmd += ["--base", os.path.abspath(base_csv)]
+    if label_encoder_path:
+        cmd += ["--label-encoder", os.path.abspath(label_encoder_path)]
+    if log_path is None and os.path.isdir(artifact_path):
+        log_path = os.path.join(artifact_path, "refit.log")
+    log = open(log_path or os.path.abspath(artifact_path) + ".refit.log", "a")
+    try:
+        return subprocess.Popen(cmd, cwd=PACKAGE_ROOT, stdout=log, stderr=subprocess.STDOUT,
+                                start_new_session=True)
+    finally:
+        log.close()
+
+def _print_report(step, report):
+    print(f"{step}: {report['rows']} rows ({report['sessions']} labelled sessions) in "
+          f"{report['seconds']} s; updated {', '.join(report['updated']) or 'nothing'}"
+          f"{'; deferred ' + ', '.join(report['deferred']) if report['deferred'] else ''}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Label kiosk runs and fold them into the model.")
+    parser.add_argument("--sensors", default="MQ2,MQ3,MQ135,MQ136,MQ137,MQ138")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("pending", help="finished runs without a confirmed label")
+    p.add_argument("db")
+    p.add_argument("--limit", type=int, default=20)
+    p = sub.add_parser("label", help="confirm the label of a run")
+    p.add_argument("db")
+    p.add_argument("session", type=int)
+    p.add_argument("label")
+    for name in ("update", "refit"):
+        p = sub.add_parser(name, help="cheap member update" if name == "update" else "deferred SVM refit")
+        p.add_argument("artifact", help="artifact file or model registry directory")
+        p.add_argument("--db", help="session store with the labelled runs")
+        p.add_argument("--base", help="base training CSV (final_trainingset.csv)")
+        p.add_argument("--label-encoder", help="for a bare ensemble (default: label_encoder.joblib alongside)")
+        if name == "update":
+            p.add_argument("--boost-rounds", type=int, default=10)
+            p.add_argument("--background", action="store_true", help="then start the deferred refit")
+    args = parser.parse_args(argv)
+
+    store = SessionStore(args.db, args.sensors.split(",")) if args.db else None
+    if args.cmd == "pending":
+        for sid, started, predicted in store.unlabelled(args.limit):
+            when = time.strftime("%Y-%m-%d %H:%M", time.localtime(started))
+            print(f"{sid:>6}  {when}  predicted={predicted or '-'}")
+    elif args.cmd == "label":
+        store.set_label(args.session, args.label)
+        print(f"Session {args.session} labelled {args.label!r}")
+    elif args.cmd == "update":
+        try:
+            report = update(args.artifact, store, args.base, args.boost_rounds, args.label_encoder)
+        except ValueError as e:
+            raise SystemExit(f"Not updated: {e}")
+        _print_report("update", report)
+        if report["deferred"] and args.background:
+            proc = start_background_refit(args.artifact, args.db, args.base,
+                                          label_encoder_path=args.label_encoder)
+            print(f"Refit of {', '.join(report['deferred'])} running as pid {proc.pid}")
+    else:
+        try:
+            report = refit(args.artifact, store, args.base, args.label_encoder)
+        except ValueError as e:
+            raise SystemExit(f"Not refit: {e}")
+        _print_report("refit", report)
+    if store is not None:
+        store.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Tolerant parsing of sensor rows.
+
+Rows from the firmware or from gathered_data.csv can be short (older
+firmware sends 4 of the 6 sensors), have empty fields (``Unknown,,76,18,36``)
+or carry garbage after a serial glitch. Such rows are kept: every missing or
+unparsable field becomes NaN, and DropoutStats counts per channel how often
+that happened, so a dead or unplugged sensor shows up as a dropout rate
+instead of a silently dropped row or a NaN mean fed to the model.
+
+iter_sensor_csv() parses files in blocks with the pandas C parser and
+numpy, so a file is read at block speed rather than raising one Python
+exception per bad line. parse_line() applies the same rules to the single
+live line the acquisition thread has just read.
+
+    python -m enose.ingest check Article1/gathered_data.csv
+"""
+import argparse
+import math
+import os
+
+import numpy as np
+
+NON_SENSOR_COLS = ("Label", "Trial")
+
+def _to_float(text):
+    text = text.strip()
+    if not text:
+        return math.nan
+    try:
+        return float(text)
+    except ValueError:
+        return math.nan
+
+# ---------------- DROPOUT STATISTICS ---------------- #
+class DropoutStats:
+    """
+    Per-channel count of missing readings over the rows seen so far.
+
+    ``short_rows``/``long_rows`` count rows with fewer sensor fields than
+    expected or more fields than sensors + tick; ``rejected`` counts lines
+    with no sensor reading at all (banners, noise), which are not rows.
+    ``absent`` lists expected columns a file does not have.
+    """
+
+    def __init__(self, sensor_cols):
+        self.sensor_cols = list(sensor_cols)
+        self.rows = 0
+        self.missing = [0] * len(self.sensor_cols)
+        self.short_rows = 0
+        self.long_rows = 0
+        self.rejected = 0
+        self.absent = []
+
+    def update_row(self, vals, nfields):
+        self.rows += 1
+        for i, v in enumerate(vals):
+            if v != v:
+                self.missing[i] += 1
+        k = len(self.sensor_cols)
+        if nfields < k:
+            self.short_rows += 1
+        elif nfields > k + 1:
+            self.long_rows += 1
+
+    def update_block(self, values):
+        if len(values) == 0:
+            return
+        self.rows += len(values)
+        counts = np.isnan(values).sum(axis=0)
+        self.missing = [m + int(c) for m, c in zip(self.missing, counts)]
+
+    def rates(self):
+        return {c: (m / self.rows if self.rows else 0.0) for c, m in zip(self.sensor_cols, self.missing)}
+
+    def summary(self):
+        stats = {
+            "rows": self.rows,
+            "dropout": {c: round(r, 4) for c, r in self.rates().items()},
+            "short_rows": self.short_rows,
+            "long_rows": self.long_rows,
+            "rejected": self.rejected,
+        }
+        if self.absent:
+            stats["absent"] = list(self.absent)
+        return stats
+
+    def report(self):
+        lines = [f"{self.rows} rows, {self.short_rows} short, {self.long_rows} long, "
+                 f"{self.rejected} rejected"]
+        if self.absent:
+            lines.append(f"missing columns: {', '.join(self.absent)}")
+        for c, r in self.rates().items():
+            lines.append(f"  {c:>6}: {r:7.2%} missing")
+        return "\n".join(lines)
+
+# ---------------- LINE PARSER ---------------- #
+def _coerce_numeric(frame):
+    """Columns the C parser left as text (garbage somewhere) are re-read, bad cells -> NaN."""
+    import pandas as pd
+
+    for c in frame.columns:
+        if not pd.api.types.is_numeric_dtype(frame[c]):
+            frame[c] = pd.to_numeric(frame[c].str.strip(), errors="coerce")
+    return frame
+
+def parse_line(line, sensor_count):
+    """
+    Parse one firmware line into (values, tick, nfields), or None.
+
+    The first ``sensor_count`` fields are the sensor values; empty,
+    missing or non-numeric ones are NaN. A further numeric field is the
+    device tick in ms. Lines without a single sensor reading give None.
+    """
+    parts = line.split(",")
+    vals = [_to_float(p) for p in parts[:sensor_count]]
+    vals += [math.nan] * (sensor_count - len(vals))
+    if all(v != v for v in vals):
+        return None
+
+    tick = _to_float(parts[sensor_count]) if len(parts) > sensor_count else math.nan
+    return vals, (None if tick != tick else tick), len(parts)
+
+# ---------------- CSV FILES ---------------- #
+def csv_sensor_cols(path):
+    """Sensor columns named in a CSV header (everything but Label/Trial)."""
+    with open(path, newline="") as f:
+        header = f.readline()
+    return [c.strip() for c in header.split(",") if c.strip() and c.strip() not in NON_SENSOR_COLS]
+
+def iter_sensor_csv(path, sensor_cols=None, stats=None, block_rows=50000):
+    """
+    Yield DataFrames of up to ``block_rows`` rows of a gathered_data style CSV.
+
+    Sensor columns are float (NaN where empty or unparsable); Label/Trial
+    are kept as text when present. The header is checked against
+    ``sensor_cols`` (default: every non Label/Trial column): absent columns
+    come back all-NaN and are listed in ``stats.absent``.
+    """
+    import pandas as pd
+
+    cols = list(sensor_cols) if sensor_cols is not None else csv_sensor_cols(path)
+    if stats is None:
+        stats = DropoutStats(cols)
+    present = set(csv_sensor_cols(path))
+    stats.absent = [c for c in cols if c not in present]
+    if stats.absent:
+        print(f"{os.path.basename(path)} has {len(cols) - len(stats.absent)} of {len(cols)} "
+              f"sensor columns (missing {', '.join(stats.absent)})")
+
+    reader = pd.read_csv(path, dtype={c: str for c in NON_SENSOR_COLS}, keep_default_na=False,
+                         na_values=[""], skipinitialspace=True, chunksize=block_rows, engine="c")
+    for frame in reader:
+        frame.columns = [str(c).strip() for c in frame.columns]
+        out = pd.DataFrame(index=frame.index)
+        for c in NON_SENSOR_COLS:
+            if c in frame.columns:
+                out[c] = frame[c].str.strip()
+        sensors = _coerce_numeric(frame[[c for c in cols if c in present]].copy())
+        for c in cols:
+            out[c] = sensors[c].astype(float) if c in present else np.nan
+        stats.update_block(out[cols].to_numpy())
+        yield out
+
+def read_sensor_csv(path, sensor_cols=None):
+    """Return (DataFrame, DropoutStats) for a whole CSV; see iter_sensor_csv."""
+    import pandas as pd
+
+    cols = list(sensor_cols) if sensor_cols is not None else csv_sensor_cols(path)
+    stats = DropoutStats(cols)
+    frames = list(iter_sensor_csv(path, cols, stats))
+    if not frames:
+        return pd.DataFrame(columns=cols), stats
+    return pd.concat(frames, ignore_index=True), stats
+
+def check_complete(names, values):
+    """Raise ValueError naming the features that are NaN (a sensor that never reported)."""
+    missing = [n for n, v in zip(names, values) if v != v]
+    if missing:
+        raise ValueError(f"No readings from {', '.join(missing)}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check sensor CSVs for short rows and dropouts.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("check")
+    p.add_argument("csv", nargs="+")
+    p.add_argument("--sensors", default="MQ2,MQ3,MQ135,MQ136,MQ137,MQ138")
+    args = parser.parse_args(argv)
+
+    for path in args.csv:
+        _, stats = read_sensor_csv(path, args.sensors.split(","))
+        print(f"{path}: {stats.report()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+"""
+One feature pipeline for the training notebooks and the kiosk apps.
+
+Every feature the project knows has a fixed slot in one flat layout:
+
+    MQ2 ... MQ138                   per-sensor means (final_trainingset.csv)
+    MQ2_mean ... MQ138_auc          mean/std/max/min/auc (enose.features)
+    MQ2_slope ... MQ138_deriv_energy  transient response (enose.transient)
+
+A model artifact carries the ordered list of feature names it was trained
+on: the column-order contract. FeaturePipeline turns that list into an
+index array once, when the artifact is loaded, and checks it against the
+estimator's own ``feature_names_in_``; after that a run's features are one
+vectorized take() in the model's order, with no per-call name lookups.
+Training code lays out its matrix through the same pipeline, so the
+notebooks and the kiosk cannot disagree about column order. Its meta
+also says whether the features were baseline-corrected (enose.baseline);
+artifacts that do not say so were trained on raw readings.
+
+    python -m enose.pipeline show Article1/svm_best_model.joblib
+    python -m enose.pipeline wrap Article2/ensemble_model.joblib --label-encoder Article2/label_encoder.joblib
+"""
+import argparse
+import os
+import tempfile
+import warnings
+
+import numpy as np
+
+from enose.features import STATS, feature_names
+from enose.ingest import NON_SENSOR_COLS, check_complete
+from enose.transient import (TRANSIENT_STATS, trial_transient_features, transient_feature_names,
+                             transient_features)
+
+# column order of final_trainingset.csv and of the kiosk apps
+TRAINING_SENSOR_COLS = ["MQ2", "MQ3", "MQ135", "MQ136", "MQ137", "MQ138"]
+ARTIFACT_FORMAT = "enose-model"
+ARTIFACT_VERSION = 1
+
+def layout(sensor_cols=TRAINING_SENSOR_COLS):
+    """Names of the flat feature layout, block by block: means, stats, transient."""
+    return list(sensor_cols) + feature_names(sensor_cols) + transient_feature_names(sensor_cols)
+
+# ---------------- PIPELINE ---------------- #
+class FeaturePipeline:
+    """
+    Lays features out in the order of ``feature_names`` (the contract).
+
+    Unknown names raise ValueError here, once, instead of a KeyError in
+    the middle of a run. Only the blocks the contract uses are computed.
+    """
+
+    def __init__(self, feature_names, sensor_cols=TRAINING_SENSOR_COLS):
+        self.feature_names = list(feature_names)
+        self.sensor_cols = list(sensor_cols)
+        names = layout(self.sensor_cols)
+        slot = {n: i for i, n in enumerate(names)}
+        unknown = [n for n in self.feature_names if n not in slot]
+        if unknown:
+            raise ValueError(f"Unknown features in contract: {', '.join(unknown)}")
+        self._take = np.array([slot[n] for n in self.feature_names], dtype=int)
+        self._transient_names = transient_feature_names(self.sensor_cols)
+        k = len(self.sensor_cols)
+        self._size = len(names)
+        self._stats_at = k
+        self._transient_at = k + k * len(STATS)
+        self.needs_stats = bool(((self._take >= self._stats_at) & (self._take < self._transient_at)).any())
+        self.needs_transient = bool((self._take >= self._transient_at).any())
+
+    def run_row(self, accumulator, curve=None):
+        """
+        (1, n) row of one run from its StreamingFeatures (and CurveBuffer).
+
+        Values are matched to the layout by sensor name; the curve's columns
+        are in the accumulator's order, as both are fed the same readings.
+        """
+        flat = np.full(self._size, np.nan)
+        means = dict(zip(accumulator.sensor_cols, accumulator.means()))
+        flat[:self._stats_at] = [means.get(c, np.nan) for c in self.sensor_cols]
+        if self.needs_stats:
+            flat[self._stats_at:self._transient_at] = list(accumulator.features(self.sensor_cols).values())
+        if self.needs_transient:
+            if curve is None:
+                raise ValueError("Model needs transient features but no response curve was kept")
+            transient = transient_features(*curve.arrays(), accumulator.sensor_cols)
+            flat[self._transient_at:] = [transient.get(n, np.nan) for n in self._transient_names]
+        return flat[self._take][None, :]
+
+    def trial_row(self, values, t=None):
+        """(n,) features of one trial's (samples, sensors) array, vectorized over the samples."""
+        values = np.asarray(values, dtype=float)
+        flat = np.full(self._size, np.nan)
+        counts = (~np.isnan(values)).sum(axis=0)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN sensors stay NaN
+            means = np.nanmean(values, axis=0)
+            if self.needs_stats:
+                stats = np.column_stack([
+                    means, np.nanstd(values, axis=0), np.nanmax(values, axis=0),
+                    np.nanmin(values, axis=0), np.where(counts, np.nansum(values, axis=0), np.nan),
+                ])
+                flat[self._stats_at:self._transient_at] = stats.ravel()
+        flat[:self._stats_at] = means
+        if self.needs_transient:
+            flat[self._transient_at:] = list(trial_transient_features(values, self.sensor_cols, t).values())
+        return flat[self._take]
+
+    def trials_matrix(self, frame):
+        """(X, labels) with one row per (Label, Trial) group of a raw sensor CSV frame."""
+        keys = [c for c in NON_SENSOR_COLS if c in frame.columns]
+        if not keys:
+            return self.trial_row(frame[self.sensor_cols].to_numpy())[None, :], [None]
+        rows, labels = [], []
+        for key, group in frame.groupby(keys, sort=False):
+            rows.append(self.trial_row(group[self.sensor_cols].to_numpy()))
+            labels.append(key[0] if "Label" in keys else None)
+        return np.vstack(rows), labels
+
+    def table(self, frame):
+        """The contract's columns of an already-summarized table, in contract order."""
+        missing = [n for n in self.feature_names if n not in frame.columns]
+        if missing:
+            raise ValueError(f"Table lacks features {', '.join(missing)}")
+        return frame[self.feature_names]
+
+# ---------------- MODEL ARTIFACT ---------------- #
+class ModelArtifact:
+    """A trained estimator with its feature contract and optional label encoder."""
+
+    def __init__(self, model, features, label_encoder=None, meta=None, sensor_cols=TRAINING_SENSOR_COLS):
+        self.model = model
+        self.label_encoder = label_encoder
+        self.meta = dict(meta or {})
+        self.pipeline = FeaturePipeline(features, sensor_cols)
+        trained_on = getattr(model, "feature_names_in_", None)
+        if trained_on is not None and list(trained_on) != self.pipeline.feature_names:
+            raise ValueError(f"Model was trained on {list(trained_on)} but its contract "
+                             f"lists {self.pipeline.feature_names}")
+        n = getattr(model, "n_features_in_", None)
+        if n is not None and n != len(self.pipeline.feature_names):
+            raise ValueError(f"Model expects {n} features, contract lists "
+                             f"{len(self.pipeline.feature_names)}")
+
+    @property
+    def features(self):
+        return self.pipeline.feature_names
+
+    @property
+    def baseline_subtracted(self):
+        """True when the model was trained on features with the clean-air baseline subtracted."""
+        return bool(self.meta.get("baseline_subtracted", False))
+
+    def classes(self):
+        """The labels the model can predict, decoded."""
+        if self.label_encoder is not None:
+            return list(self.label_encoder.classes_)
+        return list(self.model.classes_)
+
+    def predict(self, X):
+        """Labels for rows already in contract order (decoded when there is an encoder)."""
+        with warnings.catch_warnings():
+            # the order is guaranteed by the contract, not by DataFrame column names
+            warnings.filterwarnings("ignore", message="X does not have valid feature names")
+            pred = self.model.predict(np.asarray(X, dtype=float))
+        if self.label_encoder is not None:
+            pred = self.label_encoder.inverse_transform(pred)
+        return pred
+
+    def predict_run(self, accumulator, curve=None):
+        """Label of one kiosk run; a sensor that never reported raises ValueError."""
+        row = self.pipeline.run_row(accumulator, curve)
+        check_complete(self.features, row[0])
+        return self.predict(row)[0]
+
+    def to_dict(self):
+        return {
+            "format": ARTIFACT_FORMAT, "version": ARTIFACT_VERSION,
+            "model": self.model, "features": self.features,
+            "sensors": self.pipeline.sensor_cols,
+            "label_encoder": self.label_encoder, "meta": self.meta,
+        }
+
+def save_artifact(path, model, features, label_encoder=None, meta=None):
+    """Write the artifact atomically (the kiosk reloads the file when it changes)."""
+    import joblib
+
+    artifact = ModelArtifact(model, features, label_encoder, meta)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    os.close(fd)
+    joblib.dump(artifact.to_dict(), tmp)
+    os.replace(tmp, path)
+    return artifact
+
+def load_artifact(path, label_encoder_path=None, default_features=TRAINING_SENSOR_COLS):
+    """
+    Load and check a model artifact.
+
+    A bare estimator from before artifacts carried a contract is wrapped:
+    its ``feature_names_in_`` (or ``default_features``) becomes the
+    contract and a separate label encoder file is picked up if given.
+    """
+    import joblib
+
+    obj = joblib.load(path)
+    if isinstance(obj, dict) and obj.get("format") == ARTIFACT_FORMAT:
+        if obj.get("version") != ARTIFACT_VERSION:
+            raise ValueError(f"{path}: unsupported artifact version {obj.get('version')}")
+        return ModelArtifact(obj["model"], obj["features"], obj.get("label_encoder"),
+                             obj.get("meta"), obj.get("sensors", TRAINING_SENSOR_COLS))
+
+    features = list(getattr(obj, "feature_names_in_", default_features))
+    encoder = None
+    if label_encoder_path and os.path.exists(label_encoder_path):
+        encoder = joblib.load(label_encoder_path)
+    return ModelArtifact(obj, features, encoder, {"legacy": True})
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect model artifacts and their feature contract.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("show")
+    p.add_argument("artifact")
+    p = sub.add_parser("wrap", help="rewrite a bare estimator as an artifact with a contract")
+    p.add_argument("model")
+    p.add_argument("--label-encoder")
+    p.add_argument("-o", "--output", help="default: overwrite the model file")
+    p.add_argument("--baseline-subtracted", action="store_true",
+                   help="the model was trained on baseline-corrected features")
+    args = parser.parse_args(argv)
+
+    if args.cmd == "show":
+        artifact = load_artifact(args.artifact)
+        print(f"{type(artifact.model).__name__}, {len(artifact.features)} features"
+              f"{', label encoder' if artifact.label_encoder is not None else ''}")
+        print("  " + ", ".join(artifact.features))
+        for key, value in artifact.meta.items():
+            print(f"  {key}: {value}")
+    else:
+        artifact = load_artifact(args.model, args.label_encoder)
+        out = args.output or args.model
+        meta = {k: v for k, v in artifact.meta.items() if k != "legacy"}
+        meta["baseline_subtracted"] = args.baseline_subtracted or artifact.baseline_subtracted
+        save_artifact(out, artifact.model, artifact.features, artifact.label_encoder, meta)
+        print(f"Wrote {out} with contract {', '.join(artifact.features)}")
+
+if __name__ == "__main__":
+    main()
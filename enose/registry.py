@@ -0,0 +1,279 @@
+"""
+Local model registry with hot-swap for the running kiosk.
+
+    <root>/versions/0003/model.joblib    one directory per version, never modified
+    <root>/versions/0003/version.json    sha256, source, note, time, artifact meta
+    <root>/CURRENT                       name of the live version
+
+publish() writes the artifact into a hidden temporary directory, checks
+that it loads, renames the directory into place and only then rewrites
+CURRENT (temp file + os.replace). A reader sees the old version or the
+new one, never a half-copied file. activate() points CURRENT at any
+earlier version (rollback).
+
+ModelWatcher runs in the kiosk: it polls CURRENT on a background thread,
+loads and warms a new version there, and hands it over at the next
+swap() - the apps call it when a run starts - so a deployment costs no
+restart and no cold load on the way to a result.
+
+    python -m enose.registry Article1/models publish Article1/svm_best_model.joblib --note "retrained"
+    python -m enose.registry Article1/models list
+    python -m enose.registry Article1/models activate 0002
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from enose.pipeline import load_artifact, save_artifact
+from enose.store import file_sha256
+
+MODEL_FILE = "model.joblib"
+VERSION_FILE = "version.json"
+
+# ---------------- REGISTRY ---------------- #
+class ModelRegistry:
+    """Versioned model directories under ``root`` and the CURRENT pointer."""
+
+    def __init__(self, root):
+        self.root = root
+        self.versions_dir = os.path.join(root, "versions")
+        self.pointer = os.path.join(root, "CURRENT")
+
+    def versions(self):
+        if not os.path.isdir(self.versions_dir):
+            return []
+        return sorted(v for v in os.listdir(self.versions_dir) if not v.startswith("."))
+
+    def current(self):
+        try:
+            with open(self.pointer) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def path(self, version=None):
+        """Artifact file of ``version`` (default: the current one), or None."""
+        version = version or self.current()
+        return os.path.join(self.versions_dir, version, MODEL_FILE) if version else None
+
+    def info(self, version):
+        with open(os.path.join(self.versions_dir, version, VERSION_FILE)) as f:
+            return json.load(f)
+
+    def activate(self, version):
+        if version not in self.versions():
+            raise ValueError(f"No model version {version!r} in {self.root}")
+        fd, tmp = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            f.write(version + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.pointer)
+
+    def publish_artifact(self, model, features, label_encoder=None, meta=None, note="", source=None,
+                         activate=True):
+        """Store a fitted model as the next version; returns the version name."""
+        os.makedirs(self.versions_dir, exist_ok=True)
+        staging = tempfile.mkdtemp(dir=self.versions_dir, prefix=".staging-")
+        try:
+            path = os.path.join(staging, MODEL_FILE)
+            artifact = save_artifact(path, model, features, label_encoder, meta)
+            load_artifact(path)  # what the kiosk will do; a broken file never goes live
+            info = {
+                "sha256": file_sha256(path),
+                "source": source,
+                "note": note,
+                "published_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "model": type(artifact.model).__name__,
+                "features": artifact.features,
+                "meta": artifact.meta,
+            }
+            with open(os.path.join(staging, VERSION_FILE), "w") as f:
+                json.dump(info, f, indent=2, default=str)
+            while True:
+                existing = self.versions()
+                version = f"{int(existing[-1]) + 1 if existing else 1:04d}"
+                try:
+                    os.rename(staging, os.path.join(self.versions_dir, version))
+                    break
+                except OSError:
+                    if not os.path.exists(os.path.join(self.versions_dir, version)):
+                        raise  # not a lost race with another publisher
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        if activate:
+            self.activate(version)
+        return version
+
+    def publish(self, src, note="", label_encoder_path=None, activate=True):
+        """Publish an artifact file (a bare estimator is wrapped, see load_artifact)."""
+        artifact = load_artifact(src, label_encoder_path)
+        meta = {k: v for k, v in artifact.meta.items() if k != "legacy"}
+        return self.publish_artifact(artifact.model, artifact.features, artifact.label_encoder,
+                                     meta, note, os.path.abspath(src), activate)
+
+    def ensure(self, src, label_encoder_path=None):
+        """Import ``src`` as the first version when the registry is empty; returns the current version."""
+        if self.current() is None and src and os.path.exists(src):
+            self.publish(src, note=f"imported {os.path.basename(src)}", label_encoder_path=label_encoder_path)
+        return self.current()
+
+    def prune(self, keep=5):
+        """Delete all but the newest ``keep`` versions (never the current one)."""
+        current = self.current()
+        old = [v for v in self.versions()[:-keep] if v != current] if keep > 0 else []
+        for version in old:
+            shutil.rmtree(os.path.join(self.versions_dir, version))
+        return old
+
+# ---------------- WATCHER ---------------- #
+def warm(artifact):
+    """One prediction off the critical path: first-call imports, lazy buffers, XGB booster setup."""
+    artifact.predict(np.zeros((1, len(artifact.features))))
+
+class ModelWatcher:
+    """
+    Keeps the kiosk's model in step with the registry.
+
+    ``active()`` is the model predictions use; a version that went live
+    since is loaded and warmed on the watcher thread and only becomes
+    active at ``swap()``. Without a registry version the watcher imports
+    ``fallback`` (the model file next to the app) as the first one.
+    """
+
+    def __init__(self, registry, fallback=None, label_encoder_path=None, poll_s=2.0):
+        self.registry = registry
+        self.fallback = fallback
+        self.label_encoder_path = label_encoder_path
+        self.poll_s = poll_s
+        self.lock = threading.Lock()
+        self._polling = threading.Lock()  # one import/load at a time (watcher or first active())
+        self._stop = threading.Event()
+        self._thread = None
+        self._seen = None
+        self._pending = None
+        self._active = None   # (version, path, artifact)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _load(self, version):
+        path = self.registry.path(version) if version else self.fallback
+        started = time.perf_counter()
+        artifact = load_artifact(path, self.label_encoder_path)
+        warm(artifact)
+        print(f"Model {version or os.path.basename(path)} loaded and warmed in "
+              f"{(time.perf_counter() - started) * 1000:.0f} ms")
+        return version, path, artifact
+
+    def _poll(self):
+        with self._polling:
+            self._poll_locked()
+
+    def _poll_locked(self):
+        version = self.registry.current()
+        if version is None:
+            try:
+                version = self.registry.ensure(self.fallback, self.label_encoder_path)
+            except Exception as e:
+                print(f"Could not import {self.fallback} into the model registry: {e}")
+        if version == self._seen or (version is None and self._active is not None):
+            return
+        self._seen = version
+        try:
+            loaded = self._load(version)
+        except Exception as e:
+            print(f"Model version {version} failed to load, keeping the current one: {e}")
+            return
+        with self.lock:
+            if self._active is None:
+                self._active = loaded
+            else:
+                self._pending = loaded
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self._poll()
+            except Exception as e:
+                print(f"Model watcher error: {e}")
+            self._stop.wait(self.poll_s)
+
+    def swap(self):
+        """Make a loaded newer version active; call between runs. Returns True on a swap."""
+        with self.lock:
+            if self._pending is None:
+                return False
+            self._active, self._pending = self._pending, None
+            version = self._active[0]
+        print(f"Switched to model version {version}")
+        return True
+
+    def active(self):
+        """The active artifact; loads synchronously only if the watcher has not yet."""
+        with self.lock:
+            if self._active is not None:
+                return self._active[2]
+        self._poll()
+        with self.lock:
+            if self._active is None:
+                raise ValueError("No model available")
+            return self._active[2]
+
+    @property
+    def active_version(self):
+        with self.lock:
+            return self._active[0] if self._active else None
+
+    @property
+    def active_path(self):
+        with self.lock:
+            return self._active[1] if self._active else None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the kiosk's model versions.")
+    parser.add_argument("root", help="registry directory (e.g. Article1/models)")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("list")
+    p = sub.add_parser("publish")
+    p.add_argument("artifact")
+    p.add_argument("--note", default="")
+    p.add_argument("--label-encoder")
+    p.add_argument("--inactive", action="store_true", help="store without switching to it")
+    p = sub.add_parser("activate", help="switch (or roll back) to a version")
+    p.add_argument("version")
+    p = sub.add_parser("prune")
+    p.add_argument("--keep", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    registry = ModelRegistry(args.root)
+    if args.cmd == "list":
+        current = registry.current()
+        for version in registry.versions():
+            info = registry.info(version)
+            mark = "*" if version == current else " "
+            print(f"{mark} {version}  {info['published_at']}  {info['model']}  {info['sha256'][:12]}  {info['note']}")
+    elif args.cmd == "publish":
+        version = registry.publish(args.artifact, args.note, args.label_encoder, not args.inactive)
+        print(f"Published {args.artifact} as {version}{'' if args.inactive else ' (live)'}")
+    elif args.cmd == "activate":
+        registry.activate(args.version)
+        print(f"Live model is now {args.version}")
+    else:
+        removed = registry.prune(args.keep)
+        print(f"Removed {len(removed)} version(s){': ' + ', '.join(removed) if removed else ''}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""
+Append-only binary session files.
+
+Layout: a fixed HEADER_SIZE block (magic + JSON metadata padded with spaces)
+followed by fixed-width records of one float64 host timestamp, an optional
+float64 device tick (header "tick": true) and one float32 per sensor, in
+header order. Records are read back with np.memmap, so loading a
+long session does not parse any text; a truncated last record (power loss
+mid-write) is ignored by the reader.
+
+    python -m enose.session_file to-csv gathered_data.ens gathered_data.csv
+    python -m enose.session_file from-csv gathered_data.csv gathered_data.ens
+"""
+import argparse
+import csv
+import json
+import math
+import os
+import struct
+import time
+
+import numpy as np
+
+from enose.ingest import csv_sensor_cols, iter_sensor_csv
+
+MAGIC = b"ENOSES01"
+HEADER_SIZE = 1024
+FORMAT_VERSION = 2
+
+def record_dtype(sensor_cols, tick=False):
+    fields = [("t", "<f8")]
+    if tick:
+        fields.append(("tick", "<f8"))
+    return np.dtype(fields + [(name, "<f4") for name in sensor_cols])
+
+def _record_pack(sensor_cols, tick):
+    return struct.Struct("<d" + ("d" if tick else "") + "f" * len(sensor_cols)).pack
+
+# ---------------- WRITER ---------------- #
+class SessionWriter:
+    """
+    Appends sensor rows to a session file.
+
+    ``t`` is seconds since the session started; when it is not given the
+    writer stamps the row with the host monotonic clock. ``tick`` is the
+    device tick in ms (NaN when the firmware does not send one).
+    """
+
+    def __init__(self, path, sensor_cols, firmware="", start_time=None, tick=True):
+        self.path = path
+        self.sensor_cols = list(sensor_cols)
+        self.start_time = time.time() if start_time is None else start_time
+        self.tick = tick
+        self._t0 = time.monotonic()
+        self._pack = _record_pack(self.sensor_cols, tick)
+        self.count = 0
+
+        self.meta = {
+            "version": FORMAT_VERSION,
+            "sensors": self.sensor_cols,
+            "tick": tick,
+            "firmware": firmware,
+            "start_time": self.start_time,
+        }
+        self._f = open(path, "wb")
+        self._f.write(self._header_bytes())
+
+    @classmethod
+    def resume(cls, path, count=None):
+        """
+        Reopen an existing session file for appending.
+
+        The file is cut back to ``count`` records (all complete records when
+        None), dropping anything written after the last checkpoint.
+        """
+        header = read_header(path)
+        writer = cls.__new__(cls)
+        writer.path = path
+        writer.sensor_cols = list(header["sensors"])
+        writer.start_time = header.get("start_time")
+        writer.tick = header.get("tick", False)
+        writer._t0 = time.monotonic()
+        writer._pack = _record_pack(writer.sensor_cols, writer.tick)
+        writer.meta = header
+
+        itemsize = record_dtype(writer.sensor_cols, writer.tick).itemsize
+        available = (os.path.getsize(path) - HEADER_SIZE) // itemsize
+        writer.count = available if count is None else min(count, available)
+        writer._f = open(path, "r+b")
+        writer._f.truncate(HEADER_SIZE + writer.count * itemsize)
+        writer._f.seek(0, os.SEEK_END)
+        return writer
+
+    def _header_bytes(self):
+        header = MAGIC + json.dumps(self.meta).encode("utf-8")
+        if len(header) > HEADER_SIZE:
+            raise ValueError("Session header does not fit in HEADER_SIZE bytes.")
+        return header.ljust(HEADER_SIZE, b" ")
+
+    def append(self, vals, t=None, tick=None):
+        if t is None:
+            t = time.monotonic() - self._t0
+        if self.tick:
+            self._f.write(self._pack(t, math.nan if tick is None else tick, *vals))
+        else:
+            self._f.write(self._pack(t, *vals))
+        self.count += 1
+
+    def append_block(self, values, t=None, tick=None):
+        """Append an (n, k) array of rows in one write; ``t``/``tick`` default to NaN."""
+        values = np.asarray(values, dtype=float).reshape(-1, len(self.sensor_cols))
+        records = np.empty(len(values), dtype=record_dtype(self.sensor_cols, self.tick))
+        records["t"] = np.nan if t is None else t
+        if self.tick:
+            records["tick"] = np.nan if tick is None else tick
+        for j, name in enumerate(self.sensor_cols):
+            records[name] = values[:, j]
+        self._f.write(records.tobytes())
+        self.count += len(records)
+
+    def flush(self):
+        if not self._f.closed:
+            self._f.flush()
+
+    def sync(self):
+        """Flush and fsync, so every appended record survives a power loss."""
+        self.flush()
+        os.fsync(self._f.fileno())
+
+    def close(self, stats=None):
+        """Close the file; ``stats`` (e.g. measured sample rate) is written into the header."""
+        if self._f.closed:
+            return
+        if stats:
+            self.meta["stats"] = stats
+            try:
+                header = self._header_bytes()
+            except ValueError as e:
+                print(f"Session stats not recorded: {e}")
+            else:
+                self._f.seek(0)
+                self._f.write(header)
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# ---------------- READER ---------------- #
+def read_header(path):
+    with open(path, "rb") as f:
+        block = f.read(HEADER_SIZE)
+    if len(block) < HEADER_SIZE or not block.startswith(MAGIC):
+        raise ValueError(f"{path} is not an E-Nose session file")
+    return json.loads(block[len(MAGIC):].decode("utf-8").rstrip())
+
+def open_session(path):
+    """Return (header, records) where records is a read-only structured memmap."""
+    header = read_header(path)
+    dtype = record_dtype(header["sensors"], header.get("tick", False))
+    n = (os.path.getsize(path) - HEADER_SIZE) // dtype.itemsize
+    if n == 0:
+        return header, np.zeros(0, dtype=dtype)
+    records = np.memmap(path, dtype=dtype, mode="r", offset=HEADER_SIZE, shape=(n,))
+    return header, records
+
+def session_values(records, sensor_cols):
+    """Copy the sensor columns of a record array into an (n, k) float array."""
+    return np.column_stack([np.asarray(records[c], dtype=float) for c in sensor_cols])
+
+def session_means(path, sensor_cols=None):
+    header, records = open_session(path)
+    if len(records) == 0:
+        raise ValueError(f"{os.path.basename(path)} is empty")
+    cols = sensor_cols or header["sensors"]
+    return [float(np.nanmean(records[c])) for c in cols]
+
+# ---------------- CSV CONVERTERS ---------------- #
+def _format_value(v):
+    return "" if math.isnan(v) else f"{v:.7g}"
+
+def session_to_csv(session_path, csv_path, label="Unknown"):
+    """Write a session in the gathered_data.csv layout (Label + sensor columns)."""
+    header, records = open_session(session_path)
+    cols = header["sensors"]
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Label"] + cols)
+        for row in session_values(records, cols):
+            writer.writerow([label] + [_format_value(v) for v in row])
+    return len(records)
+
+def csv_to_session(csv_path, session_path, firmware="", sensor_cols=None):
+    """
+    Convert a gathered_data.csv style file block by block (see enose.ingest).
+    Empty or non-numeric fields become NaN, as do ``sensor_cols`` the CSV
+    lacks; the CSV has no timestamps so every record gets t = NaN.
+    """
+    cols = list(sensor_cols or csv_sensor_cols(csv_path))
+    with SessionWriter(session_path, cols, firmware=firmware,
+                       start_time=os.path.getmtime(csv_path), tick=False) as out:
+        for block in iter_sensor_csv(csv_path, cols):
+            out.append_block(block[cols].to_numpy())
+        return out.count
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert between session files and CSV.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("to-csv")
+    p.add_argument("session")
+    p.add_argument("csv")
+    p.add_argument("--label", default="Unknown")
+    p = sub.add_parser("from-csv")
+    p.add_argument("csv")
+    p.add_argument("session")
+    args = parser.parse_args(argv)
+
+    if args.cmd == "to-csv":
+        n = session_to_csv(args.session, args.csv, label=args.label)
+    else:
+        n = csv_to_session(args.csv, args.session)
+    print(f"Converted {n} rows.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Online steady-state detection for the gather and exhaust phases.
+
+The reading page gathers for a fixed 600 s and the exhaust runs for 900 s,
+although most runs have long plateaued (or recovered) before that.
+SteadyStateDetector keeps, per sensor, running sums over the last
+``window_s`` seconds of the live stream, so each sample costs O(1) and
+check() gets the least-squares slope and mean of every channel without
+touching the samples again. A phase is settled when every sensor's drift
+has stayed within tolerance for ``hold_s`` seconds (and, for the exhaust,
+its level is back within tolerance of the cached baseline). The fixed
+phase lengths remain as timeouts.
+
+Replaying a recorded session shows when it would have stopped:
+
+    python -m enose.steady replay Article1/gathered_data.ens
+    python -m enose.steady replay exhaust.ens --baseline Article1/baseline_cache.json
+"""
+import argparse
+import collections
+import json
+import math
+
+# ---------------- DETECTOR ---------------- #
+class SteadyStateDetector:
+    """
+    Rolling-window drift detector over ``sensor_count`` channels.
+
+    A channel is steady when its slope over the window is at most
+    ``rel_tol`` of its level per minute (or ``abs_tol`` units per minute
+    for levels near zero). With a ``target`` (one value per channel, NaN
+    for none), its window mean must also be within ``target_tol`` of it.
+    Channels without readings in the window are not judged. Nothing is
+    settled before ``min_s`` seconds.
+    """
+
+    def __init__(self, sensor_count, window_s=30, hold_s=30, min_s=120,
+                 rel_tol=0.02, abs_tol=1.0, target=None, target_tol=0.05):
+        self.sensor_count = sensor_count
+        self.window_s = window_s
+        self.hold_s = hold_s
+        self.min_s = min_s
+        self.rel_tol = rel_tol
+        self.abs_tol = abs_tol
+        self.target = list(target) if target is not None else None
+        self.target_tol = target_tol
+        self.settled_at = None
+        self._steady_since = None
+        self._window = collections.deque()
+        self._t_last = None
+        # per channel: n, sum t, sum x, sum t^2, sum t*x (t relative to the first sample)
+        self._t0 = None
+        self._sums = [[0, 0.0, 0.0, 0.0, 0.0] for _ in range(sensor_count)]
+
+    def update(self, t, vals):
+        if self._t0 is None:
+            self._t0 = t
+        self._window.append((t, vals))
+        self._add(t - self._t0, vals, 1)
+        while t - self._window[0][0] > self.window_s:
+            old_t, old = self._window.popleft()
+            self._add(old_t - self._t0, old, -1)
+        self._t_last = t
+
+    def _add(self, t, vals, sign):
+        for s, v in zip(self._sums, vals):
+            if v == v:  # not NaN
+                s[0] += sign
+                s[1] += sign * t
+                s[2] += sign * v
+                s[3] += sign * t * t
+                s[4] += sign * t * v
+
+    def channel_state(self):
+        """(slope per minute, window mean) per channel; NaN where it cannot be judged."""
+        out = []
+        for n, st, sx, stt, stx in self._sums:
+            if n < 3:
+                out.append((math.nan, math.nan))
+                continue
+            var = stt - st * st / n
+            slope = (stx - st * sx / n) / var if var > 0 else math.nan
+            out.append((slope * 60, sx / n))
+        return out
+
+    def _is_steady(self):
+        if not self._window or self._window[-1][0] - self._window[0][0] < 0.8 * self.window_s:
+            return False
+        judged = 0
+        for i, (drift, mean) in enumerate(self.channel_state()):
+            if drift != drift:
+                continue
+            judged += 1
+            if abs(drift) > max(self.rel_tol * abs(mean), self.abs_tol):
+                return False
+            target = self.target[i] if self.target else math.nan
+            if target == target and abs(mean - target) > max(self.target_tol * abs(target), self.abs_tol):
+                return False
+        return judged > 0
+
+    def check(self):
+        """Call periodically (e.g. once per timer tick); True once the phase has settled."""
+        if self.settled_at is not None:
+            return True
+        if self._t_last is None:
+            return False
+        if not self._is_steady():
+            self._steady_since = None
+            return False
+        if self._steady_since is None:
+            self._steady_since = self._t_last
+        if self._t_last - self._steady_since >= self.hold_s and self._t_last >= self.min_s:
+            self.settled_at = self._t_last
+            return True
+        return False
+
+def settle_stats(timeout_s, elapsed_s):
+    """Record of an early stop, kept with the run's statistics."""
+    return {"settled_at_s": round(elapsed_s, 1), "saved_s": round(max(timeout_s - elapsed_s, 0), 1)}
+
+# ---------------- REPLAY ---------------- #
+def replay(t, values, detector, check_every_s=1.0):
+    """Feed a recorded (t, values) stream through ``detector``; return the settle time or None."""
+    next_check = None
+    for ti, row in zip(t, values):
+        detector.update(ti, row)
+        if next_check is None:
+            next_check = ti + check_every_s
+        if ti >= next_check:
+            next_check += check_every_s
+            if detector.check():
+                return detector.settled_at
+    return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a session through the steady-state detector.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("replay")
+    p.add_argument("session", help="session file (.ens) with host timestamps")
+    p.add_argument("--baseline", help="baseline cache to return to (exhaust runs)")
+    p.add_argument("--timeout", type=float, default=None, help="phase length it would replace")
+    args = parser.parse_args(argv)
+
+    import numpy as np
+    from enose.baseline import baseline_values
+    from enose.session_file import open_session, session_values
+
+    header, records = open_session(args.session)
+    cols = header["sensors"]
+    t = np.asarray(records["t"], dtype=float)
+    if not np.isfinite(t).all():
+        raise SystemExit(f"{args.session} has no timestamps to replay")
+    target = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            target = baseline_values(json.load(f), cols)
+
+    detector = SteadyStateDetector(len(cols), target=target)
+    settled = replay((t - t[0]).tolist(), session_values(records, cols).tolist(), detector)
+    timeout = args.timeout or (t[-1] - t[0])
+    if settled is None:
+        print(f"Never settled in {t[-1] - t[0]:.0f} s")
+    else:
+        print(f"Settled at {settled:.0f} s, {timeout - settled:.0f} s before {timeout:.0f} s")
+    for name, (drift, mean) in zip(cols, detector.channel_state()):
+        print(f"  {name:>6}: mean {mean:8.2f}  drift {drift:+.3f}/min")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+"""
+SQLite store for kiosk runs.
+
+One database (WAL mode) holds every session, its raw samples, the features
+fed to the model, the predictions and the model versions that made them.
+History queries and training-set exports are index lookups instead of
+re-reading CSV files.
+
+    python -m enose.store Article1/enose_sessions.db history
+    python -m enose.store Article1/enose_sessions.db export trainingset.csv
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from enose.session_file import open_session, session_values
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS model_versions (
+    id          INTEGER PRIMARY KEY,
+    name        TEXT NOT NULL,
+    sha256      TEXT NOT NULL,
+    path        TEXT,
+    created_at  REAL NOT NULL,
+    UNIQUE (name, sha256)
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    id          INTEGER PRIMARY KEY,
+    started_at  REAL NOT NULL,
+    ended_at    REAL,
+    app         TEXT,
+    label       TEXT,
+    sensors     TEXT NOT NULL,
+    raw_path    TEXT,
+    stats       TEXT
+);
+CREATE TABLE IF NOT EXISTS samples (
+    session_id  INTEGER NOT NULL REFERENCES sessions(id),
+    seq         INTEGER NOT NULL,
+    t           REAL,
+    {sample_cols},
+    PRIMARY KEY (session_id, seq)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS features (
+    session_id  INTEGER NOT NULL REFERENCES sessions(id),
+    name        TEXT NOT NULL,
+    value       REAL,
+    PRIMARY KEY (session_id, name)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS predictions (
+    id          INTEGER PRIMARY KEY,
+    session_id  INTEGER NOT NULL REFERENCES sessions(id),
+    model_id    INTEGER REFERENCES model_versions(id),
+    label       TEXT NOT NULL,
+    created_at  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_started ON sessions(started_at);
+CREATE INDEX IF NOT EXISTS idx_sessions_label ON sessions(label, started_at);
+CREATE INDEX IF NOT EXISTS idx_predictions_session ON predictions(session_id);
+CREATE INDEX IF NOT EXISTS idx_predictions_model ON predictions(model_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_predictions_label ON predictions(label, created_at);
+"""
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+def file_sha256(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+class SessionStore:
+    """
+    Thread-safe wrapper around one SQLite connection.
+
+    The acquisition thread and the Tk thread share the store, so every call
+    takes ``self.lock``. Raw samples are inserted with executemany in batches
+    of ``batch_size`` rows.
+    """
+
+    def __init__(self, path, sensor_cols, batch_size=500):
+        self.path = path
+        self.sensor_cols = list(sensor_cols)
+        self.batch_size = batch_size
+        self.lock = threading.RLock()
+        self._model_ids = {}
+
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        sample_cols = ",\n    ".join(f"{_quote(c)} REAL" for c in self.sensor_cols)
+        with self.conn:
+            self.conn.executescript(SCHEMA.format(sample_cols=sample_cols))
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    # ---------------- SESSIONS ---------------- #
+    def begin_session(self, app="", label=None, raw_path=None, started_at=None):
+        with self.lock, self.conn:
+            cur = self.conn.execute(
+                "INSERT INTO sessions (started_at, app, label, sensors, raw_path) VALUES (?, ?, ?, ?, ?)",
+                (time.time() if started_at is None else started_at, app, label,
+                 json.dumps(self.sensor_cols), raw_path),
+            )
+            return cur.lastrowid
+
+    def end_session(self, session_id, ended_at=None, stats=None):
+        """Close a session; ``stats`` (sample rate, jitter ...) is stored as JSON."""
+        with self.lock, self.conn:
+            self.conn.execute(
+                "UPDATE sessions SET ended_at = ?, stats = ? WHERE id = ?",
+                (time.time() if ended_at is None else ended_at,
+                 json.dumps(stats) if stats else None, session_id),
+            )
+
+    def set_label(self, session_id, label):
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE sessions SET label = ? WHERE id = ?", (label, session_id))
+
+    # ---------------- RAW SAMPLES ---------------- #
+    def add_samples(self, session_id, rows, t=None, first_seq=0):
+        """Insert raw rows (sequence of per-sensor values) in batches."""
+        cols = ", ".join(_quote(c) for c in self.sensor_cols)
+        marks = ", ".join("?" * (3 + len(self.sensor_cols)))
+        sql = f"INSERT OR REPLACE INTO samples (session_id, seq, t, {cols}) VALUES ({marks})"
+
+        batch = []
+        n = 0
+        for i, row in enumerate(rows):
+            ti = None if t is None else float(t[i])
+            batch.append((session_id, first_seq + i, ti) + tuple(float(v) for v in row))
+            if len(batch) >= self.batch_size:
+                with self.lock, self.conn:
+                    self.conn.executemany(sql, batch)
+                n += len(batch)
+                batch = []
+        if batch:
+            with self.lock, self.conn:
+                self.conn.executemany(sql, batch)
+            n += len(batch)
+        return n
+
+    def import_session_file(self, session_id, path):
+        """Bulk-load the raw records of an enose.session_file into ``samples``."""
+        header, records = open_session(path)
+        if len(records) == 0:
+            return 0
+        # copy out of the memmap first: the app truncates the file on the next run
+        values = session_values(records, self.sensor_cols)
+        t = np.array(records["t"])
+        del records
+        return self.add_samples(session_id, values, t=t)
+
+    def samples(self, session_id):
+        cols = ", ".join(_quote(c) for c in self.sensor_cols)
+        with self.lock:
+            return self.conn.execute(
+                f"SELECT t, {cols} FROM samples WHERE session_id = ? ORDER BY seq",
+                (session_id,),
+            ).fetchall()
+
+    # ---------------- FEATURES ---------------- #
+    def add_features(self, session_id, names, values):
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO features (session_id, name, value) VALUES (?, ?, ?)",
+                [(session_id, n, float(v)) for n, v in zip(names, values)],
+            )
+
+    def features(self, session_id, names):
+        """Return feature values for ``names`` (in that order); missing ones raise."""
+        with self.lock:
+            found = dict(self.conn.execute(
+                "SELECT name, value FROM features WHERE session_id = ?", (session_id,)
+            ).fetchall())
+        missing = [n for n in names if n not in found]
+        if missing:
+            raise ValueError(f"Missing features for session {session_id}: {missing}")
+        # SQLite stores NaN as NULL
+        return [float("nan") if found[n] is None else found[n] for n in names]
+
+    # ---------------- MODELS AND PREDICTIONS ---------------- #
+    def register_model(self, path, name=None):
+        """Return the model_versions id for the file at ``path`` (hashed once per mtime)."""
+        key = (path, os.path.getmtime(path))
+        if key in self._model_ids:
+            return self._model_ids[key]
+
+        name = name or os.path.basename(path)
+        digest = file_sha256(path)
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO model_versions (name, sha256, path, created_at) VALUES (?, ?, ?, ?)",
+                (name, digest, path, time.time()),
+            )
+            model_id = self.conn.execute(
+                "SELECT id FROM model_versions WHERE name = ? AND sha256 = ?", (name, digest)
+            ).fetchone()[0]
+        self._model_ids[key] = model_id
+        return model_id
+
+    def add_prediction(self, session_id, label, model_id=None):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO predictions (session_id, model_id, label, created_at) VALUES (?, ?, ?, ?)",
+                (session_id, model_id, str(label), time.time()),
+            )
+
+    # ---------------- QUERIES ---------------- #
+    def history(self, limit=20, label=None):
+        """Most recent sessions with their latest prediction."""
+        sql = """
+            SELECT s.id, s.started_at, s.label, p.label, m.name
+            FROM sessions s
+            LEFT JOIN predictions p ON p.id = (
+                SELECT id FROM predictions WHERE session_id = s.id ORDER BY created_at DESC LIMIT 1)
+            LEFT JOIN model_versions m ON m.id = p.model_id
+        """
+        args = []
+        if label is not None:
+            sql += " WHERE s.label = ?"
+            args.append(label)
+        sql += " ORDER BY s.started_at DESC LIMIT ?"
+        args.append(limit)
+        with self.lock:
+            return self.conn.execute(sql, args).fetchall()
+
+    def training_rows(self, feature_names, include_unlabelled=False, with_ids=False, baseline=None):
+        """
+        Yield [label] + features (``with_ids``: [id, label] + ...) for every
+        session that has all ``feature_names``. ``baseline`` True/False keeps
+        only sessions whose features were/were not baseline-corrected.
+        """
+        clauses = [] if include_unlabelled else ["s.label IS NOT NULL"]
+        if baseline is not None:
+            clauses.append(f"json_extract(s.stats, '$.baseline') IS {'NOT ' if baseline else ''}NULL")
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        sql = f"""
+            SELECT s.id, COALESCE(s.label, 'Unknown'), f.name, f.value
+            FROM sessions s JOIN features f ON f.session_id = s.id
+            {where}
+            ORDER BY s.id
+        """
+        with self.lock:
+            rows = self.conn.execute(sql).fetchall()
+
+        current, label, values = None, None, {}
+        for sid, lab, name, value in rows + [(None, None, None, None)]:
+            if sid != current:
+                if current is not None and all(n in values for n in feature_names):
+                    row = [label] + [values[n] for n in feature_names]
+                    yield [current] + row if with_ids else row
+                current, label, values = sid, lab, {}
+            values[name] = value
+
+    def export_training_set(self, csv_path, feature_names=None, include_unlabelled=False):
+        """Write labelled sessions in the final_trainingset.csv layout."""
+        names = list(feature_names or self.sensor_cols)
+        n = 0
+        with open(csv_path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["Label"] + names)
+            for row in self.training_rows(names, include_unlabelled):
+                writer.writerow(row)
+                n += 1
+        return n
+
+    def labels(self, include_predicted=False):
+        """{session id: confirmed label}; ``include_predicted`` falls back to the latest prediction."""
+        with self.lock:
+            rows = self.conn.execute("""
+                SELECT s.id, s.label, p.label
+                FROM sessions s
+                LEFT JOIN predictions p ON p.id = (
+                    SELECT id FROM predictions WHERE session_id = s.id ORDER BY created_at DESC LIMIT 1)
+            """).fetchall()
+        return {sid: label or (predicted if include_predicted else None)
+                for sid, label, predicted in rows if label or (include_predicted and predicted)}
+
+    def unlabelled(self, limit=20):
+        """Finished sessions still waiting for a confirmed label, with their latest prediction."""
+        with self.lock:
+            return self.conn.execute("""
+                SELECT s.id, s.started_at, p.label
+                FROM sessions s
+                LEFT JOIN predictions p ON p.id = (
+                    SELECT id FROM predictions WHERE session_id = s.id ORDER BY created_at DESC LIMIT 1)
+                WHERE s.label IS NULL AND s.ended_at IS NOT NULL
+                ORDER BY s.started_at DESC LIMIT ?
+            """, (limit,)).fetchall()
+
+    def import_mean_csv(self, csv_path, app="import"):
+        """Migrate a gathered_data_mean(_log).csv file: one session per row."""
+        n = 0
+        with open(csv_path, newline="") as f:
+            for row in csv.DictReader(f):
+                label = row.pop("Label", None)
+                sid = self.begin_session(app=app, label=None if label in (None, "Unknown") else label)
+                names = [c for c in self.sensor_cols if c in row]
+                values = []
+                for c in names:
+                    try:
+                        values.append(float(row[c]))
+                    except (TypeError, ValueError):
+                        values.append(float("nan"))
+                self.add_features(sid, names, values)
+                n += 1
+        return n
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query or export the kiosk session store.")
+    parser.add_argument("db")
+    parser.add_argument("--sensors", default="MQ2,MQ3,MQ135,MQ136,MQ137,MQ138")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("history")
+    p.add_argument("--limit", type=int, default=20)
+    p.add_argument("--label")
+    p = sub.add_parser("export")
+    p.add_argument("csv")
+    p.add_argument("--all", action="store_true", help="include unlabelled sessions as 'Unknown'")
+    p = sub.add_parser("import-csv")
+    p.add_argument("csv")
+    args = parser.parse_args(argv)
+
+    store = SessionStore(args.db, args.sensors.split(","))
+    if args.cmd == "history":
+        for sid, started, label, pred, model in store.history(args.limit, args.label):
+            when = time.strftime("%Y-%m-%d %H:%M", time.localtime(started))
+            print(f"{sid:>6}  {when}  label={label or '-'}  predicted={pred or '-'}  model={model or '-'}")
+    elif args.cmd == "export":
+        print(f"Exported {store.export_training_set(args.csv, include_unlabelled=args.all)} rows.")
+    else:
+        print(f"Imported {store.import_mean_csv(args.csv)} rows.")
+    store.close()
+
+if __name__ == "__main__":
+    main()
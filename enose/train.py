@@ -0,0 +1,845 @@
+"""
+Scripted hyperparameter search for the kiosk models.
+
+Article1's notebook ran GridSearchCV over 5 C x 6 gamma x 5 PCA sizes with
+10-fold CV: 1,500 fits of scaler -> PCA -> SVC, each refitting the scaler
+and PCA although only the SVC settings changed, and each SVC running its
+own internal 5-fold Platt scaling because of ``probability=True``.
+GridSearch takes the same pipeline and grid but
+
+  * fits the preprocessing steps once per (fold, preprocessing params) and
+    memoizes the transformed fold in each worker process (50 scaler+PCA
+    fits instead of 1,500),
+  * scores label-based metrics with ``probability=False``: SVC.predict
+    does not use the Platt model, so the scores are the same,
+  * encodes the labels once and computes macro F1 / accuracy with
+    bincount instead of sklearn's per-call input validation,
+  * spreads (fold, preprocessing) groups over a process pool,
+
+and refits only the winner, as configured, on the whole training split.
+Candidates are ranked like GridSearchCV (first best in grid order), so the
+chosen parameters match the notebook's.
+
+HalvingSearch scores the same kind of candidate list by successive halving
+over the CV folds: every candidate gets ``min_folds`` folds, the best
+1/``eta`` go on to ``eta`` times as many, and so on until the survivors
+have the full 10-fold score. Fold scores are kept between rounds, so a
+survivor only fits the folds it has not seen. It runs the Article1 grid and
+the Article2 SVM/kNN/XGB spaces (sampled at random); ``compare`` times it
+against the exhaustive search and, where scikit-optimize is installed, the
+notebook's BayesSearchCV.
+
+    python -m enose.train svm Article1/final_trainingset.csv -o Article1/svm_best_model.joblib --workers 4
+    python -m enose.train svm Article1/final_trainingset.csv --search halving
+    python -m enose.train compare Article2/final_trainingset.csv --members svm knn xgb --report compare.json
+
+BayesSearch is the Article2 notebook's BayesSearchCV (scikit-optimize's
+Optimizer, GP surrogate) with a checkpoint: every evaluated point, its fold
+scores and the data it was scored on go to a JSON file after each
+iteration, and the surrogate is rebuilt from them on restart, so a dead
+kernel loses at most one evaluation. When the training data has changed
+the old points warm-start the surrogate: the best few are re-scored on
+the new data and a few new points are asked, instead of a full search.
+
+    python -m enose.train bayes Article2/final_trainingset.csv --member svm --checkpoint Article2/bayes_svm.json
+
+cached_fit() puts any of these searches behind a content-addressed cache:
+the key hashes the training matrix and labels, the feature columns, the
+search configuration (estimator parameters, space, folds, scoring) and the
+versions of the libraries involved, and a hit restores the fitted search
+(best estimator, scores, timings) without fitting anything. Each Article2
+member is its own entry, so editing the XGB space leaves the SVM and kNN
+searches cached.
+"""
+import argparse
+import functools
+import hashlib
+import json
+import math
+import os
+import tempfile
+import time
+
+import numpy as np
+
+# the Article1 notebook's search
+SVM_PARAM_GRID = {
+    "classifier__C": [0.1, 1, 10, 50, 100],
+    "classifier__gamma": [1e-4, 5e-4, 0.001, 0.005, 0.01, 0.1],
+    "pca__n_components": [2, 3, 4, 5, 6],
+}
+# scorers that only call predict(), so probability calibration can be skipped
+LABEL_SCORERS = ("accuracy", "balanced_accuracy", "f1_macro", "f1_micro", "f1_weighted")
+
+# the Article2 notebook's BayesSearchCV spaces as (kind, ...) specs, so the
+# same ranges can be sampled for halving or handed to scikit-optimize;
+# the notebook's PCA bound min(20, n_features) is 6 for the six sensors
+ARTICLE2_SPACES = {
+    "svm": {
+        "pca__n_components": ("int", 2, 6),
+        "svm__C": ("log", 1e-2, 1e3),
+        "svm__gamma": ("log", 1e-5, 1e-1),
+        "svm__kernel": ("cat", ["rbf"]),
+    },
+    "knn": {
+        "pca__n_components": ("int", 2, 6),
+        "knn__n_neighbors": ("int", 1, 30),
+        "knn__weights": ("cat", ["uniform", "distance"]),
+        "knn__p": ("int", 1, 2),
+    },
+    "xgb": {
+        "pca__n_components": ("int", 2, 6),
+        "xgb__learning_rate": ("log", 1e-3, 0.3),
+        "xgb__max_depth": ("int", 2, 10),
+        "xgb__gamma": ("real", 0.0, 5.0),
+        "xgb__subsample": ("real", 0.5, 1.0),
+    },
+}
+ARTICLE2_BAYES_ITER = {"svm": 40, "knn": 40, "xgb": 50}
+
+def svm_pipeline():
+    """The Article1 notebook's scaler -> PCA -> SVC pipeline."""
+    from sklearn.decomposition import PCA
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.svm import SVC
+
+    return Pipeline([
+        ("scaler", StandardScaler()),
+        ("pca", PCA()),
+        ("classifier", SVC(kernel="rbf", probability=True, class_weight="balanced", random_state=42)),
+    ])
+
+def _macro_f1(y_true, y_pred, n_classes):
+    """sklearn's f1_score(average="macro") for integer labels: labels seen in either array."""
+    tp = np.bincount(y_true[y_true == y_pred], minlength=n_classes)
+    seen = np.bincount(y_true, minlength=n_classes) + np.bincount(y_pred, minlength=n_classes)
+    present = seen > 0
+    return float(np.mean(2 * tp[present] / seen[present]))
+
+FAST_SCORERS = {
+    "f1_macro": _macro_f1,
+    "accuracy": lambda y_true, y_pred, n_classes: float(np.mean(y_true == y_pred)),
+}
+
+def article2_pipeline(name):
+    """The Article2 notebook's scaler -> PCA -> member pipeline (``svm``, ``knn`` or ``xgb``)."""
+    from sklearn.decomposition import PCA
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import StandardScaler
+
+    if name == "svm":
+        from sklearn.svm import SVC
+        member = SVC(probability=True, class_weight="balanced", random_state=42)
+    elif name == "knn":
+        from sklearn.neighbors import KNeighborsClassifier
+        member = KNeighborsClassifier()
+    elif name == "xgb":
+        from xgboost import XGBClassifier
+        member = XGBClassifier(objective="multi:softprob", eval_metric="mlogloss", random_state=42)
+    else:
+        raise ValueError(f"Unknown Article2 member {name!r}")
+    return Pipeline([("scaler", StandardScaler()), ("pca", PCA()), (name, member)])
+
+def sample_space(space, n, random_state=42):
+    """``n`` random candidates from an ARTICLE2_SPACES entry."""
+    from scipy.stats import loguniform, randint, uniform
+    from sklearn.model_selection import ParameterSampler
+
+    dists = {}
+    for key, (kind, *args) in space.items():
+        if kind == "int":
+            dists[key] = randint(args[0], args[1] + 1)
+        elif kind == "log":
+            dists[key] = loguniform(args[0], args[1])
+        elif kind == "real":
+            dists[key] = uniform(args[0], args[1] - args[0])
+        else:
+            dists[key] = list(args[0])
+    return list(ParameterSampler(dists, n, random_state=random_state))
+
+def skopt_space(space):
+    """The same space as scikit-optimize dimensions, for BayesSearchCV."""
+    from skopt.space import Categorical, Integer, Real
+
+    dims = {}
+    for key, (kind, *args) in space.items():
+        if kind == "int":
+            dims[key] = Integer(args[0], args[1])
+        elif kind == "log":
+            dims[key] = Real(args[0], args[1], prior="log-uniform")
+        elif kind == "real":
+            dims[key] = Real(args[0], args[1])
+        else:
+            dims[key] = Categorical(list(args[0]))
+    return dims
+
+def _split_params(estimator, params):
+    """(hashable preprocessing params, classifier params) of one pipeline candidate."""
+    clf_step = estimator.steps[-1][0] + "__"
+    pre = tuple(sorted((k, v) for k, v in params.items() if not k.startswith(clf_step)))
+    clf = {k[len(clf_step):]: v for k, v in params.items() if k.startswith(clf_step)}
+    return pre, clf
+
+# ---------------- WORKER ---------------- #
+# set once per process (pool initializer, or directly when running inline)
+_JOB = {}
+
+def _init_job(estimator, X, y, splits, scoring, label_only):
+    _JOB.clear()
+    _JOB.update(estimator=estimator, X=X, y=y, splits=splits, scoring=scoring, label_only=label_only)
+    _transformed.cache_clear()
+
+@functools.lru_cache(maxsize=None)
+def _transformed(fold, pre_key):
+    """Fit the preprocessing steps on one fold's training part, once per process."""
+    from sklearn.base import clone
+    from sklearn.pipeline import Pipeline
+
+    train, test = _JOB["splits"][fold]
+    X, y = _JOB["X"], _JOB["y"]
+    pre = Pipeline(clone(_JOB["estimator"]).steps[:-1]).set_params(**dict(pre_key))
+    return pre.fit_transform(X[train], y[train]), pre.transform(X[test])
+
+def _score_group(task):
+    """Score every classifier setting of one (fold, preprocessing) group."""
+    from sklearn.base import clone
+    from sklearn.metrics import get_scorer
+
+    fold, pre_key, candidates = task
+    train, test = _JOB["splits"][fold]
+    y = _JOB["y"]
+    Z_train, Z_test = _transformed(fold, pre_key)
+    fast = FAST_SCORERS.get(_JOB["scoring"])
+    scorer = None if fast else get_scorer(_JOB["scoring"])
+    n_classes = int(y.max()) + 1
+    base = clone(_JOB["estimator"].steps[-1][1])
+    if _JOB["label_only"] and "probability" in base.get_params():
+        base.set_params(probability=False)
+
+    out = []
+    for index, params in candidates:
+        started = time.perf_counter()
+        clf = clone(base).set_params(**params).fit(Z_train, y[train])
+        if fast:
+            score = fast(y[test], clf.predict(Z_test), n_classes)
+        else:
+            score = scorer(clf, Z_test, y[test])
+        out.append((index, fold, score, time.perf_counter() - started))
+    return out
+
+# ---------------- SEARCH ---------------- #
+class GridSearch:
+    """
+    GridSearchCV for a preprocessing -> classifier Pipeline, with memoized
+    preprocessing and a process pool of ``workers`` (default: all CPUs).
+
+    Keeps the GridSearchCV attributes the notebooks use: best_params_,
+    best_score_, best_estimator_, cv_results_; ``timings`` has the wall
+    clock of each phase.
+    """
+
+    def __init__(self, estimator, param_grid, cv=10, scoring="f1_macro", workers=None):
+        # a grid dict, or a list of candidate parameter dicts (see sample_space)
+        self.estimator = estimator
+        self.param_grid = param_grid
+        self.cv = cv
+        self.scoring = scoring
+        self.workers = workers or os.cpu_count() or 1
+
+    def _candidates(self):
+        from sklearn.model_selection import ParameterGrid
+
+        if isinstance(self.param_grid, dict):
+            return list(ParameterGrid(self.param_grid))
+        return [dict(c) for c in self.param_grid]
+
+    def _groups(self, candidates, folds, indices=None):
+        """Tasks of (fold, preprocessing params, [(candidate index, classifier params)])."""
+        grouped = {}
+        for index in range(len(candidates)) if indices is None else indices:
+            pre, clf = _split_params(self.estimator, candidates[index])
+            grouped.setdefault(pre, []).append((index, clf))
+        return [(fold, pre, group) for pre, group in grouped.items() for fold in folds]
+
+    def _pool(self, job):
+        """One pool for the whole search, so the workers' memo outlives a round."""
+        if self.workers == 1:
+            _init_job(*job)
+            return None
+        from concurrent.futures import ProcessPoolExecutor
+
+        return ProcessPoolExecutor(self.workers, initializer=_init_job, initargs=job)
+
+    def _run(self, pool, tasks):
+        if pool is None:
+            rows = [r for task in tasks for r in _score_group(task)]
+        else:
+            rows = [r for rows in pool.map(_score_group, tasks) for r in rows]
+        for index, fold, score, seconds in rows:
+            self._scores[index, fold] = score
+            self._fit_s[index] += seconds
+        self._tasks += len(tasks)
+        return len(rows)
+
+    def _search(self, candidates, n_folds, pool):
+        """Score every candidate on every fold; returns the number of classifier fits."""
+        self.rounds_ = [{"candidates": len(candidates), "folds": n_folds}]
+        return self._run(pool, self._groups(candidates, range(n_folds)))
+
+    def fit(self, X, y):
+        from sklearn.base import clone
+        from sklearn.model_selection import check_cv
+
+        started = time.perf_counter()
+        X_in, y_in = X, y  # the refit keeps labels and DataFrame column names
+        X = np.asarray(X, dtype=float)
+        # sorted integer codes: the classifiers order classes the same way
+        _, y = np.unique(np.asarray(y), return_inverse=True)
+        splits = list(check_cv(self.cv, y, classifier=True).split(X, y))
+        candidates = self._candidates()
+        job = (self.estimator, X, y, splits, self.scoring, self.scoring in LABEL_SCORERS)
+
+        self._scores = np.full((len(candidates), len(splits)), np.nan)
+        self._fit_s = np.zeros(len(candidates))
+        self._tasks = 0
+        pool = self._pool(job)
+        try:
+            fits = self._search(candidates, len(splits), pool)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        scored = (~np.isnan(self._scores)).sum(axis=1)
+        mean = np.nanmean(self._scores, axis=1)
+        # first best in candidate order among those scored on every fold, like GridSearchCV
+        best = int(np.argmax(np.where(scored == len(splits), mean, -np.inf)))
+        searched = time.perf_counter()
+
+        self.cv_results_ = {
+            "params": candidates,
+            "mean_test_score": mean,
+            "std_test_score": np.nanstd(self._scores, axis=1),
+            "mean_fit_time": self._fit_s / scored,
+            "n_folds": scored,
+        }
+        self.best_index_ = best
+        self.best_params_ = candidates[best]
+        self.best_score_ = float(mean[best])
+        self.best_estimator_ = clone(self.estimator).set_params(**self.best_params_).fit(X_in, y_in)
+        self.timings = {
+            "candidates": len(candidates),
+            "folds": len(splits),
+            "classifier_fits": fits,
+            "preprocessing_groups": self._tasks,
+            "rounds": self.rounds_,
+            "workers": self.workers,
+            "search_s": round(searched - started, 3),
+            "refit_s": round(time.perf_counter() - searched, 3),
+        }
+        return self
+
+class HalvingSearch(GridSearch):
+    """
+    Successive halving over the CV folds.
+
+    ``candidates`` is a grid dict or a list of parameter dicts (see
+    sample_space). Round by round the best 1/``eta`` of the candidates,
+    ranked on the folds scored so far, get ``eta`` times as many folds,
+    starting from ``min_folds``; the last round scores the survivors on
+    all folds and the winner is picked among them.
+    """
+
+    def __init__(self, estimator, candidates, cv=10, scoring="f1_macro", eta=3, min_folds=2, workers=None):
+        super().__init__(estimator, candidates, cv, scoring, workers)
+        self.eta = eta
+        self.min_folds = min_folds
+
+    def _search(self, candidates, n_folds, pool):
+        self.rounds_ = []
+        alive = list(range(len(candidates)))
+        done, folds = 0, min(self.min_folds, n_folds)
+        fits = 0
+        while True:
+            fits += self._run(pool, self._groups(candidates, range(done, folds), alive))
+            self.rounds_.append({"candidates": len(alive), "folds": folds})
+            if folds >= n_folds:
+                return fits
+            mean = self._scores[alive, :folds].mean(axis=1)
+            keep = max(1, math.ceil(len(alive) / self.eta))
+            alive = sorted(alive[i] for i in np.argsort(-mean, kind="stable")[:keep])
+            done, folds = folds, (n_folds if len(alive) == 1 else min(folds * self.eta, n_folds))
+
+# ---------------- BAYESIAN SEARCH ---------------- #
+BAYES_FORMAT = "enose-bayes"
+MAX_REPEATED_ASKS = 20  # consecutive already-scored proposals before the search gives up
+
+def data_fingerprint(X, y, *extra):
+    """Hash of a training matrix and its labels (and e.g. the fold count a score depends on)."""
+    h = hashlib.sha1()
+    h.update(np.ascontiguousarray(np.asarray(X, dtype=float)).tobytes())
+    h.update("\0".join(map(str, np.asarray(y))).encode())
+    for part in extra:
+        h.update(str(part).encode())
+    return h.hexdigest()[:16]
+
+class BayesSearch:
+    """
+    Checkpointed Bayesian search over an ARTICLE2_SPACES entry.
+
+    ``checkpoint`` (JSON) holds every evaluation; a checkpoint for another
+    space, scoring or fold count is ignored. On the same data a run
+    continues until ``n_iter`` points have been scored. On changed data
+    all old points seed the surrogate, the ``rescore_top`` best are scored
+    again and ``warm_iter`` new points are asked. ``fresh`` ignores the
+    checkpoint. Exposes best_params_, best_score_, best_estimator_,
+    cv_results_ and ``timings`` like GridSearch.
+    """
+
+    def __init__(self, estimator, space, checkpoint=None, n_iter=40, cv=10, scoring="f1_macro",
+                 random_state=42, rescore_top=5, warm_iter=5, fresh=False):
+        self.estimator = estimator
+        self.space = space
+        self.checkpoint = checkpoint
+        self.n_iter = n_iter
+        self.cv = cv
+        self.scoring = scoring
+        self.random_state = random_state
+        self.rescore_top = rescore_top
+        self.warm_iter = warm_iter
+        self.fresh = fresh
+
+    def _state_key(self, n_splits):
+        return {"space": {k: list(v) for k, v in sorted(self.space.items())},
+                "scoring": self.scoring, "folds": n_splits}
+
+    def _load(self, key):
+        if self.fresh or not self.checkpoint or not os.path.exists(self.checkpoint):
+            return []
+        try:
+            with open(self.checkpoint) as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable checkpoint {self.checkpoint}: {e}")
+            return []
+        if state.get("format") != BAYES_FORMAT or state.get("key") != key:
+            print(f"Ignoring checkpoint {self.checkpoint}: it is for another search")
+            return []
+        return state["evaluations"]
+
+    def _save(self, key, evaluations):
+        """Atomic rewrite, so a crash mid-write keeps the previous checkpoint."""
+        if not self.checkpoint:
+            return
+        state = {"format": BAYES_FORMAT, "version": 1, "key": key, "evaluations": evaluations}
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.checkpoint)), suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(state, f, indent=1, default=_plain)
+        os.replace(tmp, self.checkpoint)
+
+    def _evaluate(self, params, n_splits):
+        """Fold scores of one point; the preprocessing memo is shared by all points."""
+        pre, clf = _split_params(self.estimator, params)
+        rows = [r for fold in range(n_splits) for r in _score_group((fold, pre, [(0, clf)]))]
+        return [score for _, _, score, _ in rows]
+
+    def fit(self, X, y):
+        from sklearn.base import clone
+        from sklearn.model_selection import check_cv
+        from skopt import Optimizer
+        from skopt.utils import dimensions_aslist, point_asdict
+
+        started = time.perf_counter()
+        X_in, y_in = X, y
+        X = np.asarray(X, dtype=float)
+        _, y = np.unique(np.asarray(y), return_inverse=True)
+        splits = list(check_cv(self.cv, y, classifier=True).split(X, y))
+        _init_job(self.estimator, X, y, splits, self.scoring, self.scoring in LABEL_SCORERS)
+        data = data_fingerprint(X_in, y_in, len(splits))
+        key = self._state_key(len(splits))
+
+        evaluations = self._load(key)
+        names = sorted(self.space)
+        dims = skopt_space(self.space)
+        # a resumed run must not replay the random draws of the run it continues
+        seed = None if self.random_state is None else self.random_state + len(evaluations)
+        optimizer = Optimizer(dimensions_aslist(dims), random_state=seed)
+        point = lambda params: [params[n] for n in names]
+        params_key = lambda params: json.dumps(point(params), default=_plain)
+
+        current = {params_key(e["params"]): e for e in evaluations if e["data"] == data}
+        # the newest score of every point seeds the surrogate, stale or not
+        seen = {params_key(e["params"]): e for e in evaluations}
+        if seen:
+            optimizer.tell([point(e["params"]) for e in seen.values()],
+                           [-e["score"] for e in seen.values()])
+        stale = sorted((e for k, e in seen.items() if k not in current), key=lambda e: -e["score"])
+        reused = len(current)
+        # an interrupted warm start keeps the target it started with
+        target = max((e.get("warm_target", 0) for e in current.values()), default=0)
+        warm = bool(target) or (bool(stale) and reused < self.n_iter)
+        if warm and not target:
+            target = reused + min(self.rescore_top, len(stale)) + self.warm_iter
+        elif not warm:
+            target = self.n_iter
+
+        evaluated = repeats = 0
+        while len(current) < target:
+            rescore = [e for e in stale if params_key(e["params"]) not in current][:1]
+            rescored = bool(rescore) and sum(e.get("rescored", False) for e in current.values()) < self.rescore_top
+            if rescored:
+                params = dict(rescore[0]["params"])
+            else:
+                asked = [np.array(v).item() for v in optimizer.ask()]
+                params = dict(point_asdict(dims, asked))
+                known = current.get(params_key(params))
+                if known is not None:
+                    # already scored on this data: not re-run and not counted
+                    optimizer.tell(point(params), -known["score"])
+                    repeats += 1
+                    if repeats >= MAX_REPEATED_ASKS:
+                        print(f"Search space exhausted after {len(current)} points")
+                        break
+                    continue
+                repeats = 0
+            t0 = time.perf_counter()
+            folds = self._evaluate(params, len(splits))
+            entry = {"params": params, "score": float(np.mean(folds)), "fold_scores": folds,
+                     "data": data, "seconds": round(time.perf_counter() - t0, 3)}
+            if warm:
+                entry["warm_target"] = target
+                entry["rescored"] = rescored
+            optimizer.tell(point(params), -entry["score"])
+            current[params_key(params)] = entry
+            evaluations.append(entry)
+            evaluated += 1
+            self._save(key, evaluations)
+
+        results = list(current.values())
+        scores = np.array([e["score"] for e in results])
+        best = int(np.argmax(scores))
+        searched = time.perf_counter()
+        self.cv_results_ = {
+            "params": [e["params"] for e in results],
+            "mean_test_score": scores,
+            "std_test_score": np.array([np.std(e["fold_scores"]) for e in results]),
+        }
+        self.best_index_ = best
+        self.best_params_ = results[best]["params"]
+        self.best_score_ = float(scores[best])
+        self.best_estimator_ = clone(self.estimator).set_params(**self.best_params_).fit(X_in, y_in)
+        self.timings = {
+            "evaluations": evaluated,
+            "reused": reused,
+            "warm_start": bool(warm),
+            "classifier_fits": evaluated * len(splits),
+            "folds": len(splits),
+            "search_s": round(searched - started, 3),
+            "refit_s": round(time.perf_counter() - searched, 3),
+        }
+        return self
+
+# ---------------- TRAINING CACHE ---------------- #
+CACHE_FORMAT = "enose-train-cache"
+# search settings that change how a result is computed, not what it is
+CACHE_IGNORED = ("workers", "checkpoint", "fresh", "timings")
+CACHED_ATTRS = ("best_params_", "best_score_", "best_index_", "best_estimator_", "cv_results_",
+                "rounds_", "timings")
+
+def estimator_config(estimator):
+    """Step classes and leaf parameters of a pipeline; repr() would elide long ones."""
+    params = estimator.get_params(deep=True)
+    steps = [(name, f"{type(step).__module__}.{type(step).__qualname__}")
+             for name, step in getattr(estimator, "steps", [("", estimator)])]
+    leaves = {k: repr(v) for k, v in sorted(params.items()) if not hasattr(v, "get_params") and k != "steps"}
+    return {"steps": steps, "params": leaves}
+
+def library_versions(search):
+    """Versions of numpy, scikit-learn and every library a pipeline step (of a search) comes from."""
+    import importlib
+
+    modules = {"numpy", "sklearn"}
+    estimator = getattr(search, "estimator", search)
+    for _, step in getattr(estimator, "steps", [("", estimator)]):
+        modules.add(type(step).__module__.split(".")[0])
+    if isinstance(search, BayesSearch):
+        modules.add("skopt")
+    return {m: getattr(importlib.import_module(m), "__version__", "unknown") for m in sorted(modules)}
+
+def search_config(search):
+    """The settings of an unfitted search that decide its result."""
+    config = {"search": type(search).__name__}
+    for name, value in sorted(vars(search).items()):
+        if name.startswith("_") or name.endswith("_") or name in CACHE_IGNORED:
+            continue
+        if name == "estimator":
+            value = estimator_config(value)
+        elif name == "cv":
+            value = repr(value)
+        config[name] = value
+    return config
+
+def training_key(search, X, y):
+    """Content hash of everything a fitted search depends on."""
+    parts = {
+        "data": data_fingerprint(X, y),
+        "features": [str(c) for c in getattr(X, "columns", [])],
+        "config": search_config(search),
+        "libraries": library_versions(search),
+    }
+    blob = json.dumps(parts, sort_keys=True, default=_plain)
+    return hashlib.sha256(blob.encode()).hexdigest()[:20], parts
+
+def cached_fit(search, X, y, cache_dir="model_cache"):
+    """
+    ``search.fit(X, y)``, unless ``cache_dir`` already holds the result for
+    the same key; either way ``search`` ends up fitted. ``cache_dir=None``
+    always fits. The search's ``timings`` say whether it came from the cache.
+    """
+    import joblib
+
+    if not cache_dir:
+        return search.fit(X, y)
+    started = time.perf_counter()
+    key, parts = training_key(search, X, y)
+    path = os.path.join(cache_dir, f"{type(search).__name__.lower()}-{key}.joblib")
+    if os.path.exists(path):
+        try:
+            entry = joblib.load(path)
+        except Exception as e:
+            print(f"Ignoring unreadable cache entry {path}: {e}")
+        else:
+            for name, value in entry["attrs"].items():
+                setattr(search, name, value)
+            search.timings = dict(entry["attrs"].get("timings", {}), cached=True, cache_key=key,
+                                  trained_at=entry["trained_at"],
+                                  lookup_s=round(time.perf_counter() - started, 3))
+            return search
+
+    search.fit(X, y)
+    search.timings = dict(search.timings, cached=False, cache_key=key)
+    os.makedirs(cache_dir, exist_ok=True)
+    entry = {
+        "format": CACHE_FORMAT, "key": key, "parts": parts,
+        "trained_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "attrs": {name: getattr(search, name) for name in CACHED_ATTRS if hasattr(search, name)},
+    }
+    fd, tmp = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    os.close(fd)
+    joblib.dump(entry, tmp)
+    os.replace(tmp, path)
+    return search
+
+# ---------------- CLI ---------------- #
+def load_training_table(path, features=None):
+    """(X, y) of a Label + feature CSV such as final_trainingset.csv, in contract order."""
+    import pandas as pd
+    from enose.pipeline import TRAINING_SENSOR_COLS, FeaturePipeline
+
+    frame = pd.read_csv(path)
+    pipeline = FeaturePipeline(features or TRAINING_SENSOR_COLS)
+    return pipeline.table(frame), frame["Label"], pipeline.feature_names
+
+def _plain(value):
+    """JSON fallback for numpy scalars in sampled parameters."""
+    return value.item() if hasattr(value, "item") else str(value)
+
+def _write_report(path, report):
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2, default=_plain)
+
+def train_svm(data_path, out_path, workers=None, report_path=None, test_size=0.3, search="grid",
+              cache_dir=None, baseline_subtracted=False):
+    """Split like the notebook, search, evaluate on the held-out part and save the artifact."""
+    from sklearn.metrics import accuracy_score, f1_score
+    from sklearn.model_selection import train_test_split
+    from enose.pipeline import save_artifact
+
+    started = time.perf_counter()
+    X, y, features = load_training_table(data_path)
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=test_size, random_state=42, stratify=y
+    )
+    searcher = HalvingSearch if search == "halving" else GridSearch
+    search = searcher(svm_pipeline(), SVM_PARAM_GRID, cv=10, workers=workers)
+    cached_fit(search, X_train, y_train, cache_dir)
+    pred = search.best_estimator_.predict(X_test)
+
+    report = {
+        "data": os.path.abspath(data_path),
+        "baseline_subtracted": baseline_subtracted,
+        "search": search.__class__.__name__,
+        "best_params": search.best_params_,
+        "cv_f1_macro": round(search.best_score_, 4),
+        "test_accuracy": round(float(accuracy_score(y_test, pred)), 4),
+        "test_f1_macro": round(float(f1_score(y_test, pred, average="macro")), 4),
+    }
+    report.update(search.timings)
+    save_artifact(out_path, search.best_estimator_, features,
+                  meta=dict(report, trained_at=time.strftime("%Y-%m-%d %H:%M:%S")))
+    report["total_s"] = round(time.perf_counter() - started, 3)
+    if report_path:
+        _write_report(report_path, report)
+    return report
+
+def _compare_row(search, X_test, y_test, fits=None):
+    from sklearn.metrics import f1_score
+
+    pred = search.best_estimator_.predict(X_test)
+    timings = getattr(search, "timings", {})
+    return {
+        "search_s": timings.get("search_s"),
+        "classifier_fits": timings.get("classifier_fits", fits),
+        "cv_f1_macro": round(float(search.best_score_), 4),
+        "test_f1_macro": round(float(f1_score(y_test, pred, average="macro")), 4),
+        "best_params": dict(search.best_params_),
+    }
+
+def compare_searches(data_path, members=("svm", "knn", "xgb"), workers=None, n_candidates=81,
+                     eta=3, report_path=None, test_size=0.3):
+    """
+    Time successive halving against the exhaustive search (and BayesSearchCV
+    where installed) on the notebooks' split: Article1's SVM grid, then each
+    Article2 member on ``n_candidates`` samples of its space.
+    """
+    from sklearn.model_selection import StratifiedKFold, train_test_split
+    from sklearn.preprocessing import LabelEncoder
+
+    X, y, _ = load_training_table(data_path)
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=test_size, random_state=42, stratify=y
+    )
+    report = {"data": os.path.abspath(data_path), "eta": eta, "results": {}}
+
+    runs = [("article1_svm", svm_pipeline, SVM_PARAM_GRID, 10, y_train, y_test, None)]
+    le = LabelEncoder().fit(y_train)
+    cv = StratifiedKFold(n_splits=10, shuffle=True, random_state=42)
+    for name in members:
+        candidates = sample_space(ARTICLE2_SPACES[name], n_candidates)
+        runs.append((f"article2_{name}", functools.partial(article2_pipeline, name), candidates, cv,
+                     le.transform(y_train), le.transform(y_test), name))
+
+    for key, make, candidates, folds, fit_y, test_y, member in runs:
+        try:
+            make()
+        except ImportError as e:
+            print(f"{key}: skipped ({e})")
+            report["results"][key] = {"skipped": str(e)}
+            continue
+        rows = {}
+        for label, searcher in (("exhaustive", GridSearch), ("halving", HalvingSearch)):
+            kwargs = {"eta": eta} if searcher is HalvingSearch else {}
+            search = searcher(make(), candidates, cv=folds, workers=workers, **kwargs).fit(X_train, fit_y)
+            rows[label] = _compare_row(search, X_test, test_y)
+            if searcher is HalvingSearch:
+                rows[label]["rounds"] = search.rounds_
+        if member:
+            try:
+                from skopt import BayesSearchCV
+            except ImportError:
+                rows["bayes"] = {"skipped": "scikit-optimize is not installed"}
+            else:
+                n_iter = ARTICLE2_BAYES_ITER[member]
+                started = time.perf_counter()
+                search = BayesSearchCV(make(), skopt_space(ARTICLE2_SPACES[member]), n_iter=n_iter,
+                                       cv=folds, scoring="f1_macro", n_jobs=-1, random_state=42,
+                                       refit=True).fit(X_train, fit_y)
+                rows["bayes"] = _compare_row(search, X_test, test_y, fits=n_iter * cv.get_n_splits())
+                rows["bayes"]["search_s"] = round(time.perf_counter() - started, 3)
+        report["results"][key] = rows
+
+        print(f"{key}:")
+        for label, row in rows.items():
+            if "skipped" in row:
+                print(f"  {label:>10}: skipped ({row['skipped']})")
+            else:
+                print(f"  {label:>10}: {row['search_s']:7.2f} s  {row['classifier_fits']:5} fits  "
+                      f"CV F1 {row['cv_f1_macro']:.4f}  test F1 {row['test_f1_macro']:.4f}")
+    if report_path:
+        _write_report(report_path, report)
+    return report
+
+def bayes_member(data_path, member, checkpoint=None, n_iter=None, fresh=False, report_path=None,
+                 test_size=0.3):
+    """One Article2 member's checkpointed search on the notebook's split, folds and label codes."""
+    from sklearn.metrics import f1_score
+    from sklearn.model_selection import StratifiedKFold, train_test_split
+    from sklearn.preprocessing import LabelEncoder
+
+    X, y, _ = load_training_table(data_path)
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=test_size, random_state=42, stratify=y
+    )
+    le = LabelEncoder().fit(y_train)
+    cv = StratifiedKFold(n_splits=10, shuffle=True, random_state=42)
+    search = BayesSearch(article2_pipeline(member), ARTICLE2_SPACES[member], checkpoint,
+                         n_iter=n_iter or ARTICLE2_BAYES_ITER[member], cv=cv, fresh=fresh)
+    search.fit(X_train, le.transform(y_train))
+    pred = search.best_estimator_.predict(X_test)
+    report = {
+        "member": member,
+        "best_params": search.best_params_,
+        "cv_f1_macro": round(search.best_score_, 4),
+        "test_f1_macro": round(float(f1_score(le.transform(y_test), pred, average="macro")), 4),
+    }
+    report.update(search.timings)
+    if report_path:
+        _write_report(report_path, report)
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train kiosk models with a cached, parallel search.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("svm", help="Article1's scaler -> PCA -> SVC grid")
+    p.add_argument("data", help="Label + feature CSV (final_trainingset.csv)")
+    p.add_argument("-o", "--output", default="svm_best_model.joblib")
+    p.add_argument("--workers", type=int, default=None, help="processes (default: all CPUs)")
+    p.add_argument("--report", help="write the timing/metrics report as JSON")
+    p.add_argument("--search", choices=("grid", "halving"), default="grid")
+    p.add_argument("--cache", help="trained-search cache (default: model_cache next to the data)")
+    p.add_argument("--no-cache", action="store_true", help="always run the search")
+    p.add_argument("--baseline-subtracted", action="store_true",
+                   help="the CSV's features have the clean-air baseline subtracted")
+    p = sub.add_parser("compare", help="halving vs exhaustive (vs Bayes) search, time and macro F1")
+    p.add_argument("data", help="Label + feature CSV (final_trainingset.csv)")
+    p.add_argument("--members", nargs="+", choices=sorted(ARTICLE2_SPACES), default=sorted(ARTICLE2_SPACES))
+    p.add_argument("--candidates", type=int, default=81, help="samples per Article2 space")
+    p.add_argument("--eta", type=int, default=3)
+    p.add_argument("--workers", type=int, default=None)
+    p.add_argument("--report", help="write the comparison as JSON")
+    p = sub.add_parser("bayes", help="checkpointed Bayesian search of one Article2 member")
+    p.add_argument("data", help="Label + feature CSV (final_trainingset.csv)")
+    p.add_argument("--member", choices=sorted(ARTICLE2_SPACES), required=True)
+    p.add_argument("--checkpoint", help="default: bayes_<member>.json next to the data")
+    p.add_argument("--n-iter", type=int, default=None, help="default: the notebook's 40/40/50")
+    p.add_argument("--fresh", action="store_true", help="ignore the checkpoint")
+    p.add_argument("--report", help="write the result as JSON")
+    args = parser.parse_args(argv)
+
+    if args.cmd == "compare":
+        compare_searches(args.data, args.members, args.workers, args.candidates, args.eta, args.report)
+        return
+    if args.cmd == "bayes":
+        checkpoint = args.checkpoint or os.path.join(os.path.dirname(os.path.abspath(args.data)),
+                                                     f"bayes_{args.member}.json")
+        report = bayes_member(args.data, args.member, checkpoint, args.n_iter, args.fresh, args.report)
+        mode = "warm start" if report["warm_start"] else "search"
+        print(f"Best {report['best_params']}  CV F1 {report['cv_f1_macro']}  test F1 {report['test_f1_macro']}")
+        print(f"{mode}: {report['evaluations']} new + {report['reused']} checkpointed points in "
+              f"{report['search_s']} s -> {checkpoint}")
+        return
+    cache_dir = None if args.no_cache else (
+        args.cache or os.path.join(os.path.dirname(os.path.abspath(args.data)), "model_cache"))
+    report = train_svm(args.data, args.output, args.workers, args.report, search=args.search,
+                       cache_dir=cache_dir, baseline_subtracted=args.baseline_subtracted)
+    print(f"Best {report['best_params']}  CV F1 {report['cv_f1_macro']}  "
+          f"test acc {report['test_accuracy']}  F1 {report['test_f1_macro']}")
+    if report.get("cached"):
+        print(f"Search from cache {report['cache_key']} (trained {report['trained_at']}), "
+              f"total {report['total_s']} s -> {args.output}")
+        return
+    print(f"{report['classifier_fits']} fits in {report['search_s']} s on {report['workers']} "
+          f"worker(s), refit {report['refit_s']} s, total {report['total_s']} s -> {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+"""
+Voting-weight search from cached out-of-fold member probabilities.
+
+Trying other VotingClassifier weights, or hard instead of soft voting,
+meant refitting the Article2 ensemble (SVM with Platt scaling, kNN,
+XGBoost) for every trial. The vote itself only needs each member's
+out-of-fold answers, so:
+
+  * every member is fitted once per CV fold and its predict_proba and
+    predict on the held-out fold are kept - predict as well, because hard
+    voting uses each member's own predict, which for a Platt-scaled SVC is
+    not always the argmax of its probabilities;
+  * these arrays are cached in model_cache/ under a hash of data, folds,
+    member settings and library versions (as enose.train's cached_fit), so
+    a member is only fitted again when something it depends on changed;
+  * all weight vectors (integer levels, proportional duplicates dropped)
+    for soft and hard voting are scored at once with array operations:
+    one einsum for the weighted votes, a batched bincount for macro F1.
+
+Candidates are ranked by out-of-fold macro F1, then by log loss of the
+normalized vote. For the chosen soft vote the report adds how accuracy
+and coverage change with a minimum-confidence threshold. The kiosk has no
+"uncertain" answer, so the threshold is advisory. Weights and voting are
+attributes of the fitted VotingClassifier and can be applied to an
+existing artifact without refitting anything.
+
+    python -m enose.voting Article2/ensemble_model.joblib --data Article2/final_trainingset.csv --report voting.json
+    python -m enose.voting Article2/ensemble_model.joblib --data Article2/final_trainingset.csv --apply -o Article2/ensemble_model.joblib
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import math
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from enose.train import data_fingerprint, estimator_config, library_versions
+
+THRESHOLDS = (0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9)
+
+# ---------------- OUT-OF-FOLD ANSWERS ---------------- #
+def _oof_key(estimator, X, y, cv):
+    parts = {"data": data_fingerprint(X, y), "cv": repr(cv), "estimator": estimator_config(estimator),
+             "libraries": library_versions(estimator)}
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()[:20]
+
+def out_of_fold(name, estimator, X, y, cv, classes, cache_dir="model_cache"):
+    """
+    (probabilities (n, k), predictions (n,), seconds, cached) of one member
+    on the folds it was not fitted on; ``classes`` fixes the column order.
+    """
+    from sklearn.base import clone
+
+    started = time.perf_counter()
+    path = None
+    if cache_dir:
+        path = os.path.join(cache_dir, f"oof-{name}-{_oof_key(estimator, X, y, cv)}.npz")
+        if os.path.exists(path):
+            with np.load(path) as cached:
+                return cached["proba"], cached["pred"], round(time.perf_counter() - started, 3), True
+
+    X = np.asarray(X, dtype=float)
+    y = np.asarray(y)
+    proba = np.zeros((len(y), len(classes)))
+    pred = np.zeros(len(y), dtype=y.dtype)
+    for train, test in cv.split(X, y):
+        fitted = clone(estimator).fit(X[train], y[train])
+        columns = np.searchsorted(classes, fitted.classes_)
+        proba[np.ix_(test, columns)] = fitted.predict_proba(X[test])
+        pred[test] = fitted.predict(X[test])
+    if path:
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=cache_dir, suffix=".npz")
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, proba=proba, pred=pred)
+        os.replace(tmp, path)
+    return proba, pred, round(time.perf_counter() - started, 3), False
+
+# ---------------- VECTORIZED VOTES ---------------- #
+def weight_grid(n_members, levels=5):
+    """(c, m) integer weight vectors 0..levels-1, without all-zero and proportional duplicates."""
+    rows = [w for w in itertools.product(range(levels), repeat=n_members)
+            if any(w) and math.gcd(*w) == 1]
+    return np.array(rows, dtype=float)
+
+def votes(proba, pred, weights, voting):
+    """
+    (c, n, k) vote totals for every weight vector: weighted probabilities
+    (soft) or weighted one-hot member predictions (hard), as VotingClassifier
+    adds them up. ``proba`` is (m, n, k), ``pred`` (m, n) class indices.
+    """
+    if voting == "soft":
+        return np.einsum("cm,mnk->cnk", weights, proba)
+    onehot = np.eye(proba.shape[2])[pred]
+    return np.einsum("cm,mnk->cnk", weights, onehot)
+
+def macro_f1(y, pred, n_classes):
+    """(c,) macro F1 of (c, n) predictions at once; as sklearn, over labels seen in y or the predictions."""
+    c = pred.shape[0]
+    offset = (np.arange(c) * n_classes)[:, None]
+    correct = pred == y[None, :]
+    tp = np.bincount((offset + pred)[correct], minlength=c * n_classes).reshape(c, n_classes)
+    predicted = np.bincount((offset + pred).ravel(), minlength=c * n_classes).reshape(c, n_classes)
+    seen = predicted + np.bincount(y, minlength=n_classes)[None, :]
+    present = seen > 0
+    f1 = np.where(present, 2 * tp / np.maximum(seen, 1), 0.0)
+    return f1.sum(axis=1) / present.sum(axis=1)
+
+def score_votes(totals, weights, y):
+    """Predictions, macro F1, accuracy and log loss of the normalized vote for (c, n, k) totals."""
+    n_classes = totals.shape[2]
+    pred = totals.argmax(axis=2)  # ties go to the lowest class, as in VotingClassifier
+    share = totals / weights.sum(axis=1)[:, None, None]
+    picked = np.clip(share[:, np.arange(len(y)), y], 1e-15, 1.0)
+    return {
+        "pred": pred,
+        "f1_macro": macro_f1(y, pred, n_classes),
+        "accuracy": (pred == y[None, :]).mean(axis=1),
+        "log_loss": -np.log(picked).mean(axis=1),
+    }
+
+def confidence_curve(share, y, thresholds=THRESHOLDS):
+    """Coverage and accuracy of the answered rows when runs below each confidence are not answered."""
+    confidence = share.max(axis=1)
+    correct = share.argmax(axis=1) == y
+    answered = confidence[None, :] >= np.asarray(thresholds)[:, None]
+    count = answered.sum(axis=1)
+    accuracy = np.where(count > 0, (answered & correct).sum(axis=1) / np.maximum(count, 1), np.nan)
+    return [{"min_confidence": t, "coverage": round(float(n / len(y)), 4),
+             "accuracy": None if np.isnan(a) else round(float(a), 4)}
+            for t, n, a in zip(thresholds, count, accuracy)]
+
+# ---------------- SEARCH ---------------- #
+def search_voting(members, X, y, cv, levels=5, cache_dir="model_cache", top=10):
+    """
+    Best voting and weights for ``members`` [(name, estimator)] on encoded
+    labels ``y``; returns a report with ``voting`` and ``weights`` ready
+    for VotingClassifier.
+    """
+    y = np.asarray(y)
+    classes = np.unique(y)
+    started = time.perf_counter()
+    probas, preds, timings = [], [], {}
+    for name, estimator in members:
+        proba, pred, seconds, cached = out_of_fold(name, estimator, X, y, cv, classes, cache_dir)
+        probas.append(proba)
+        preds.append(np.searchsorted(classes, pred))
+        timings[name] = {"seconds": seconds, "cached": cached}
+    proba, pred = np.stack(probas), np.stack(preds)
+    y_idx = np.searchsorted(classes, y)
+    oof_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    weights = weight_grid(len(members), levels)
+    table = []
+    for voting in ("soft", "hard"):
+        scores = score_votes(votes(proba, pred, weights, voting), weights, y_idx)
+        for i, w in enumerate(weights):
+            table.append({"voting": voting, "weights": [int(v) for v in w],
+                          "f1_macro": float(scores["f1_macro"][i]), "accuracy": float(scores["accuracy"][i]),
+                          "log_loss": float(scores["log_loss"][i])})
+    table.sort(key=lambda r: (-r["f1_macro"], r["log_loss"]))
+    search_ms = (time.perf_counter() - started) * 1000
+
+    best = table[0]
+    equal = next(r for r in table if r["voting"] == "soft" and len(set(r["weights"])) == 1)
+    soft_best = next(r for r in table if r["voting"] == "soft")
+    w = np.array([soft_best["weights"]], dtype=float)
+    share = votes(proba, pred, w, "soft")[0] / w.sum()
+    for row in table:
+        for key in ("f1_macro", "accuracy", "log_loss"):
+            row[key] = round(row[key], 4)
+    return {
+        "voting": best["voting"], "weights": best["weights"],
+        "f1_macro": best["f1_macro"], "log_loss": best["log_loss"],
+        "equal_soft": equal,
+        "candidates": len(table),
+        "top": table[:top],
+        "confidence": confidence_curve(share, y_idx),
+        "members": timings,
+        "oof_s": round(oof_s, 3),
+        "search_ms": round(search_ms, 2),
+    }
+
+# ---------------- CLI ---------------- #
+def tune_artifact(artifact_path, data_path, label_encoder_path=None, levels=5, cache_dir=None,
+                  test_size=0.3):
+    """Search an Article2 ensemble artifact's voting on the notebook's split and folds."""
+    from sklearn.metrics import f1_score
+    from sklearn.model_selection import StratifiedKFold, train_test_split
+    from enose.bench import resolve
+    from enose.incremental import members
+    from enose.pipeline import load_artifact
+    from enose.train import load_training_table
+
+    artifact = load_artifact(*resolve(artifact_path, label_encoder_path))
+    if artifact.label_encoder is None or not hasattr(artifact.model, "voting"):
+        raise ValueError("Need a VotingClassifier artifact with its label encoder")
+    X, y, _ = load_training_table(data_path, artifact.features)
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=test_size, random_state=42, stratify=y
+    )
+    cv = StratifiedKFold(n_splits=10, shuffle=True, random_state=42)
+    encode = artifact.label_encoder.transform
+    report = search_voting(members(artifact.model), X_train, encode(y_train), cv, levels, cache_dir)
+
+    # the fitted members answer the test split under both settings; nothing is refit
+    model = artifact.model
+    current = (model.voting, model.weights)
+    for key, (voting, weights) in (("test_current", current), ("test_best", (report["voting"], report["weights"]))):
+        model.voting, model.weights = voting, weights
+        report[key] = round(float(f1_score(encode(y_test), model.predict(np.asarray(X_test, dtype=float)),
+                                           average="macro")), 4)
+    model.voting, model.weights = current
+    report["current"] = {"voting": current[0], "weights": current[1]}
+    return artifact, report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tune ensemble voting from cached out-of-fold probabilities.")
+    parser.add_argument("artifact", help="Article2 ensemble artifact or model registry directory")
+    parser.add_argument("--data", required=True, help="Label + feature CSV (final_trainingset.csv)")
+    parser.add_argument("--label-encoder", help="for a bare ensemble (default: label_encoder.joblib alongside)")
+    parser.add_argument("--levels", type=int, default=5, help="integer weights 0..levels-1 per member")
+    parser.add_argument("--cache", help="default: model_cache next to the data")
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--report", help="write the report as JSON")
+    parser.add_argument("--apply", action="store_true", help="write the ensemble with the best voting")
+    parser.add_argument("-o", "--output", help="with --apply: artifact file (default: a new registry "
+                                               "version for a registry, else next to the input)")
+    args = parser.parse_args(argv)
+
+    cache_dir = None if args.no_cache else (
+        args.cache or os.path.join(os.path.dirname(os.path.abspath(args.data)), "model_cache"))
+    artifact, report = tune_artifact(args.artifact, args.data, args.label_encoder, args.levels, cache_dir)
+    for name, t in report["members"].items():
+        print(f"  {name:<4} out-of-fold answers {'from cache' if t['cached'] else 'fitted'} in {t['seconds']} s")
+    print(f"{report['candidates']} voting settings scored in {report['search_ms']} ms")
+    for row in report["top"][:5]:
+        print(f"  {row['voting']:<4} weights {row['weights']}  OOF F1 {row['f1_macro']:.4f}  "
+              f"log loss {row['log_loss']:.4f}")
+    print(f"Best: {report['voting']} voting, weights {report['weights']}; test F1 {report['test_best']} "
+          f"(current {report['current']['voting']}/{report['current']['weights']}: {report['test_current']})")
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.apply:
+        from enose.pipeline import save_artifact
+        from enose.registry import ModelRegistry
+
+        model = artifact.model
+        model.voting, model.weights = report["voting"], report["weights"]
+        meta = dict(artifact.meta, voting={k: report[k] for k in ("voting", "weights", "f1_macro")})
+        if os.path.isdir(args.artifact) and not args.output:
+            version = ModelRegistry(args.artifact).publish_artifact(
+                model, artifact.features, artifact.label_encoder, meta,
+                note=f"{report['voting']} voting, weights {report['weights']}")
+            print(f"Published as version {version}")
+        else:
+            out = args.output or os.path.join(os.path.dirname(os.path.abspath(args.artifact)),
+                                              "ensemble_model_tuned.joblib")
+            save_artifact(out, model, artifact.features, artifact.label_encoder, meta)
+            print(f"Wrote {out}")
+
+if __name__ == "__main__":
+    main()